@@ -5,76 +5,112 @@ Didesain agar tahan terhadap error, race condition I/O, dan responsif.
 
 import os
 import json
+import asyncio
 import csv
+import copy
+import uuid
 import tempfile
-from io import BytesIO, StringIO
+from io import StringIO
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, Response
 
 # Import fungsi AI (pastikan api/gemini_config.py tersedia)
 from api import gemini_config
+from api.db import get_backend
+from api import scoring
+from api import short_answer
+from api import metrics
+from api import compression
+from api.catalog import catalog
+from api.analytics import analytics, summarize
+from api.events import answer_events
+from api.feedback_queue import feedback_queue
+from api.generation_cache import generation_cache, make_key
+from api.jobs import generation_jobs, job_events, summarize as summarize_job
+from api import submission_import
+from api.lkpd_persist import normalize_question, persist_generated
 
 router = APIRouter()
 
 # Direktori (bisa disesuaikan lewat env)
 LKPD_DIR = os.getenv("LKPD_DIR", "data/lkpd_outputs")
 ANSWERS_DIR = os.getenv("ANSWERS_DIR", "data/answers")
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "200000"))
 
 # Pastikan direktori ada
 os.makedirs(LKPD_DIR, exist_ok=True)
 os.makedirs(ANSWERS_DIR, exist_ok=True)
 
+# Semua baca/tulis LKPD & jawaban lewat backend (file atau SQLite, lihat api/db.py)
+storage = get_backend()
+
+# Interval cek klien terputus saat menunggu generate (detik)
+DISCONNECT_POLL = float(os.getenv("DISCONNECT_POLL", "1.0"))
+# Polling ringan stream SSE (jawaban & job) saat tidak ada sinyal dari proses ini (detik)
+SSE_IDLE_POLL = float(os.getenv("SSE_IDLE_POLL", "10"))
+
+# Generate + simpan yang sedang berjalan untuk request "shared": true (kunci cache -> task)
+_shared_generations: Dict[str, "asyncio.Task"] = {}
+
 
 # -------------------------
 #  Helper utilities
 # -------------------------
-def _atomic_write_json(path: str, data: Any) -> None:
-    """Tulis JSON secara atomic (tulis ke temp, lalu replace)."""
-    dirn = os.path.dirname(path)
-    os.makedirs(dirn, exist_ok=True)
-    fd, tmp = tempfile.mkstemp(prefix="tmp", dir=dirn, suffix=".json")
-    try:
-        with os.fdopen(fd, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        os.replace(tmp, path)  # atomic replace
-    except Exception:
-        # Pastikan tmp file dihapus bila error
-        try:
-            os.remove(tmp)
-        except Exception:
-            pass
-        raise
+def _load_lkpd(lkpd_id: str):
+    """LKPD dari storage/cache (read-only). None bila tidak ada."""
+    return storage.load_lkpd(lkpd_id)
 
 
-def _safe_load_json(path: str):
-    if not os.path.exists(path):
-        return None
+async def _until_disconnect(request: Request, awaitable):
+    """Tunggu awaitable; batalkan (dan lepas dari generate bersama) bila klien memutus koneksi."""
+    task = asyncio.ensure_future(awaitable)
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise HTTPException(status_code=499, detail="Klien memutus koneksi.")
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def _parse_variants(payload: Dict[str, Any]) -> Optional[int]:
+    """``variants`` dari body: None bila tidak diisi, selain itu bilangan bulat >= 0 (400 bila bukan)."""
+    raw = payload.get("variants")
+    if raw is None:
         return None
+    try:
+        if isinstance(raw, bool) or (isinstance(raw, float) and not raw.is_integer()):
+            raise ValueError
+        n = int(raw)
+    except (TypeError, ValueError):
+        n = -1
+    if n < 0:
+        raise HTTPException(status_code=400, detail="Parameter 'variants' harus bilangan bulat >= 0.")
+    return n
 
 
-def _compute_status(score: float) -> str:
-    if score >= 85:
-        return "Tinggi"
-    if score >= 60:
-        return "Cukup"
-    return "Perlu Bimbingan"
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 
 # -------------------------
 #  Endpoint: generate LKPD
 # -------------------------
 @router.post("/generate")
-async def generate_endpoint(payload: Dict[str, Any]):
+async def generate_endpoint(payload: Dict[str, Any], request: Request):
     """
     Request body (JSON) => { "theme": "Fotosintesis", "level": "mudah" }
+      opsional: "fresh": true (abaikan cache), "variants": N (mode varian),
+                "shared": true (request identik yang bersamaan memakai id LKPD yang sama)
     Response => { "id": "abc123", ...lkpd_data }
+    Header X-LKPD-Cache: hit | miss | shared (ikut generate identik yang sedang berjalan)
     """
     try:
         theme = payload.get("theme") or payload.get("tema")
@@ -82,58 +118,213 @@ async def generate_endpoint(payload: Dict[str, Any]):
         if not theme or not level:
             raise HTTPException(status_code=400, detail="Parameter 'theme' dan 'level' wajib diisi.")
 
-        # panggil AI generator (gemini_config.generate_lkpd)
-        # generate_lkpd expected to return (data_dict, raw_text)
-        lkpd_data, raw = gemini_config.generate_lkpd(theme, level)
-        if not isinstance(lkpd_data, dict):
-            raise HTTPException(status_code=500, detail="AI tidak menghasilkan data LKPD yang valid.")
-
-        # buat id singkat
-        lkpd_id = os.urandom(4).hex()
-        path = os.path.join(LKPD_DIR, f"{lkpd_id}.json")
-
-        # enrich metadata jika perlu
-        lkpd_data.setdefault("title", lkpd_data.get("title", f"LKPD: {theme}"))
-        lkpd_data["theme"] = theme
-        lkpd_data["difficulty"] = level
-        lkpd_data["generated_at"] = datetime.utcnow().isoformat()
-
-        # pastikan questions diseragamkan (id, score, answer)
-        qlist = lkpd_data.get("questions", [])
-        for i, q in enumerate(qlist, start=1):
-            if "id" not in q:
-                q["id"] = str(i)
-            if "score" not in q:
-                q["score"] = q.get("bobot", 10)
-            if "answer" not in q:
-                q["answer"] = q.get("kunci", "") or ""
-
-        # simpan LKPD (atomic)
-        _atomic_write_json(path, lkpd_data)
-
-        response = {"id": lkpd_id, **lkpd_data}
-        return JSONResponse(response)
+        variants = _parse_variants(payload)
+        fresh = bool(payload.get("fresh"))
+
+        if payload.get("shared"):
+            # satu generate + satu id untuk semua request identik yang bersamaan;
+            # tetap diselesaikan & disimpan walau semua klien sudah pergi.
+            # fresh/variants ikut kunci: request fresh tidak menumpang generate biasa
+            key = f"{make_key(theme, level)}|{int(fresh)}|{variants}"
+            task = _shared_generations.get(key)
+            joined = task is not None
+            if not joined:
+                task = asyncio.ensure_future(_generate_and_persist(theme, level, variants, fresh))
+                _shared_generations[key] = task
+                task.add_done_callback(lambda t: _shared_generations.pop(key, None))
+            response, source = await _until_disconnect(request, asyncio.shield(task))
+            if joined:
+                source = "shared"
+                metrics.GEN_REQUESTS.inc(source=source)
+            response = copy.deepcopy(response)
+        else:
+            response, source = await _until_disconnect(request, _generate_and_persist(theme, level, variants, fresh))
+        return JSONResponse(response, headers={"X-LKPD-Cache": source})
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gagal generate LKPD: {e}")
 
 
+async def _generate_and_persist(theme: str, level: str, variants: Optional[int], fresh: bool):
+    """Generate (lewat cache + coalescing) lalu simpan sebagai LKPD baru. Return (response, sumber)."""
+    # generate_lkpd expected to return (data_dict, raw_text)
+    lkpd_data, source = await generation_cache.get_or_generate(
+        theme, level,
+        lambda: gemini_config.agenerate_lkpd(theme, level),
+        variants=variants,
+        fresh=fresh,
+    )
+    if not isinstance(lkpd_data, dict):
+        raise HTTPException(status_code=500, detail="AI tidak menghasilkan data LKPD yang valid.")
+
+    # setiap pemanggil mendapat salinan sendiri -> id LKPD sendiri
+    lkpd_id = await run_in_threadpool(persist_generated, theme, level, lkpd_data)
+    return {"id": lkpd_id, **lkpd_data}, source
+
+
+@router.post("/generate/stream")
+async def generate_stream_endpoint(payload: Dict[str, Any]):
+    """
+    Sama dengan /generate, tetapi hasilnya dikirim sebagai Server-Sent Events:
+      event ``question`` : satu soal, dikirim begitu soal itu selesai dibuat
+      event ``done``     : LKPD lengkap yang sudah tersimpan ({ "id": ..., ...lkpd_data })
+      event ``error``    : { "detail": ... } bila generate gagal
+    Karena memakai POST, klien membaca stream lewat fetch (bukan EventSource).
+    """
+    theme = payload.get("theme") or payload.get("tema")
+    level = payload.get("level") or payload.get("tingkat") or payload.get("difficulty")
+    if not theme or not level:
+        raise HTTPException(status_code=400, detail="Parameter 'theme' dan 'level' wajib diisi.")
+    variants = _parse_variants(payload)
+
+    async def _generate(publish):
+        lkpd_data = None
+        async for kind, item in gemini_config.agenerate_lkpd_stream(theme, level):
+            if kind == "question":
+                await publish(item)
+            else:
+                lkpd_data = item
+        return lkpd_data
+
+    async def _events():
+        try:
+            lkpd_data, flight, source = await generation_cache.join(
+                theme, level, _generate, variants, fresh=bool(payload.get("fresh")))
+            sent = 0
+            if flight is not None:
+                # klien terputus -> generator dibatalkan -> attach melepas penunggu ini
+                async with generation_cache.attach(flight):
+                    async for q in flight.follow():
+                        sent += 1
+                        yield _sse("question", normalize_question(q, sent))
+                    lkpd_data = await flight.result()
+            if not sent:
+                # cache hit, atau ikut generate identik dari /generate (tidak di-stream)
+                for i, q in enumerate(lkpd_data.get("questions", []), start=1):
+                    yield _sse("question", normalize_question(q, i))
+
+            lkpd_id = await run_in_threadpool(persist_generated, theme, level, lkpd_data)
+            yield _sse("done", {"id": lkpd_id, "cache": source, **lkpd_data})
+        except Exception as e:
+            yield _sse("error", {"detail": f"Gagal generate LKPD: {e}"})
+
+    return StreamingResponse(_events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# -------------------------
+#  Endpoint: job generate massal
+# -------------------------
+@router.post("/jobs")
+async def create_job(payload: Dict[str, Any]):
+    """
+    Request body (JSON), salah satu atau gabungan:
+      { "items": [{"theme": "Fotosintesis", "level": "mudah"}, ...] }
+      { "themes": ["Fotosintesis", "Ekosistem"], "levels": ["mudah", "sulit"] }   (matriks)
+      opsional: "name", "fresh": true (abaikan cache)
+    Response => ringkasan job ({ "id", "status", "total", "done", ... }), status 202
+    """
+    try:
+        job = generation_jobs.submit(payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError:
+        raise HTTPException(status_code=503, detail="Job tidak bisa dibuat saat ini, coba lagi.")
+    return JSONResponse(summarize_job(job), status_code=202)
+
+
+@router.get("/jobs")
+async def list_jobs():
+    return JSONResponse(generation_jobs.list_jobs())
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Progres job + daftar item ({theme, level, status, lkpd_id, error})."""
+    job = generation_jobs.load(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan.")
+    return JSONResponse({**summarize_job(job), "items": job["items"]})
+
+
+@router.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    """Lanjutkan job; item yang gagal dicoba lagi, item yang selesai dilewati."""
+    job = generation_jobs.resume(job_id)
+    if job is None:
+        if generation_jobs.load(job_id) is None:
+            raise HTTPException(status_code=404, detail="Job tidak ditemukan.")
+        raise HTTPException(status_code=409, detail="Job sedang dikerjakan proses lain.")
+    return JSONResponse(summarize_job(job), status_code=202)
+
+
+@router.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str, request: Request):
+    """
+    Server-Sent Events: event ``progress`` (ringkasan job) setiap ada perubahan
+    dan event ``item`` untuk setiap item yang selesai/gagal. Stream berakhir
+    setelah job selesai.
+    """
+    if generation_jobs.load(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan.")
+
+    async def _events():
+        signal = job_events.subscribe(job_id)
+        reported = set()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                job = generation_jobs.load(job_id) or {}
+                for it in job.get("items", []):
+                    if it["status"] in ("done", "failed") and (it["index"], it["status"]) not in reported:
+                        reported.add((it["index"], it["status"]))
+                        yield _sse("item", it)
+                yield _sse("progress", summarize_job(job))
+                if job.get("status") not in ("queued", "running"):
+                    break
+                try:
+                    # dibangunkan oleh job_events; timeout = polling untuk job milik worker lain
+                    await asyncio.wait_for(signal.get(), SSE_IDLE_POLL)
+                except asyncio.TimeoutError:
+                    pass
+                if await request.is_disconnected():
+                    break
+        finally:
+            job_events.unsubscribe(job_id, signal)
+
+    return StreamingResponse(_events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 # -------------------------
 #  Endpoint: ambil LKPD
 # -------------------------
 @router.get("/lkpd/{lkpd_id}")
-async def get_lkpd(lkpd_id: str):
-    path = os.path.join(LKPD_DIR, f"{lkpd_id}.json")
-    data = _safe_load_json(path)
-    if not data:
+async def get_lkpd(lkpd_id: str, request: Request):
+    doc = storage.lkpd_doc(lkpd_id)
+    if not doc:
         raise HTTPException(status_code=404, detail="LKPD tidak ditemukan.")
-    return JSONResponse(content=data)
+    headers = {"ETag": doc.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == doc.etag:
+        return Response(status_code=304, headers=headers)
+    if len(doc.body) >= compression.GZIP_MIN_SIZE and compression.accepts(request.headers.get("accept-encoding"), "gzip"):
+        # body gzip di-cache bersama dokumen; GZipMiddleware melewati respon ber-Content-Encoding
+        return Response(content=doc.gzip_body, media_type="application/json",
+                        headers={**headers, "Content-Encoding": "gzip"})
+    return Response(content=doc.body, media_type="application/json", headers=headers)
 
 
 # -------------------------
 #  Endpoint: submit jawaban siswa
 # -------------------------
+def _persist_submission(lkpd_id: str, result: dict, question_ids, score_pct: float, correct) -> None:
+    """Simpan submission + update katalog & analitik (blocking, dipanggil di threadpool)."""
+    storage.append_answer(lkpd_id, result)
+    catalog.add_submissions(lkpd_id)
+    analytics.record(lkpd_id, question_ids, score_pct, correct, seq=result.get("seq"))
+
+
 @router.post("/submit")
 async def submit_answers(payload: Dict[str, Any]):
     """
@@ -141,54 +332,65 @@ async def submit_answers(payload: Dict[str, Any]):
     {
       "lkpd_id": "...",
       "name": "Nama Siswa",
-      "answers": [ { "id": "1", "jawaban": "A", ... }, ... ]
+      "answers": { "1": "A", "2": "fotosintesis", ... }
     }
+    Format lama ``"answers": [ { "id": "1", "jawaban": "A", ... }, ... ]`` tetap diterima.
+    Yang disimpan hanya peta id soal -> jawaban plus ``lkpd_hash`` (versi kunci).
     """
     try:
         lkpd_id = payload.get("lkpd_id")
         name = payload.get("name") or payload.get("nama")
-        answers = payload.get("answers") or payload.get("jawaban") or []
+        answers = scoring.answer_map(payload.get("answers") or payload.get("jawaban") or [])
 
         if not lkpd_id or not name:
             raise HTTPException(status_code=400, detail="Field 'lkpd_id' dan 'name' wajib diisi.")
 
-        lkpd_path = os.path.join(LKPD_DIR, f"{lkpd_id}.json")
-        lkpd_data = _safe_load_json(lkpd_path)
+        lkpd_data = _load_lkpd(lkpd_id)
         if not lkpd_data:
             raise HTTPException(status_code=404, detail="LKPD tidak ditemukan.")
 
-        # gunakan analyzer untuk menghitung score dan mendapatkan feedback
-        try:
-            result = gemini_config.analyze_answer_with_ai(lkpd_data, answers, name)
-        except Exception as e:
-            # fallback: hitung skor otomatis sederhana (PG compare)
-            total = 0.0
-            max_score = 0.0
-            for q in lkpd_data.get("questions", []):
-                k = (q.get("answer") or "").strip().upper()
-                bobot = float(q.get("score", 10))
-                max_score += bobot
-                j = next((a.get("jawaban", "") for a in answers if str(a.get("id")) == str(q.get("id"))), "")
-                if j and j.strip().upper() == k:
-                    total += bobot
-            score_pct = round((total / max_score) * 100, 2) if max_score > 0 else 0.0
-            result = {
-                "name": name,
-                "score": score_pct,
-                "feedback": "Feedback AI gagal (fallback otomatis terpakai).",
-                "max_score": max_score,
-                "computed_by": "fallback"
-            }
+        # hitung skor lokal (kunci terkompilasi & ter-cache per LKPD);
+        # feedback AI diisi belakangan oleh feedback_queue
+        with metrics.span("scoring"):
+            ck = scoring.compile_key(lkpd_id, lkpd_data)
+            score_pct, correct = ck.evaluate(answers)
+            ambiguous = ck.pending_judgments(answers)
+        max_score = ck.max_score
+        computed_by = "auto"
+
+        result = {
+            "submission_id": uuid.uuid4().hex,
+            "name": name,
+            "score": score_pct,
+            "max_score": max_score,
+            "feedback": "",
+            "feedback_status": "pending",
+            "computed_by": computed_by,
+        }
 
         # tambah metadata
         result["submitted_at"] = datetime.utcnow().isoformat()
+        result["lkpd_hash"] = ck.key_hash
         result["answers"] = answers
-
-        # simpan ke answers file (append)
-        out_path = os.path.join(ANSWERS_DIR, f"{lkpd_id}.json")
-        existing = _safe_load_json(out_path) or []
-        existing.append(result)
-        _atomic_write_json(out_path, existing)
+        feedback_queue.own(result)
+
+        # simpan ke answers log (append-only, terkunci per LKPD)
+        # flock log jawaban / transaksi SQLite bisa menunggu worker lain: jalankan di threadpool
+        with metrics.span("persistence"):
+            await run_in_threadpool(_persist_submission, lkpd_id, result, ck.question_ids, score_pct, correct)
+        answer_events.publish(lkpd_id)
+
+        feedback_queue.enqueue({
+            "lkpd_id": lkpd_id,
+            "submission_id": result["submission_id"],
+            "name": name,
+            "theme": lkpd_data.get("theme"),
+            "score": score_pct,
+        })
+        if ambiguous:
+            # jawaban IS ambigu: dinilai LLM di background (sekali per jawaban per kelas),
+            # seluruh kelas dinilai ulang bila ada yang ternyata benar
+            short_answer.escalate(lkpd_id, lkpd_data, ambiguous, _rescore_after_judgment)
 
         return JSONResponse({"message": "Jawaban tersimpan", "result": result})
     except HTTPException:
@@ -197,30 +399,348 @@ async def submit_answers(payload: Dict[str, Any]):
         raise HTTPException(status_code=500, detail=f"Gagal submit jawaban: {e}")
 
 
+# -------------------------
+#  Endpoint: import massal jawaban (sesi offline/kertas)
+# -------------------------
+def _import_format(request: Request) -> str:
+    fmt = (request.query_params.get("format") or "").lower()
+    if fmt:
+        return fmt
+    ctype = request.headers.get("content-type", "").lower()
+    return "jsonl" if "json" in ctype else "csv"
+
+
+@router.post("/lkpd/{lkpd_id}/import")
+async def import_submissions(lkpd_id: str, request: Request):
+    """
+    Body mentah CSV (``name,question_id,answer`` per baris) atau JSONL
+    (lihat api/submission_import.py). Format dari ``?format=csv|jsonl`` atau
+    Content-Type. ``?feedback=0`` melewati antrian feedback AI.
+
+    Upload dibaca streaming, semua siswa dinilai dalam satu lintasan array,
+    lalu disimpan dengan satu kali tulis (log/transaksi) dan satu update analitik.
+    """
+    lkpd_data = _load_lkpd(lkpd_id)
+    if not lkpd_data:
+        raise HTTPException(status_code=404, detail="LKPD tidak ditemukan.")
+    ck = scoring.compile_key(lkpd_id, lkpd_data)
+    try:
+        students, rows, errors, skipped = await submission_import.collect(
+            request.stream(), _import_format(request), ck.question_ids, IMPORT_MAX_ROWS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not students:
+        return JSONResponse({"imported": 0, "rows": rows, "skipped": skipped, "errors": errors})
+
+    with metrics.span("scoring"):
+        answer_lists = [s["answers"] for s in students]
+        scores, correct = ck.evaluate_many(answer_lists)
+        ambiguous = {}
+        for answers in answer_lists:
+            for item in ck.pending_judgments(answers):
+                ambiguous.setdefault(item[:2], item)
+
+    now = datetime.utcnow().isoformat()
+    records = []
+    for s, score in zip(students, scores):
+        record = {
+            "submission_id": uuid.uuid4().hex,
+            "name": s["name"],
+            "score": float(score),
+            "max_score": ck.max_score,
+            "feedback": "",
+            "feedback_status": "pending",
+            "computed_by": "import",
+            "submitted_at": now,
+            "lkpd_hash": ck.key_hash,
+            "answers": s["answers"],
+        }
+        if s["student_id"]:
+            record["student_id"] = s["student_id"]
+        records.append(record)
+
+    with_feedback = request.query_params.get("feedback", "1") not in ("0", "false")
+    if with_feedback:
+        for record in records:
+            feedback_queue.own(record)
+
+    def _persist():
+        storage.append_many(lkpd_id, records)
+        catalog.add_submissions(lkpd_id, len(records))
+        analytics.record_many(lkpd_id, ck.question_ids, zip(scores, correct), [r.get("seq") for r in records])
+
+    with metrics.span("persistence"):
+        await run_in_threadpool(_persist)
+    answer_events.publish(lkpd_id)
+
+    if with_feedback:
+        feedback_queue.enqueue_many([{
+            "lkpd_id": lkpd_id,
+            "submission_id": r["submission_id"],
+            "name": r["name"],
+            "theme": lkpd_data.get("theme"),
+            "score": r["score"],
+        } for r in records])
+    if ambiguous:
+        short_answer.escalate(lkpd_id, lkpd_data, list(ambiguous.values()), _rescore_after_judgment)
+
+    return JSONResponse({"imported": len(records), "rows": rows, "skipped": skipped, "errors": errors})
+
+
+# -------------------------
+#  Endpoint: edit kunci jawaban & nilai ulang
+# -------------------------
+def _rescore_all(lkpd_id: str, lkpd_data: dict) -> int:
+    """Nilai ulang seluruh submission LKPD dalam satu lintasan array."""
+    ck = scoring.compile_key(lkpd_id, lkpd_data)
+
+    def _apply(records):
+        scores = ck.score_many([r.get("answers") or [] for r in records])
+        for r, sc in zip(records, scores):
+            r["score"] = float(sc)
+            r["max_score"] = ck.max_score
+            r["lkpd_hash"] = ck.key_hash
+        # masih di bawah lock jawaban: submit yang bersamaan tidak tertimpa snapshot lama
+        analytics.rebuild(lkpd_id, lkpd_data, records)
+        return records
+
+    records = storage.transform_answers(lkpd_id, _apply)
+    answer_events.publish(lkpd_id)
+    return len(records)
+
+
+def _rescore_after_judgment(lkpd_id: str) -> None:
+    lkpd_data = _load_lkpd(lkpd_id)
+    if lkpd_data:
+        _rescore_all(lkpd_id, lkpd_data)
+
+
+@router.put("/lkpd/{lkpd_id}/key")
+async def update_answer_key(lkpd_id: str, payload: Dict[str, Any]):
+    """
+    Body: { "answers": {"1": "B", ...}, "scores": {"1": 20, ...},
+            "accepted": {"3": ["klorofil", "zat hijau daun"], ...} }  (scores & accepted opsional)
+    Kunci diperbarui, putusan LLM untuk isian dihapus, lalu seluruh submission dinilai ulang.
+    """
+    lkpd_data = _load_lkpd(lkpd_id)
+    if not lkpd_data:
+        raise HTTPException(status_code=404, detail="LKPD tidak ditemukan.")
+    lkpd_data = copy.deepcopy(lkpd_data)  # data cache dipakai bersama
+    new_keys = payload.get("answers") or {}
+    new_scores = payload.get("scores") or {}
+    new_accepted = payload.get("accepted") or {}
+    if not all(isinstance(x, dict) for x in (new_keys, new_scores, new_accepted)):
+        raise HTTPException(status_code=400,
+                            detail="'answers', 'scores', dan 'accepted' harus berupa object {id: nilai}.")
+
+    for q in lkpd_data.get("questions", []):
+        qid = str(q.get("id"))
+        if qid in new_keys:
+            q["answer"] = new_keys[qid]
+        if qid in new_scores:
+            q["score"] = float(new_scores[qid])
+        if qid in new_accepted:
+            variants = new_accepted[qid]
+            q["accepted"] = [str(v) for v in (variants if isinstance(variants, list) else [variants]) if v]
+    lkpd_data["key_version"] = int(lkpd_data.get("key_version", 0)) + 1
+
+    def _save_key():
+        storage.save_lkpd(lkpd_id, lkpd_data)
+        scoring.invalidate(lkpd_id)
+        short_answer.judgments.clear(lkpd_id)
+
+    await run_in_threadpool(_save_key)
+    rescored = await run_in_threadpool(_rescore_all, lkpd_id, lkpd_data)
+    return JSONResponse({"message": "Kunci jawaban diperbarui", "rescored": rescored,
+                         "key_version": lkpd_data["key_version"]})
+
+
+@router.post("/rescore/{lkpd_id}")
+async def rescore(lkpd_id: str):
+    lkpd_data = _load_lkpd(lkpd_id)
+    if not lkpd_data:
+        raise HTTPException(status_code=404, detail="LKPD tidak ditemukan.")
+    rescored = await run_in_threadpool(_rescore_all, lkpd_id, lkpd_data)
+    return JSONResponse({"rescored": rescored})
+
+
 # -------------------------
 #  Endpoint: list answers / rekap
 # -------------------------
+def _rekap_item(r: Dict[str, Any]) -> Dict[str, Any]:
+    score = float(r.get("score", 0) or 0)
+    return {
+        "submission_id": r.get("submission_id"),
+        "seq": r.get("seq"),
+        "rev": r.get("rev"),
+        "name": r.get("name"),
+        "score": score,
+        "status": scoring.compute_status(score),
+        "submitted_at": r.get("submitted_at"),
+        "feedback": r.get("feedback", ""),
+        "feedback_status": r.get("feedback_status", "done"),
+        "total_questions": len(r.get("answers", []))
+    }
+
+
 @router.get("/answers/{lkpd_id}")
-async def list_answers(lkpd_id: str):
-    path = os.path.join(ANSWERS_DIR, f"{lkpd_id}.json")
-    data = _safe_load_json(path)
+async def list_answers(lkpd_id: str, since: Optional[int] = None):
+    """
+    Tanpa ``since``: array rekap lengkap (format lama).
+    Dengan ``since=N``: { "items": [...baru/berubah setelah N...], "cursor": M }
+    """
+    if since is not None:
+        items, cursor = await run_in_threadpool(storage.answers_since, lkpd_id, since)
+        return JSONResponse({"items": [_rekap_item(r) for r in items], "cursor": cursor})
+
+    data = await run_in_threadpool(storage.load_answers, lkpd_id)
     if not data:
         # kembalikan array kosong supaya frontend mudah menangani
         return JSONResponse([])
     # Tambah summary fields per student
-    out = []
-    for r in data:
-        score = float(r.get("score", 0) or 0)
-        status = _compute_status(score)
-        out.append({
-            "name": r.get("name"),
-            "score": score,
-            "status": status,
-            "submitted_at": r.get("submitted_at"),
-            "feedback": r.get("feedback", ""),
-            "total_questions": len(r.get("answers", []))
-        })
-    return JSONResponse(out)
+    return JSONResponse([_rekap_item(r) for r in data])
+
+
+@router.get("/answers/{lkpd_id}/stream")
+async def stream_answers(lkpd_id: str, request: Request, since: int = 0):
+    """
+    Server-Sent Events: satu event ``submission`` per submission baru atau
+    perubahan (mis. feedback AI masuk). ``id`` event = cursor, sehingga
+    EventSource melanjutkan dari Last-Event-ID saat reconnect.
+    """
+    last_id = request.headers.get("last-event-id")
+    cursor = int(last_id) if last_id and last_id.isdigit() else since
+
+    async def _events():
+        nonlocal cursor
+        signal = answer_events.subscribe(lkpd_id)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                items, new_cursor = await run_in_threadpool(storage.answers_since, lkpd_id, cursor)
+                for r in items:
+                    item = _rekap_item(r)
+                    yield f"id: {item['rev'] or new_cursor}\nevent: submission\ndata: {json.dumps(item, ensure_ascii=False)}\n\n"
+                cursor = new_cursor
+                if not items:
+                    yield ": keepalive\n\n"
+                try:
+                    # dibangunkan oleh publish(); timeout = polling ringan untuk worker lain
+                    await asyncio.wait_for(signal.get(), SSE_IDLE_POLL)
+                except asyncio.TimeoutError:
+                    pass
+                if await request.is_disconnected():
+                    break
+        finally:
+            answer_events.unsubscribe(lkpd_id, signal)
+
+    return StreamingResponse(_events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# -------------------------
+#  Endpoint: analitik kelas
+# -------------------------
+def _rebuild_analytics(lkpd_id: str, lkpd_data: dict) -> Dict[str, Any]:
+    """Bangun ulang analitik dari snapshot yang dibaca di bawah lock jawaban (tanpa menulis ulang)."""
+    out: Dict[str, Any] = {}
+
+    def _apply(records):
+        out["state"] = analytics.rebuild(lkpd_id, lkpd_data, records)
+        return records
+
+    storage.transform_answers(lkpd_id, _apply, rewrite=False)
+    return out["state"]
+
+
+@router.get("/analytics/{lkpd_id}")
+async def class_analytics(lkpd_id: str, rebuild: bool = False):
+    """
+    Ringkasan kelas yang sudah dihitung saat submit:
+    count, mean, variance/std, histogram status & nilai, tingkat benar dan
+    daya beda per soal.
+    """
+    summary = None if rebuild else analytics.get(lkpd_id)
+    if summary is None:
+        lkpd_data = _load_lkpd(lkpd_id)
+        if not lkpd_data:
+            raise HTTPException(status_code=404, detail="LKPD tidak ditemukan.")
+        state = await run_in_threadpool(_rebuild_analytics, lkpd_id, lkpd_data)
+        summary = summarize(state)
+    return JSONResponse({"lkpd_id": lkpd_id, **summary})
+
+
+# -------------------------
+#  Export (streaming)
+# -------------------------
+REKAP_HEADER = ["Nama", "Nilai (%)", "Status", "Submitted At", "Feedback"]
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXPORT_SPOOL_MAX = int(os.getenv("EXPORT_SPOOL_MAX", str(8 * 1024 * 1024)))
+
+
+def _rekap_row(r: Dict[str, Any]) -> list:
+    score = float(r.get("score", 0) or 0)
+    return [r.get("name"), score, scoring.compute_status(score), r.get("submitted_at", ""), r.get("feedback", "")]
+
+
+def _iter_rekap_rows(lkpd_ids: List[str], with_id: bool):
+    for lkpd_id in lkpd_ids:
+        for r in storage.iter_answers(lkpd_id):
+            row = _rekap_row(r)
+            yield [lkpd_id] + row if with_id else row
+
+
+def _csv_stream(header: list, rows):
+    """Generator CSV: tiap baris di-encode dan dikirim begitu dibaca."""
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    yield buf.getvalue().encode("utf-8")
+    for row in rows:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow(row)
+        yield buf.getvalue().encode("utf-8")
+
+
+def _build_xlsx(header: list, rows):
+    """XLSX mode write-only ke spooled temp file (pindah ke disk bila besar)."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Rekap Nilai")
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX)
+    wb.save(spool)
+    spool.seek(0)
+    return spool
+
+
+def _file_chunks(f, chunk_size: int = 64 * 1024):
+    try:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
+
+
+async def _xlsx_response(header: list, rows, filename: str):
+    try:
+        import openpyxl  # noqa: F401
+    except Exception:
+        raise HTTPException(status_code=500, detail="openpyxl belum terinstal. Tambahkan openpyxl ke requirements.")
+    spool = await run_in_threadpool(_build_xlsx, header, rows)
+    return StreamingResponse(_file_chunks(spool), media_type=XLSX_MEDIA_TYPE,
+                             headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+
+def _has_answers(lkpd_id: str) -> bool:
+    return next(iter(storage.iter_answers(lkpd_id)), None) is not None
 
 
 # -------------------------
@@ -228,71 +748,96 @@ async def list_answers(lkpd_id: str):
 # -------------------------
 @router.get("/export/{lkpd_id}")
 async def export_csv(lkpd_id: str):
-    path = os.path.join(ANSWERS_DIR, f"{lkpd_id}.json")
-    data = _safe_load_json(path)
-    if not data:
+    if not _has_answers(lkpd_id):
         raise HTTPException(status_code=404, detail="Belum ada jawaban untuk LKPD ini.")
 
-    # buat CSV di memori
-    buf = StringIO()
-    writer = csv.writer(buf)
-    writer.writerow(["Nama", "Nilai (%)", "Status", "Submitted At", "Feedback"])
-    for r in data:
-        score = float(r.get("score", 0) or 0)
-        status = _compute_status(score)
-        writer.writerow([r.get("name"), score, status, r.get("submitted_at", ""), r.get("feedback", "")])
-    buf.seek(0)
-
     filename = f"rekap_{lkpd_id}.csv"
-    return StreamingResponse(buf, media_type="text/csv",
+    return StreamingResponse(_csv_stream(REKAP_HEADER, _iter_rekap_rows([lkpd_id], with_id=False)),
+                             media_type="text/csv",
                              headers={"Content-Disposition": f"attachment; filename={filename}"})
 
 
 # -------------------------
-#  Endpoint: export XLSX (in-memory)
+#  Endpoint: export XLSX (write-only, spooled)
 # -------------------------
 @router.get("/export-xlsx/{lkpd_id}")
 async def export_xlsx(lkpd_id: str):
-    try:
-        from openpyxl import Workbook
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="openpyxl belum terinstal. Tambahkan openpyxl ke requirements.")
-
-    path = os.path.join(ANSWERS_DIR, f"{lkpd_id}.json")
-    data = _safe_load_json(path)
-    if not data:
+    if not _has_answers(lkpd_id):
         raise HTTPException(status_code=404, detail="Belum ada jawaban untuk LKPD ini.")
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Rekap Nilai"
+    return await _xlsx_response(REKAP_HEADER, _iter_rekap_rows([lkpd_id], with_id=False),
+                                f"rekap_{lkpd_id}.xlsx")
 
-    ws.append(["Nama", "Nilai (%)", "Status", "Submitted At", "Feedback"])
-    for r in data:
-        score = float(r.get("score", 0) or 0)
-        status = _compute_status(score)
-        ws.append([r.get("name"), score, status, r.get("submitted_at", ""), r.get("feedback", "")])
 
-    stream = BytesIO()
-    wb.save(stream)
-    stream.seek(0)
-
-    filename = f"rekap_{lkpd_id}.xlsx"
-    return StreamingResponse(stream, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                             headers={"Content-Disposition": f"attachment; filename={filename}"})
+# -------------------------
+#  Endpoint: export banyak LKPD sekaligus
+# -------------------------
+def _iter_catalog_ids(date_from: Optional[str], date_to: Optional[str]):
+    cursor = None
+    while True:
+        items, cursor = catalog.query(limit=500, cursor=cursor, date_from=date_from, date_to=date_to,
+                                      sort="generated_at", order="asc")
+        for it in items:
+            yield it["id"]
+        if not cursor:
+            return
+
+
+@router.get("/export-multi")
+async def export_multi(
+    ids: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    format: str = "csv",
+):
+    """
+    Query: ids=a1,b2,... ATAU date_from/date_to (ISO, berdasarkan generated_at LKPD).
+    format: csv | xlsx
+    """
+    if ids:
+        lkpd_ids = [i.strip() for i in ids.split(",") if i.strip()]
+    elif date_from or date_to:
+        lkpd_ids = list(_iter_catalog_ids(date_from, date_to))
+    else:
+        raise HTTPException(status_code=400, detail="Isi 'ids' atau rentang 'date_from'/'date_to'.")
+
+    header = ["LKPD ID"] + REKAP_HEADER
+    rows = _iter_rekap_rows(lkpd_ids, with_id=True)
+    stamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    if format == "xlsx":
+        return await _xlsx_response(header, rows, f"rekap_multi_{stamp}.xlsx")
+    if format != "csv":
+        raise HTTPException(status_code=400, detail="format harus 'csv' atau 'xlsx'.")
+    return StreamingResponse(_csv_stream(header, rows), media_type="text/csv",
+                             headers={"Content-Disposition": f"attachment; filename=rekap_multi_{stamp}.csv"})
 
 
 # -------------------------
 #  Endpoint: list all LKPD ids
 # -------------------------
 @router.get("/all-ids")
-async def all_ids():
+async def all_ids(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    theme: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    sort: str = "generated_at",
+    order: str = "desc",
+):
+    """
+    Daftar LKPD dari katalog terindeks (terbaru dulu).
+    Response => { "ids": [...], "items": [{id, title, theme, ...}], "next_cursor": "..." | null }
+    """
+    limit = max(1, min(int(limit), 500))
     try:
-        files = [f for f in os.listdir(LKPD_DIR) if f.endswith(".json")]
-        ids = [os.path.splitext(f)[0] for f in files]
-        return JSONResponse({"ids": ids})
+        items, next_cursor = catalog.query(limit=limit, cursor=cursor, theme=theme, date_from=date_from,
+                                           date_to=date_to, sort=sort, order=order)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Gagal membaca list LKPD: {e}")
+    return JSONResponse({"ids": [it["id"] for it in items], "items": items, "next_cursor": next_cursor})
 
 
 # -------------------------
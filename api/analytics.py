@@ -0,0 +1,193 @@
+# api/analytics.py
+"""Analitik kelas per LKPD yang diperbarui secara inkremental.
+
+Setiap submit memperbarui agregat dalam O(jumlah soal), tidak bergantung
+jumlah siswa: count, mean & M2 (Welford) untuk varians, min/max, histogram
+status dan rentang nilai, serta per soal jumlah benar dan jumlah nilai siswa
+yang menjawab benar. Dari situ tingkat kesukaran (proporsi benar) dan indeks
+daya beda (korelasi point-biserial soal vs nilai total) dihitung saat dibaca.
+
+State disimpan di SQLite (ANALYTICS_DB) dan diubah dalam transaksi
+``BEGIN IMMEDIATE`` sehingga aman untuk beberapa worker.
+
+``rebuild`` dipanggil di bawah lock jawaban (dari dalam transform) dan
+mencatat ``rebuilt_seq`` (seq submission terakhir di snapshot). ``record``
+untuk submission dengan seq <= nilai itu dilewati karena sudah terhitung,
+sehingga submit yang bersamaan dengan penilaian ulang tidak hilang/ganda.
+"""
+
+import os
+import json
+import math
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+from api.scoring import CompiledKey, compute_status
+
+ANALYTICS_DB = os.getenv("ANALYTICS_DB", os.getenv("CATALOG_DB", "data/catalog.sqlite3"))
+
+STATUSES = ["Tinggi", "Cukup", "Perlu Bimbingan"]
+SCORE_BUCKETS = 10  # 0-9, 10-19, ..., 90-100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lkpd_analytics (
+    lkpd_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+"""
+
+
+def _empty_state(question_ids: Sequence[str]) -> Dict[str, Any]:
+    return {
+        "count": 0,
+        "mean": 0.0,
+        "m2": 0.0,
+        "min": None,
+        "max": None,
+        "status_hist": {s: 0 for s in STATUSES},
+        "score_hist": [0] * SCORE_BUCKETS,
+        "question_ids": list(question_ids),
+        "correct": [0] * len(question_ids),
+        "score_sum_correct": [0.0] * len(question_ids),
+        "rebuilt_seq": 0,
+    }
+
+
+def _apply(state: Dict[str, Any], score: float, correct: Sequence[bool]) -> None:
+    """Tambahkan satu submission ke state (Welford + counter per soal)."""
+    state["count"] += 1
+    delta = score - state["mean"]
+    state["mean"] += delta / state["count"]
+    state["m2"] += delta * (score - state["mean"])
+    state["min"] = score if state["min"] is None else min(state["min"], score)
+    state["max"] = score if state["max"] is None else max(state["max"], score)
+    state["status_hist"][compute_status(score)] += 1
+    state["score_hist"][min(max(int(score // 10), 0), SCORE_BUCKETS - 1)] += 1
+    for i, ok in enumerate(correct[: len(state["correct"])]):
+        if ok:
+            state["correct"][i] += 1
+            state["score_sum_correct"][i] += score
+
+
+def summarize(state: Dict[str, Any]) -> Dict[str, Any]:
+    n = state["count"]
+    variance = state["m2"] / n if n else 0.0
+    std = math.sqrt(variance)
+    total_sum = state["mean"] * n
+    questions = []
+    for qid, c, s_correct in zip(state["question_ids"], state["correct"], state["score_sum_correct"]):
+        p = c / n if n else 0.0
+        disc = None
+        if n and 0 < c < n and std > 0:
+            mean_correct = s_correct / c
+            mean_wrong = (total_sum - s_correct) / (n - c)
+            disc = round((mean_correct - mean_wrong) / std * math.sqrt(p * (1 - p)), 3)
+        questions.append({"id": qid, "correct_count": c, "correct_rate": round(p, 3), "discrimination": disc})
+    return {
+        "count": n,
+        "mean": round(state["mean"], 2),
+        "variance": round(variance, 2),
+        "std": round(std, 2),
+        "min": state["min"],
+        "max": state["max"],
+        "status_histogram": state["status_hist"],
+        "score_histogram": [
+            {"range": f"{i * 10}-{i * 10 + 9 if i < SCORE_BUCKETS - 1 else 100}", "count": c}
+            for i, c in enumerate(state["score_hist"])
+        ],
+        "questions": questions,
+    }
+
+
+class Analytics:
+    def __init__(self, db_path: str = ANALYTICS_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _load(self, conn: sqlite3.Connection, lkpd_id: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute("SELECT state FROM lkpd_analytics WHERE lkpd_id = ?", (lkpd_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, conn: sqlite3.Connection, lkpd_id: str, state: Dict[str, Any]) -> None:
+        conn.execute("INSERT OR REPLACE INTO lkpd_analytics (lkpd_id, state) VALUES (?, ?)",
+                     (lkpd_id, json.dumps(state, separators=(",", ":"))))
+
+    def init(self, lkpd_id: str, question_ids: Sequence[str]) -> None:
+        """State kosong untuk LKPD baru (dipanggil saat generate)."""
+        self._conn().execute("INSERT OR REPLACE INTO lkpd_analytics (lkpd_id, state) VALUES (?, ?)",
+                             (lkpd_id, json.dumps(_empty_state(question_ids), separators=(",", ":"))))
+
+    def record(self, lkpd_id: str, question_ids: Sequence[str], score: float, correct: Sequence[bool],
+               seq: Optional[int] = None) -> None:
+        """Update O(1) terhadap jumlah siswa; dipanggil setiap submit (``seq`` dari storage)."""
+        self.record_many(lkpd_id, question_ids, [(score, correct)], None if seq is None else [seq])
+
+    def record_many(self, lkpd_id: str, question_ids: Sequence[str],
+                    results: Iterable[Tuple[float, Sequence[bool]]],
+                    seqs: Optional[Sequence[int]] = None) -> None:
+        """Tambahkan banyak submission (nilai, benar per soal) dalam satu transaksi.
+
+        Submission yang ``seq``-nya sudah tercakup ``rebuild`` terakhir dilewati.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            state = self._load(conn, lkpd_id)
+            if state is None:
+                # belum pernah dihitung: biarkan get() membangun dari data lengkap
+                conn.execute("ROLLBACK")
+                return
+            if state["question_ids"] != list(question_ids):
+                conn.execute("DELETE FROM lkpd_analytics WHERE lkpd_id = ?", (lkpd_id,))
+            else:
+                done = state.get("rebuilt_seq", 0)
+                for i, (score, correct) in enumerate(results):
+                    if seqs is None or int(seqs[i] or 0) > done:
+                        _apply(state, float(score), correct)
+                self._save(conn, lkpd_id, state)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def rebuild(self, lkpd_id: str, lkpd_data: dict, records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Hitung ulang dari seluruh submission (data lama atau setelah kunci diedit).
+
+        Panggil selagi lock jawaban masih dipegang (mis. di dalam ``transform_answers``)
+        agar snapshot ``records`` tidak tertinggal dari submit yang masuk bersamaan.
+        """
+        ck = CompiledKey(lkpd_data, lkpd_id)
+        state = _empty_state(ck.question_ids)
+        records = list(records)
+        rows = [ck.answer_row(r.get("answers") or []) for r in records]
+        matrix = ck.correct_matrix(rows)
+        for r, correct in zip(records, matrix):
+            _apply(state, float(r.get("score", 0) or 0), correct.tolist())
+        state["rebuilt_seq"] = max((int(r.get("seq", 0) or 0) for r in records), default=0)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._save(conn, lkpd_id, state)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return state
+
+    def get(self, lkpd_id: str) -> Optional[Dict[str, Any]]:
+        state = self._load(self._conn(), lkpd_id)
+        return summarize(state) if state is not None else None
+
+
+analytics = Analytics()
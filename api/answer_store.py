@@ -0,0 +1,536 @@
+# api/answer_store.py
+"""Penyimpanan jawaban siswa berbasis log append-only (JSON Lines).
+
+Setiap submit menambah satu baris ke ``ANSWERS_DIR/{lkpd_id}.jsonl`` sehingga
+biaya tulis tetap konstan berapapun jumlah siswa. Penulisan dikunci per LKPD
+(lock thread + ``flock`` antar-proses bila tersedia) agar tidak ada submission
+yang hilang saat banyak siswa submit bersamaan. File lama ``{lkpd_id}.json``
+(array JSON) tetap terbaca dan akan dilebur ke log saat compaction.
+
+Perubahan setelah submit (mis. feedback AI yang datang belakangan) ditulis
+sebagai baris ``{"op": "update", ...}`` dan dilebur ke record asalnya saat
+dibaca maupun saat compaction.
+
+Setiap baris membawa nomor urut ``seq`` yang naik per LKPD. Record hasil
+leburan punya ``seq`` (urutan submit) dan ``rev`` (perubahan terakhir),
+dipakai sebagai cursor oleh ``answers_since``. File ``{lkpd_id}.seq`` menyimpan
+rev maksimum saat log terakhir ditulis ulang (lihat ``_next_seq_locked``).
+
+LKPD yang sudah diarsip (api/archive.py) tidak punya file di ANSWERS_DIR;
+pembacaan jatuh ke pack arsip, dan penulisan pertama mengembalikan
+(rehydrate) seluruh jawabannya ke log sebelum baris baru ditambahkan.
+"""
+
+import os
+import json
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:  # flock hanya ada di POSIX; di Windows cukup lock thread
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from api import metrics
+from api import serializer
+from api.archive_store import archive_store, KIND_ANSWERS
+
+ANSWERS_DIR = os.getenv("ANSWERS_DIR", "data/answers")
+# compaction otomatis setiap N append (0 = nonaktif)
+COMPACT_EVERY = int(os.getenv("ANSWERS_COMPACT_EVERY", "500"))
+# jumlah LKPD yang hasil leburnya disimpan untuk answers_since (per proses)
+ANSWERS_TAIL_CACHE = int(os.getenv("ANSWERS_TAIL_CACHE", "64"))
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+_appends_since_compact: Dict[str, int] = {}
+# lkpd_id -> (ukuran log saat terakhir ditulis proses ini, seq terakhir)
+_seq_state: Dict[str, Tuple[int, int]] = {}
+
+
+def _log_path(lkpd_id: str) -> str:
+    return os.path.join(ANSWERS_DIR, f"{lkpd_id}.jsonl")
+
+
+def _legacy_path(lkpd_id: str) -> str:
+    return os.path.join(ANSWERS_DIR, f"{lkpd_id}.json")
+
+
+def _get_lock(lkpd_id: str) -> threading.Lock:
+    with _locks_guard:
+        lock = _locks.get(lkpd_id)
+        if lock is None:
+            lock = _locks[lkpd_id] = threading.Lock()
+        return lock
+
+
+@contextmanager
+def _locked(lkpd_id: str):
+    """Kunci eksklusif per LKPD: thread lock + flock pada file ``.lock``."""
+    with _get_lock(lkpd_id):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(ANSWERS_DIR, exist_ok=True)
+        with open(os.path.join(ANSWERS_DIR, f"{lkpd_id}.lock"), "a") as lf:
+            fcntl.flock(lf, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lf, fcntl.LOCK_UN)
+
+
+def _dumps_line(record: Dict[str, Any]) -> str:
+    return serializer.dumps(record) + "\n"
+
+
+# baris update selalu diawali prefix ini (lihat update_answer)
+_UPDATE_PREFIX = '{"op":"update"'
+
+
+def _read_legacy(lkpd_id: str) -> List[Dict[str, Any]]:
+    path = _legacy_path(lkpd_id)
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, list) else []
+    except Exception:
+        return []
+
+
+@metrics.STORAGE_IO.time(op="answers_read")
+def _read_log(lkpd_id: str) -> List[Dict[str, Any]]:
+    path = _log_path(lkpd_id)
+    if not os.path.exists(path):
+        return []
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                out.append(serializer.loads(line))
+            except json.JSONDecodeError:
+                # baris terpotong (mis. proses mati saat menulis) -> lewati
+                continue
+    return out
+
+
+def _fold(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Terapkan baris update ke record submission yang dirujuk."""
+    records: List[Dict[str, Any]] = []
+    by_id: Dict[str, Dict[str, Any]] = {}
+    for e in entries:
+        if e.get("op") == "update":
+            target = by_id.get(e.get("submission_id"))
+            if target is not None:
+                target.update(e.get("fields") or {})
+                if "seq" in e:
+                    target["rev"] = e["seq"]
+            continue
+        records.append(e)
+        sid = e.get("submission_id")
+        if sid:
+            by_id[sid] = e
+    return records
+
+
+def _is_hot(lkpd_id: str) -> bool:
+    return os.path.exists(_log_path(lkpd_id)) or os.path.exists(_legacy_path(lkpd_id))
+
+
+def load_answers(lkpd_id: str) -> List[Dict[str, Any]]:
+    """Semua submission untuk LKPD (urut waktu submit)."""
+    if not _is_hot(lkpd_id):
+        return archive_store.load_answers(lkpd_id)
+    return _fold(_read_legacy(lkpd_id) + _read_log(lkpd_id))
+
+
+def iter_answers(lkpd_id: str) -> Iterator[Dict[str, Any]]:
+    """Seperti load_answers tetapi berupa generator (untuk export besar).
+
+    Lintasan pertama hanya mengumpulkan baris update; lintasan kedua
+    menghasilkan record satu per satu sehingga memori tidak tumbuh dengan
+    jumlah submission.
+    """
+    if not _is_hot(lkpd_id):
+        yield from archive_store.load_answers(lkpd_id)
+        return
+    updates: Dict[str, Dict[str, Any]] = {}
+    path = _log_path(lkpd_id)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.startswith(_UPDATE_PREFIX):
+                    continue
+                try:
+                    e = serializer.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                patch = updates.setdefault(e.get("submission_id"), {})
+                patch.update(e.get("fields") or {})
+                if "seq" in e:
+                    patch["rev"] = e["seq"]
+
+    def _patched(r: Dict[str, Any]) -> Dict[str, Any]:
+        patch = updates.get(r.get("submission_id"))
+        if patch:
+            r.update(patch)
+        return r
+
+    for r in _read_legacy(lkpd_id):
+        yield _patched(r)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith(_UPDATE_PREFIX):
+                    continue
+                try:
+                    yield _patched(serializer.loads(line))
+                except json.JSONDecodeError:
+                    continue
+
+
+def _log_size(lkpd_id: str) -> int:
+    try:
+        return os.path.getsize(_log_path(lkpd_id))
+    except OSError:
+        return 0
+
+
+def _seq_path(lkpd_id: str) -> str:
+    return os.path.join(ANSWERS_DIR, f"{lkpd_id}.seq")
+
+
+def _read_seq_mark(lkpd_id: str) -> Optional[int]:
+    """Seq/rev maksimum yang dicatat saat log terakhir ditulis ulang; None bila tidak ada."""
+    try:
+        with open(_seq_path(lkpd_id), "r", encoding="ascii") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_seq_mark(lkpd_id: str, seq: int) -> None:
+    with open(_seq_path(lkpd_id), "w", encoding="ascii") as f:
+        f.write(str(seq))
+
+
+def _last_line(path: str) -> bytes:
+    """Baris terakhir file (tanpa newline), dibaca dari ekor per blok."""
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return b""
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        buf = b""
+        pos = end
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+            nl = buf.rstrip(b"\n").rfind(b"\n")
+            if nl >= 0:
+                return buf[nl + 1:].strip()
+        return buf.strip()
+
+
+def _next_seq_locked(lkpd_id: str) -> int:
+    """Seq berikutnya; bila worker lain ikut menulis, cukup baca baris terakhir log.
+
+    Baris yang di-append selalu membawa seq terbesar. Setelah log ditulis ulang
+    urutan rev tidak lagi menaik, jadi rev maksimum saat itu dicatat di file
+    ``.seq``. Scan penuh hanya bila catatan itu tidak ada (log lama) atau baris
+    terakhir rusak.
+    """
+    size = _log_size(lkpd_id)
+    cached = _seq_state.get(lkpd_id)
+    if cached is not None and cached[0] == size:
+        return cached[1] + 1
+    mark = _read_seq_mark(lkpd_id)
+    line = _last_line(_log_path(lkpd_id)) if size else b""
+    try:
+        e = serializer.loads(line) if line else {}
+    except json.JSONDecodeError:
+        mark = None
+    if mark is None:
+        last = 0
+        for e in _read_log(lkpd_id):
+            last = max(last, int(e.get("seq", 0) or 0), int(e.get("rev", 0) or 0))
+        if size:
+            _write_seq_mark(lkpd_id, last)
+        return last + 1
+    return max(mark, int(e.get("seq", 0) or 0), int(e.get("rev", 0) or 0)) + 1
+
+
+def _rehydrate_locked(lkpd_id: str) -> None:
+    """Jawaban LKPD yang diarsip dikembalikan ke log sebelum ditulis (log jadi sumber utama lagi)."""
+    if _is_hot(lkpd_id):
+        return
+    records = archive_store.load_answers(lkpd_id)
+    if records:
+        _rewrite_locked(lkpd_id, records)
+
+
+@metrics.STORAGE_IO.time(op="answers_append")
+def _append_line_locked(lkpd_id: str, entry: Dict[str, Any]) -> None:
+    with open(_log_path(lkpd_id), "a", encoding="utf-8") as f:
+        f.write(_dumps_line(entry))
+        f.flush()
+    _seq_state[lkpd_id] = (_log_size(lkpd_id), entry["seq"])
+
+
+@metrics.STORAGE_IO.time(op="answers_append_many")
+def _append_lines_locked(lkpd_id: str, entries: List[Dict[str, Any]]) -> None:
+    with open(_log_path(lkpd_id), "a", encoding="utf-8") as f:
+        f.write("".join(_dumps_line(e) for e in entries))
+        f.flush()
+    _seq_state[lkpd_id] = (_log_size(lkpd_id), entries[-1]["seq"])
+
+
+def append_answer(lkpd_id: str, record: Dict[str, Any]) -> int:
+    """Tambah satu submission ke log. O(1) terhadap jumlah submission. Return seq."""
+    os.makedirs(ANSWERS_DIR, exist_ok=True)
+    with _locked(lkpd_id):
+        _rehydrate_locked(lkpd_id)
+        seq = _next_seq_locked(lkpd_id)
+        record["seq"] = record["rev"] = seq
+        _append_line_locked(lkpd_id, record)
+        count = _appends_since_compact.get(lkpd_id, 0) + 1
+        _appends_since_compact[lkpd_id] = count
+        if os.path.exists(_legacy_path(lkpd_id)) or (COMPACT_EVERY and count >= COMPACT_EVERY):
+            _compact_locked(lkpd_id)
+        return seq
+
+
+def append_many(lkpd_id: str, records: List[Dict[str, Any]]) -> List[int]:
+    """Tambah banyak submission dengan satu lock dan satu kali tulis. Return daftar seq."""
+    if not records:
+        return []
+    os.makedirs(ANSWERS_DIR, exist_ok=True)
+    with _locked(lkpd_id):
+        _rehydrate_locked(lkpd_id)
+        first = _next_seq_locked(lkpd_id)
+        for i, record in enumerate(records):
+            record["seq"] = record["rev"] = first + i
+        _append_lines_locked(lkpd_id, records)
+        count = _appends_since_compact.get(lkpd_id, 0) + len(records)
+        _appends_since_compact[lkpd_id] = count
+        if os.path.exists(_legacy_path(lkpd_id)) or (COMPACT_EVERY and count >= COMPACT_EVERY):
+            _compact_locked(lkpd_id)
+        return [r["seq"] for r in records]
+
+
+def update_answer(lkpd_id: str, submission_id: str, fields: Dict[str, Any]) -> int:
+    """Perbarui field sebuah submission dengan menambah baris update ke log. Return seq."""
+    with _locked(lkpd_id):
+        _rehydrate_locked(lkpd_id)
+        seq = _next_seq_locked(lkpd_id)
+        _append_line_locked(lkpd_id, {"op": "update", "submission_id": submission_id,
+                                      "fields": fields, "seq": seq})
+        return seq
+
+
+@metrics.STORAGE_IO.time(op="answers_rewrite")
+def _rewrite_locked(lkpd_id: str, records: List[Dict[str, Any]]) -> None:
+    fd, tmp = tempfile.mkstemp(prefix="tmp", dir=ANSWERS_DIR, suffix=".jsonl")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for r in records:
+                f.write(_dumps_line(r))
+        os.replace(tmp, _log_path(lkpd_id))
+    except Exception:
+        try:
+            os.remove(tmp)
+        except Exception:
+            pass
+        raise
+    legacy = _legacy_path(lkpd_id)
+    if os.path.exists(legacy):
+        os.remove(legacy)
+    _appends_since_compact[lkpd_id] = 0
+    last = max((int(r.get("rev", 0) or 0) for r in records), default=0)
+    _write_seq_mark(lkpd_id, last)
+    _seq_state[lkpd_id] = (_log_size(lkpd_id), last)
+    _forget_tail(lkpd_id)
+
+
+def _compact_locked(lkpd_id: str) -> None:
+    _rewrite_locked(lkpd_id, load_answers(lkpd_id))
+
+
+def compact(lkpd_id: str) -> None:
+    """Tulis ulang log: lebur file legacy & baris update, buang baris rusak."""
+    with _locked(lkpd_id):
+        _rehydrate_locked(lkpd_id)
+        _compact_locked(lkpd_id)
+
+
+def transform(lkpd_id: str, fn: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]],
+              rewrite: bool = True) -> List[Dict[str, Any]]:
+    """Baca-ubah-tulis seluruh submission di bawah lock (mis. penilaian ulang).
+
+    ``rewrite=False``: ``fn`` hanya membaca snapshot di bawah lock (log tidak
+    ditulis ulang dan rev tidak berubah), mis. untuk membangun ulang analitik.
+    """
+    with _locked(lkpd_id):
+        if not rewrite:
+            return fn(load_answers(lkpd_id))
+        _rehydrate_locked(lkpd_id)
+        seq = _next_seq_locked(lkpd_id)
+        records = fn(load_answers(lkpd_id))
+        for i, r in enumerate(records):
+            r["rev"] = seq + i  # semua record dianggap berubah untuk klien delta
+        _rewrite_locked(lkpd_id, records)
+        return records
+
+
+class _Tail:
+    """Hasil lebur log sampai ``offset`` byte untuk ``answers_since``.
+
+    ``records`` (key submission_id) diurutkan menurut rev naik: baris yang
+    di-append selalu membawa seq terbesar, jadi record baru/berubah cukup
+    dipindah ke ujung. Setiap panggilan hanya membaca byte setelah ``offset``.
+    """
+
+    def __init__(self, ino: int):
+        self.lock = threading.Lock()
+        self.reset(ino)
+
+    def reset(self, ino: int) -> None:
+        self.ino = ino
+        self.offset = 0
+        self.cursor = 0
+        self.records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def fold(self, data: bytes) -> None:
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                e = serializer.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if e.get("op") == "update":
+                key = e.get("submission_id")
+                target = self.records.pop(key, None)
+                if target is None:
+                    continue
+                target.update(e.get("fields") or {})
+                if "seq" in e:
+                    target["rev"] = e["seq"]
+                self.records[key] = target
+            else:
+                self.records[e.get("submission_id") or f"#{e.get('seq') or id(e)}"] = e
+            self.cursor = max(self.cursor, int(e.get("rev", e.get("seq", 0)) or 0))
+
+    def read(self, f, size: int) -> None:
+        """Lebur baris utuh antara ``offset`` dan ``size`` (baris yang sedang ditulis ditunda)."""
+        first = self.offset == 0
+        f.seek(self.offset)
+        data = f.read(size - self.offset)
+        end = data.rfind(b"\n") + 1
+        self.fold(data[:end])
+        self.offset += end
+        if first:  # log hasil tulis ulang: urutan rev belum tentu naik
+            self.records = OrderedDict(sorted(self.records.items(),
+                                              key=lambda kv: int(kv[1].get("rev", 0) or 0)))
+
+
+_tails: "OrderedDict[str, _Tail]" = OrderedDict()
+_tails_guard = threading.Lock()
+
+
+def _tail_for(lkpd_id: str, ino: int) -> _Tail:
+    with _tails_guard:
+        tail = _tails.get(lkpd_id)
+        if tail is None or tail.ino != ino:
+            tail = _tails[lkpd_id] = _Tail(ino)
+        _tails.move_to_end(lkpd_id)
+        while len(_tails) > max(1, ANSWERS_TAIL_CACHE):
+            _tails.popitem(last=False)
+        return tail
+
+
+def _forget_tail(lkpd_id: str) -> None:
+    with _tails_guard:
+        _tails.pop(lkpd_id, None)
+
+
+def _filter_since(records: List[Dict[str, Any]], since: int) -> Tuple[List[Dict[str, Any]], int]:
+    cursor = max((int(r.get("rev", 0) or 0) for r in records), default=0)
+    if since <= 0:
+        return records, cursor
+    return [r for r in records if int(r.get("rev", 0) or 0) > since], max(cursor, since)
+
+
+def answers_since(lkpd_id: str, since: int) -> Tuple[List[Dict[str, Any]], int]:
+    """Submission yang dibuat/berubah setelah ``since``. Return (items, cursor).
+
+    Log panas dibaca inkremental lewat ``_Tail`` (hanya byte yang baru
+    di-append); arsip dan file legacy memakai pembacaan penuh.
+    """
+    if os.path.exists(_legacy_path(lkpd_id)):
+        return _filter_since(load_answers(lkpd_id), since)
+    try:
+        f = open(_log_path(lkpd_id), "rb")
+    except OSError:
+        return _filter_since(archive_store.load_answers(lkpd_id), since)
+    with f:
+        st = os.fstat(f.fileno())
+        tail = _tail_for(lkpd_id, st.st_ino)
+        with tail.lock:
+            if st.st_size < tail.offset:  # log terpotong/diganti: mulai dari awal
+                tail.reset(st.st_ino)
+            if st.st_size > tail.offset:
+                tail.read(f, st.st_size)
+            items = []
+            for r in reversed(tail.records.values()):
+                if since > 0 and int(r.get("rev", 0) or 0) <= since:
+                    break
+                items.append(dict(r))
+            cursor = tail.cursor
+    items.sort(key=lambda r: int(r.get("seq", 0) or 0))
+    return items, max(cursor, since) if since > 0 else cursor
+
+
+def has_answers(lkpd_id: str) -> bool:
+    return _is_hot(lkpd_id) or archive_store.has(lkpd_id, KIND_ANSWERS)
+
+
+def hot_ids() -> List[str]:
+    """LKPD yang punya log/file jawaban di ANSWERS_DIR (LKPD arsip tidak termasuk)."""
+    if not os.path.isdir(ANSWERS_DIR):
+        return []
+    ids = set()
+    for name in os.listdir(ANSWERS_DIR):
+        stem, ext = os.path.splitext(name)
+        if ext in (".jsonl", ".json") and not name.startswith("tmp"):
+            ids.add(stem)
+    return sorted(ids)
+
+
+def hot_contains(lkpd_id: str, needle: bytes, chunk_size: int = 1 << 20) -> bool:
+    """Prefilter murah: apakah ``needle`` muncul di file jawaban panas (tanpa parse JSON)."""
+    for path in (_log_path(lkpd_id), _legacy_path(lkpd_id)):
+        try:
+            with open(path, "rb") as f:
+                carry = b""
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    if needle in carry + chunk:
+                        return True
+                    carry = chunk[-(len(needle) - 1):] if len(needle) > 1 else b""
+        except FileNotFoundError:
+            continue
+    return False
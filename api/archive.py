@@ -0,0 +1,250 @@
+# api/archive.py
+"""Pengarsipan LKPD lama (backend file) ke pack terkompres.
+
+LKPD yang file-nya (``LKPD_DIR/{id}.json`` dan log jawaban di ANSWERS_DIR)
+tidak berubah selama ARCHIVE_AFTER_DAYS hari dikemas bersama jawabannya ke
+satu pack di ARCHIVE_DIR (lihat api/archive_store.py), lalu file panasnya
+dihapus. /lkpd, /answers, rekap, dan export tetap membaca LKPD tersebut lewat
+backend file (index mmap + satu pread). Submit/penilaian ulang pada LKPD yang
+sudah diarsip mengembalikan jawabannya ke log panas; pack lama tidak diubah.
+
+Pemakaian:
+    python -m api.archive                # arsipkan sesuai ARCHIVE_AFTER_DAYS
+    python -m api.archive --days 90      # ambang lain
+    python -m api.archive abc123 ...     # LKPD tertentu (tanpa cek umur)
+    python -m api.archive --dry-run      # hitung saja, tanpa menulis
+    python -m api.archive --list         # daftar pack
+
+Di server, ``archiver`` menjalankan pengarsipan yang sama setiap
+ARCHIVE_INTERVAL_HOURS jam (0 = nonaktif); antar-worker hanya satu yang
+jalan (flock pada ``ARCHIVE_DIR/.archive.lock``). File ``.lock`` per LKPD
+di ANSWERS_DIR sengaja tidak dihapus (dipakai flock penulis lain).
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+try:  # flock hanya ada di POSIX; tanpa flock pengarsipan dianggap milik proses ini
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from dotenv import load_dotenv
+
+# muat .env sebelum modul lain membaca konfigurasi dari environment
+load_dotenv()
+
+from api import answer_store
+from api.archive_store import archive_store, KIND_ANSWERS, KIND_LKPD, pack_key
+from api.db import get_backend
+from api.lkpd_cache import lkpd_cache
+
+logger = logging.getLogger("eduai")
+
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("ARCHIVE_INTERVAL_HOURS", "24"))
+ARCHIVE_PACK_MAX_ITEMS = int(os.getenv("ARCHIVE_PACK_MAX_ITEMS", "1000"))
+
+Stamp = Optional[Tuple[int, int]]
+
+
+def _stamp(path: str) -> Stamp:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _hot_files(lkpd_path: str, lkpd_id: str) -> List[str]:
+    return [lkpd_path, answer_store._log_path(lkpd_id), answer_store._legacy_path(lkpd_id)]
+
+
+def _ids_in(directory: str, exts: Tuple[str, ...]) -> List[str]:
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.splitext(f)[0] for f in os.listdir(directory)
+            if f.endswith(exts) and not f.startswith("tmp")]
+
+
+def candidates(storage, older_than_days: float, now: Optional[float] = None) -> List[str]:
+    """ID LKPD yang seluruh file panasnya lebih tua dari ambang.
+
+    Termasuk log jawaban panas milik LKPD yang dokumennya sudah diarsip
+    (jawaban yang di-rehydrate lalu tidak disentuh lagi).
+    """
+    cutoff = (now or time.time()) - older_than_days * 86400
+    ids = set(_ids_in(storage.lkpd_dir, (".json",))) | set(_ids_in(answer_store.ANSWERS_DIR, (".json", ".jsonl")))
+    out = []
+    for lkpd_id in sorted(ids):
+        if pack_key(lkpd_id) is None:
+            continue
+        stamps = [s for s in map(_stamp, _hot_files(storage._path(lkpd_id), lkpd_id)) if s]
+        if stamps and max(s[0] for s in stamps) / 1e9 < cutoff:
+            out.append(lkpd_id)
+    return out
+
+
+def _collect(storage, lkpd_id: str):
+    """(item pack, stamp file panas, byte panas) untuk satu LKPD; None bila tidak ada yang panas."""
+    path = storage._path(lkpd_id)
+    with answer_store._locked(lkpd_id):
+        stamps = {p: _stamp(p) for p in _hot_files(path, lkpd_id)}
+        if not any(stamps.values()):
+            return None  # sudah sepenuhnya di arsip
+        try:
+            with open(path, "rb") as f:
+                lkpd_raw = f.read()
+        except OSError:
+            lkpd_raw = archive_store.read(lkpd_id, KIND_LKPD)  # dokumen sudah diarsip sebelumnya
+        if lkpd_raw is None:
+            return None
+        records = answer_store.load_answers(lkpd_id)
+    items = [(lkpd_id, KIND_LKPD, lkpd_raw)]
+    if records:
+        items.append((lkpd_id, KIND_ANSWERS,
+                      "".join(answer_store._dumps_line(r) for r in records).encode("utf-8")))
+    return items, stamps, sum(s[1] for s in stamps.values() if s)
+
+
+def _drop_hot(storage, lkpd_id: str, stamps: Dict[str, Stamp]) -> bool:
+    """Hapus file panas bila tidak berubah sejak dikemas. False bila ada yang berubah."""
+    with answer_store._locked(lkpd_id):
+        if any(_stamp(p) != s for p, s in stamps.items()):
+            return False  # ditulis saat dikemas: salinan panas tetap jadi sumber utama
+        for p, s in stamps.items():
+            if s is not None:
+                os.remove(p)
+        try:  # catatan seq ikut log; rehydrate menulisnya lagi
+            os.remove(answer_store._seq_path(lkpd_id))
+        except FileNotFoundError:
+            pass
+        lkpd_cache.invalidate(storage._path(lkpd_id))
+        answer_store._seq_state.pop(lkpd_id, None)
+        answer_store._appends_since_compact.pop(lkpd_id, None)
+        answer_store._forget_tail(lkpd_id)
+    return True
+
+
+def _pack_name() -> str:
+    # urut leksikal = urut waktu (pack terbaru menang saat dibaca)
+    return time.strftime("%Y%m%d-%H%M%S", time.gmtime()) + "-" + os.urandom(3).hex()
+
+
+def _report(out, msg: str) -> None:
+    if out is None:
+        logger.info(msg)
+    else:
+        print(msg, file=out)
+
+
+def archive(lkpd_ids: Optional[List[str]] = None, older_than_days: float = ARCHIVE_AFTER_DAYS,
+            dry_run: bool = False, out=sys.stdout) -> Dict[str, int]:
+    """Arsipkan LKPD lama (atau ``lkpd_ids`` tanpa cek umur). Return ringkasan."""
+    totals = {"lkpd": 0, "skipped": 0, "packs": 0, "bytes_hot": 0}
+    storage = get_backend()
+    if storage.name != "file":
+        _report(out, "Arsip hanya untuk STORAGE_BACKEND=file; dilewati.")
+        return totals
+
+    os.makedirs(archive_store.archive_dir, exist_ok=True)
+    lock = open(os.path.join(archive_store.archive_dir, ".archive.lock"), "a")
+    try:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                _report(out, "Pengarsipan sedang berjalan di proses lain.")
+                return totals
+        ids = lkpd_ids or candidates(storage, older_than_days)
+        for start in range(0, len(ids), max(1, ARCHIVE_PACK_MAX_ITEMS)):
+            batch, items, stamps = ids[start:start + ARCHIVE_PACK_MAX_ITEMS], [], {}
+            for lkpd_id in batch:
+                collected = _collect(storage, lkpd_id)
+                if collected is None:
+                    totals["skipped"] += 1
+                    continue
+                entries, stamps[lkpd_id], size = collected
+                items.extend(entries)
+                totals["bytes_hot"] += size
+            if not stamps:
+                continue
+            if dry_run:
+                totals["lkpd"] += len(stamps)
+                continue
+            name = _pack_name()
+            archive_store.write_pack(name, items)
+            totals["packs"] += 1
+            for lkpd_id, st in stamps.items():
+                if _drop_hot(storage, lkpd_id, st):
+                    totals["lkpd"] += 1
+                else:
+                    totals["skipped"] += 1
+            _report(out, f"Pack {name}: {len(stamps)} LKPD, {len(items)} entry.")
+    finally:
+        lock.close()
+
+    verb = "bisa diarsip" if dry_run else "diarsip"
+    _report(out, f"Selesai: {totals['lkpd']} LKPD {verb} ({totals['bytes_hot']} byte file panas), "
+                 f"{totals['skipped']} dilewati.")
+    return totals
+
+
+def list_packs(out=sys.stdout) -> None:
+    for pack in archive_store._current():
+        _report(out, f"{pack.name}: {len(list(pack.keys(KIND_LKPD)))} LKPD, {pack.count} entry")
+
+
+# -------------------------
+#  Background task (server)
+# -------------------------
+class Archiver:
+    def __init__(self, interval_hours: float = ARCHIVE_INTERVAL_HOURS, older_than_days: float = ARCHIVE_AFTER_DAYS):
+        self.interval = interval_hours * 3600
+        self.older_than_days = older_than_days
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        await asyncio.sleep(min(self.interval, 300))  # jangan bebani startup
+        while True:
+            try:
+                await asyncio.to_thread(archive, None, self.older_than_days, False, None)
+            except Exception as e:
+                logger.warning(f"Pengarsipan LKPD gagal: {e}")
+            await asyncio.sleep(self.interval)
+
+
+archiver = Archiver()
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Arsipkan LKPD lama beserta jawabannya ke pack terkompres.")
+    p.add_argument("lkpd_ids", nargs="*", help="ID LKPD (default: semua yang melewati ambang umur)")
+    p.add_argument("--days", type=float, default=ARCHIVE_AFTER_DAYS, help="umur minimal (hari) sejak terakhir diubah")
+    p.add_argument("--dry-run", action="store_true", help="hanya hitung, tidak menulis")
+    p.add_argument("--list", action="store_true", help="tampilkan pack yang ada")
+    args = p.parse_args(argv)
+    if args.list:
+        list_packs()
+        return 0
+    archive(args.lkpd_ids, older_than_days=args.days, dry_run=args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
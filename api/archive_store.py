@@ -0,0 +1,229 @@
+# api/archive_store.py
+"""Tier arsip (cold storage) untuk LKPD lama beserta jawabannya.
+
+Satu pack terdiri dari dua file di ARCHIVE_DIR:
+  ``{nama}.pack`` : header ``EDUPACK1`` lalu blob zlib berurutan (JSON LKPD
+                    dan JSON Lines jawaban, masing-masing dikompres sendiri);
+  ``{nama}.idx``  : header ``EDUIDX01`` + jumlah entry, lalu entry ukuran tetap
+                    ``(lkpd_id[64], jenis, offset, panjang_kompres, panjang_asli)``
+                    urut (lkpd_id, jenis).
+Index dibuka dengan mmap dan dicari biner, jadi satu item arsip cukup satu
+``pread`` ke file pack. Pack yang lebih baru menang bila satu LKPD pernah
+diarsip lebih dari sekali. Pack ditulis sekali lalu tidak pernah diubah;
+``.idx`` di-rename paling akhir sehingga pembaca tidak melihat pack setengah jadi.
+
+Modul ini hanya membaca/menulis pack; pemilihan LKPD yang diarsip ada di
+api/archive.py.
+"""
+
+import os
+import bisect
+import mmap
+import zlib
+import struct
+import logging
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from api import metrics
+from api import serializer
+
+logger = logging.getLogger("eduai")
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "data/archive")
+ARCHIVE_LEVEL = int(os.getenv("ARCHIVE_LEVEL", "6"))
+
+KIND_LKPD = 0
+KIND_ANSWERS = 1
+
+_PACK_MAGIC = b"EDUPACK1"
+_IDX_MAGIC = b"EDUIDX01"
+_IDX_HEADER = struct.Struct("<8sI")
+_ENTRY = struct.Struct("<64sBQII")
+KEY_SIZE = 64
+
+
+def pack_key(lkpd_id: str) -> Optional[bytes]:
+    raw = lkpd_id.encode("utf-8")
+    return raw.ljust(KEY_SIZE, b"\0") if 0 < len(raw) <= KEY_SIZE and b"\0" not in raw else None
+
+
+class _IndexView:
+    """Urutan (key, jenis) di atas mmap index, untuk ``bisect``."""
+
+    def __init__(self, buf, count: int):
+        self.buf = buf
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> Tuple[bytes, int]:
+        return _ENTRY.unpack_from(self.buf, _IDX_HEADER.size + i * _ENTRY.size)[:2]
+
+
+class Pack:
+    def __init__(self, name: str, pack_path: str, idx_path: str):
+        self.name = name
+        self._lock = threading.Lock()  # fallback seek+read bila os.pread tidak ada
+        with open(idx_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = _IDX_HEADER.unpack_from(self._mm, 0)
+        if magic != _IDX_MAGIC:
+            self._mm.close()
+            raise ValueError(f"index arsip tidak valid: {idx_path}")
+        self._view = _IndexView(self._mm, self.count)
+        self._pack = open(pack_path, "rb")
+
+    def find(self, key: bytes, kind: int) -> Optional[Tuple[int, int, int]]:
+        """(offset, panjang_kompres, panjang_asli) atau None."""
+        i = bisect.bisect_left(self._view, (key, kind))
+        if i < self.count:
+            k, knd, offset, length, raw_len = _ENTRY.unpack_from(self._mm, _IDX_HEADER.size + i * _ENTRY.size)
+            if k == key and knd == kind:
+                return offset, length, raw_len
+        return None
+
+    def keys(self, kind: int) -> Iterable[str]:
+        for i in range(self.count):
+            k, knd = self._view[i]
+            if knd == kind:
+                yield k.rstrip(b"\0").decode("utf-8")
+
+    @metrics.STORAGE_IO.time(op="archive_read")
+    def read(self, offset: int, length: int) -> bytes:
+        if hasattr(os, "pread"):
+            blob = os.pread(self._pack.fileno(), length, offset)
+        else:  # pragma: no cover
+            with self._lock:
+                self._pack.seek(offset)
+                blob = self._pack.read(length)
+        return zlib.decompress(blob)
+
+
+class ArchiveStore:
+    def __init__(self, archive_dir: str = ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        self._packs: List[Pack] = []  # terbaru di depan
+        self._stamp: Any = None
+        self._lock = threading.Lock()
+
+    # ---------- daftar pack ----------
+    def _current(self) -> List[Pack]:
+        """Pack yang ada sekarang; dibuka ulang hanya bila isi direktori berubah (stat murah)."""
+        try:
+            stamp = os.stat(self.archive_dir).st_mtime_ns
+        except OSError:
+            stamp = None
+        if stamp == self._stamp:
+            return self._packs
+        with self._lock:
+            if stamp == self._stamp:
+                return self._packs
+            opened = {p.name: p for p in self._packs}
+            packs = []
+            names = sorted((f[:-4] for f in os.listdir(self.archive_dir)
+                            if f.endswith(".idx") and not f.startswith("tmp")),
+                           reverse=True) if stamp is not None else []
+            for name in names:
+                pack = opened.pop(name, None)
+                if pack is None:
+                    try:
+                        pack = Pack(name, self._pack_path(name), self._idx_path(name))
+                    except (OSError, ValueError) as e:
+                        logger.warning(f"Pack arsip {name} dilewati: {e}")
+                        continue
+                packs.append(pack)
+            # pack lama tidak ditutup: mungkin sedang dibaca thread lain (pack tidak pernah dihapus)
+            self._packs, self._stamp = packs, stamp
+            return packs
+
+    def _pack_path(self, name: str) -> str:
+        return os.path.join(self.archive_dir, f"{name}.pack")
+
+    def _idx_path(self, name: str) -> str:
+        return os.path.join(self.archive_dir, f"{name}.idx")
+
+    def _find(self, lkpd_id: str, kind: int) -> Optional[Tuple[Pack, Tuple[int, int, int]]]:
+        key = pack_key(lkpd_id)
+        if key is None:
+            return None
+        for pack in self._current():
+            hit = pack.find(key, kind)
+            if hit is not None:
+                return pack, hit
+        return None
+
+    # ---------- baca ----------
+    def stamp(self, lkpd_id: str, kind: int = KIND_LKPD) -> Optional[Tuple[str, int]]:
+        """Validator versi (pack, offset) untuk cache; None bila tidak diarsip."""
+        found = self._find(lkpd_id, kind)
+        return (found[0].name, found[1][0]) if found else None
+
+    def read(self, lkpd_id: str, kind: int) -> Optional[bytes]:
+        found = self._find(lkpd_id, kind)
+        if found is None:
+            return None
+        pack, (offset, length, _raw_len) = found
+        return pack.read(offset, length)
+
+    def has(self, lkpd_id: str, kind: int) -> bool:
+        return self._find(lkpd_id, kind) is not None
+
+    def load_lkpd(self, lkpd_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.read(lkpd_id, KIND_LKPD)
+        return serializer.loads(raw) if raw else None
+
+    def load_answers(self, lkpd_id: str) -> List[Dict[str, Any]]:
+        raw = self.read(lkpd_id, KIND_ANSWERS)
+        if not raw:
+            return []
+        return [serializer.loads(line) for line in raw.splitlines() if line.strip()]
+
+    def list_ids(self) -> List[str]:
+        ids = set()
+        for pack in self._current():
+            ids.update(pack.keys(KIND_LKPD))
+        return sorted(ids)
+
+    # ---------- tulis ----------
+    def write_pack(self, name: str, items: Iterable[Tuple[str, int, bytes]]) -> int:
+        """Tulis pack baru dari ``(lkpd_id, jenis, bytes_asli)``. Return jumlah entry."""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        entries = []
+        fd, tmp_pack = tempfile.mkstemp(prefix="tmp", dir=self.archive_dir, suffix=".pack")
+        tmp_idx = None
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_PACK_MAGIC)
+                offset = len(_PACK_MAGIC)
+                for lkpd_id, kind, raw in items:
+                    key = pack_key(lkpd_id)
+                    if key is None:
+                        raise ValueError(f"lkpd_id tidak bisa diarsip: {lkpd_id!r}")
+                    blob = zlib.compress(raw, ARCHIVE_LEVEL)
+                    f.write(blob)
+                    entries.append((key, kind, offset, len(blob), len(raw)))
+                    offset += len(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            entries.sort()
+            fd, tmp_idx = tempfile.mkstemp(prefix="tmp", dir=self.archive_dir, suffix=".idx")
+            with os.fdopen(fd, "wb") as f:
+                f.write(_IDX_HEADER.pack(_IDX_MAGIC, len(entries)))
+                for e in entries:
+                    f.write(_ENTRY.pack(*e))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_pack, self._pack_path(name))
+            os.replace(tmp_idx, self._idx_path(name))  # terakhir: pack terlihat pembaca
+        except BaseException:
+            for path in (tmp_pack, tmp_idx):
+                if path and os.path.exists(path):
+                    os.remove(path)
+            raise
+        return len(entries)
+
+
+archive_store = ArchiveStore()
@@ -0,0 +1,176 @@
+# api/catalog.py
+"""Katalog LKPD terindeks (SQLite) untuk /all-ids.
+
+Menyimpan id, judul, tema, tingkat, generated_at, dan jumlah submission.
+Katalog diperbarui saat generate dan submit, jadi daftar LKPD tidak perlu
+``os.listdir`` lagi. Pagination memakai cursor keyset (nilai kolom sort + id)
+sehingga setiap halaman adalah satu range scan di index, tidak bergantung
+pada jumlah arsip.
+"""
+
+import os
+import json
+import base64
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+CATALOG_DB = os.getenv("CATALOG_DB", "data/catalog.sqlite3")
+
+SORT_COLUMNS = {
+    "generated_at": "generated_at",
+    "title": "title",
+    "theme": "theme_norm",
+    "submissions": "submission_count",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lkpd_catalog (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    theme TEXT NOT NULL DEFAULT '',
+    theme_norm TEXT NOT NULL DEFAULT '',
+    difficulty TEXT NOT NULL DEFAULT '',
+    generated_at TEXT NOT NULL DEFAULT '',
+    submission_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_catalog_generated ON lkpd_catalog(generated_at, id);
+CREATE INDEX IF NOT EXISTS idx_catalog_theme ON lkpd_catalog(theme_norm, generated_at, id);
+CREATE INDEX IF NOT EXISTS idx_catalog_title ON lkpd_catalog(title, id);
+CREATE INDEX IF NOT EXISTS idx_catalog_submissions ON lkpd_catalog(submission_count, id);
+CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def _norm(theme: Any) -> str:
+    return " ".join(str(theme or "").lower().split())
+
+
+def _encode_cursor(value: Any, lkpd_id: str) -> str:
+    raw = json.dumps([value, lkpd_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        value, lkpd_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return value, str(lkpd_id)
+    except Exception:
+        raise ValueError("Cursor tidak valid.")
+
+
+class Catalog:
+    def __init__(self, db_path: str = CATALOG_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    # ---------- tulis ----------
+    def upsert(self, lkpd_id: str, data: Dict[str, Any], submission_count: Optional[int] = None) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                """INSERT INTO lkpd_catalog (id, title, theme, theme_norm, difficulty, generated_at, submission_count)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(id) DO UPDATE SET title=excluded.title, theme=excluded.theme,
+                       theme_norm=excluded.theme_norm, difficulty=excluded.difficulty,
+                       generated_at=excluded.generated_at""",
+                (lkpd_id, str(data.get("title") or ""), str(data.get("theme") or ""), _norm(data.get("theme")),
+                 str(data.get("difficulty") or ""), str(data.get("generated_at") or ""), submission_count or 0),
+            )
+
+    def add_submissions(self, lkpd_id: str, n: int = 1) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE lkpd_catalog SET submission_count = submission_count + ? WHERE id = ?", (n, lkpd_id))
+
+    def ensure_built(self, storage) -> int:
+        """Isi katalog dari backend penyimpanan sekali saja (migrasi data lama).
+
+        ``storage``: objek dengan list_lkpd_ids(), load_lkpd(id), count_answers(id)
+        (lihat api/db.py). Return jumlah entry baru.
+        """
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM catalog_meta WHERE key = 'built'").fetchone():
+            return 0
+        added = 0
+        for lkpd_id in storage.list_lkpd_ids():
+            data = storage.load_lkpd(lkpd_id)
+            if not isinstance(data, dict):
+                continue
+            self.upsert(lkpd_id, data, submission_count=storage.count_answers(lkpd_id))
+            added += 1
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('built', '1')")
+        return added
+
+    # ---------- baca ----------
+    def query(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        theme: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        sort: str = "generated_at",
+        order: str = "desc",
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return (items, next_cursor). next_cursor None bila halaman terakhir."""
+        col = SORT_COLUMNS.get(sort)
+        if col is None:
+            raise ValueError(f"Sort tidak dikenal: {sort}")
+        desc = str(order).lower() != "asc"
+        where, params = [], []
+        if theme:
+            where.append("theme_norm = ?")
+            params.append(_norm(theme))
+        if date_from:
+            where.append("generated_at >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("generated_at <= ?")
+            params.append(date_to)
+        if cursor:
+            value, last_id = _decode_cursor(cursor)
+            op = "<" if desc else ">"
+            where.append(f"({col} {op} ? OR ({col} = ? AND id {op} ?))")
+            params.extend([value, value, last_id])
+        sql = "SELECT id, title, theme, theme_norm, difficulty, generated_at, submission_count FROM lkpd_catalog"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        direction = "DESC" if desc else "ASC"
+        sql += f" ORDER BY {col} {direction}, id {direction} LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._conn().execute(sql, params).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = _encode_cursor(last[col], last["id"])
+        items = [
+            {
+                "id": r["id"],
+                "title": r["title"],
+                "theme": r["theme"],
+                "difficulty": r["difficulty"],
+                "generated_at": r["generated_at"],
+                "submission_count": r["submission_count"],
+            }
+            for r in rows
+        ]
+        return items, next_cursor
+
+
+catalog = Catalog()
@@ -0,0 +1,63 @@
+# api/compression.py
+"""Helper kompresi respon (gzip, plus brotli bila paket ``brotli`` terpasang).
+
+Dipakai oleh build aset statis (file ``.gz``/``.br`` disiapkan sekali saat
+startup), cache dokumen LKPD (body gzip disimpan bersama ETag), dan
+konfigurasi GZipMiddleware untuk respon API lain.
+"""
+
+import os
+import gzip
+from typing import Optional
+
+try:  # opsional: tanpa brotli hanya varian gzip yang dibuat
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))  # byte; respon lebih kecil dikirim apa adanya
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))            # level untuk respon dinamis
+STATIC_LEVEL = 9                                         # aset statis dikompres sekali, pakai level maksimal
+
+# tipe yang tidak dikompres GZipMiddleware: stream SSE dan format yang sudah terkompres
+GZIP_EXCLUDED_TYPES = (
+    "text/event-stream",
+    "application/gzip",
+    "application/zip",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "image/*",
+    "audio/*",
+    "video/*",
+    "font/woff",
+    "font/woff2",
+)
+
+# encoding -> ekstensi file varian, urut preferensi
+ENCODINGS = {"br": ".br", "gzip": ".gz"} if brotli is not None else {"gzip": ".gz"}
+
+
+def accepts(accept_encoding: Optional[str], encoding: str) -> bool:
+    """True bila header Accept-Encoding mengizinkan ``encoding`` (q=0 dianggap menolak)."""
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() not in (encoding, "*"):
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def gzip_bytes(data: bytes, level: int = GZIP_LEVEL) -> bytes:
+    # mtime=0: hasil deterministik (ETag/fingerprint stabil antar build)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress(data: bytes, encoding: str, level: int = STATIC_LEVEL) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if level >= 9 else 5)
+    return gzip_bytes(data, level)
@@ -1,37 +1,443 @@
-import os, json, uuid
+# api/db.py
+"""Lapisan penyimpanan EduAI dengan backend yang bisa dipilih.
+
+STORAGE_BACKEND=file (default)
+    Satu file JSON per LKPD di LKPD_DIR dan log jawaban JSONL per LKPD di
+    ANSWERS_DIR (lihat api/answer_store.py). LKPD lama dipindah ke pack arsip
+    (api/archive.py) dan tetap terbaca lewat backend ini.
+STORAGE_BACKEND=sqlite
+    Satu database SQLITE_DB (mode WAL) dengan pool koneksi dan index pada
+    lkpd_id, nama siswa, dan submitted_at. Aman dipakai beberapa worker
+    uvicorn pada direktori data yang sama.
+
+Controller hanya memakai ``get_backend()``; fungsi modul lama (save_lkpd,
+load_lkpd, save_answers, get_rekap, list_all_lkpd) tetap ada sebagai
+pembungkus.
+"""
+
+import os
+import json
+import uuid
+import queue
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
 from api.schemas import AnswerRequest
+from api import metrics
+from api import serializer
+from api import answer_store
+from api.catalog import catalog
+from api.archive_store import archive_store
+from api.lkpd_cache import lkpd_cache, CachedDoc
+
+LKPD_DIR = os.getenv("LKPD_DIR", "data/lkpd_outputs")
+ANS_DIR = os.getenv("ANSWERS_DIR", "data/answers")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "file").lower()
+SQLITE_DB = os.getenv("SQLITE_DB", "data/eduai.sqlite3")
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "4"))
+
+
+# -------------------------
+#  Helper JSON (atomic)
+# -------------------------
+@metrics.STORAGE_IO.time(op="json_write")
+def _atomic_write_json(path: str, data: Any) -> None:
+    """Tulis JSON secara atomic (tulis ke temp, lalu replace)."""
+    dirn = os.path.dirname(path)
+    os.makedirs(dirn, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix="tmp", dir=dirn, suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(serializer.dumps(data))
+        os.replace(tmp, path)  # atomic replace
+        lkpd_cache.invalidate(path)
+    except Exception:
+        # Pastikan tmp file dihapus bila error
+        try:
+            os.remove(tmp)
+        except Exception:
+            pass
+        raise
+
+
+@metrics.STORAGE_IO.time(op="json_read")
+def _safe_load_json(path: str):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+# -------------------------
+#  Interface backend
+# -------------------------
+class StorageBackend:
+    """Kontrak penyimpanan yang dipakai controller."""
+
+    name = "base"
+
+    # LKPD
+    def save_lkpd(self, lkpd_id: str, data: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def lkpd_doc(self, lkpd_id: str) -> Optional[CachedDoc]:
+        """Dokumen LKPD ter-cache (data + bytes respon + ETag)."""
+        raise NotImplementedError
+
+    def load_lkpd(self, lkpd_id: str) -> Optional[Dict[str, Any]]:
+        """LKPD read-only (dipakai bersama cache); salin sebelum diubah."""
+        doc = self.lkpd_doc(lkpd_id)
+        return doc.data if doc else None
+
+    def list_lkpd_ids(self) -> List[str]:
+        raise NotImplementedError
+
+    # Jawaban
+    def append_answer(self, lkpd_id: str, record: Dict[str, Any]) -> int:
+        """Simpan submission; isi ``record["seq"]``/``["rev"]`` dan return seq."""
+        raise NotImplementedError
+
+    def append_many(self, lkpd_id: str, records: List[Dict[str, Any]]) -> List[int]:
+        """Simpan banyak submission sekaligus (import massal). Return daftar seq."""
+        return [self.append_answer(lkpd_id, r) for r in records]
+
+    def update_answer(self, lkpd_id: str, submission_id: str, fields: Dict[str, Any]) -> int:
+        """Perbarui field submission; return rev baru."""
+        raise NotImplementedError
+
+    def answers_since(self, lkpd_id: str, since: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Submission yang dibuat/berubah setelah cursor ``since``. Return (items, cursor baru)."""
+        raise NotImplementedError
+
+    def load_answers(self, lkpd_id: str) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def iter_answers(self, lkpd_id: str) -> Iterator[Dict[str, Any]]:
+        """Submission satu per satu tanpa memuat seluruh rekap ke memori."""
+        return iter(self.load_answers(lkpd_id))
+
+    def transform_answers(self, lkpd_id: str, fn: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]],
+                          rewrite: bool = True) -> List[Dict[str, Any]]:
+        """Jalankan ``fn`` atas seluruh submission di bawah lock/transaksi lalu simpan hasilnya.
+
+        ``rewrite=False``: hanya baca di bawah lock, tanpa menulis atau menaikkan rev.
+        """
+        raise NotImplementedError
+
+    def count_answers(self, lkpd_id: str) -> int:
+        return len(self.load_answers(lkpd_id))
+
+    def pending_feedback(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """(lkpd_id, record) untuk submission yang feedback AI-nya masih ``pending``."""
+        for lkpd_id in self.list_lkpd_ids():
+            for r in self.iter_answers(lkpd_id):
+                if r.get("feedback_status") == "pending":
+                    yield lkpd_id, r
+
+
+class FileBackend(StorageBackend):
+    name = "file"
+
+    def __init__(self, lkpd_dir: str = LKPD_DIR):
+        self.lkpd_dir = lkpd_dir
+
+    def _path(self, lkpd_id: str) -> str:
+        return os.path.join(self.lkpd_dir, f"{lkpd_id}.json")
+
+    def save_lkpd(self, lkpd_id, data):
+        _atomic_write_json(self._path(lkpd_id), data)
+
+    def lkpd_doc(self, lkpd_id):
+        doc = lkpd_cache.get(self._path(lkpd_id))
+        if doc is None:
+            # file panas tidak ada: coba pack arsip (versi = pack + offset)
+            stamp = archive_store.stamp(lkpd_id)
+            if stamp is not None:
+                doc = lkpd_cache.get_versioned(f"archive:{lkpd_id}", stamp,
+                                               lambda: archive_store.load_lkpd(lkpd_id))
+        return doc
+
+    def list_lkpd_ids(self):
+        hot = []
+        if os.path.isdir(self.lkpd_dir):
+            hot = [f[:-5] for f in os.listdir(self.lkpd_dir) if f.endswith(".json") and not f.startswith("tmp")]
+        return sorted(set(hot) | set(archive_store.list_ids()))
+
+    def append_answer(self, lkpd_id, record):
+        return answer_store.append_answer(lkpd_id, record)
+
+    def append_many(self, lkpd_id, records):
+        return answer_store.append_many(lkpd_id, records)
+
+    def update_answer(self, lkpd_id, submission_id, fields):
+        return answer_store.update_answer(lkpd_id, submission_id, fields)
+
+    def answers_since(self, lkpd_id, since):
+        return answer_store.answers_since(lkpd_id, since)
 
-LKPD_DIR = "data/lkpd_outputs"
-ANS_DIR = "data/answers"
+    def load_answers(self, lkpd_id):
+        return answer_store.load_answers(lkpd_id)
 
+    def iter_answers(self, lkpd_id):
+        return answer_store.iter_answers(lkpd_id)
+
+    def transform_answers(self, lkpd_id, fn, rewrite=True):
+        return answer_store.transform(lkpd_id, fn, rewrite)
+
+    def pending_feedback(self):
+        # hanya log panas; file yang tidak memuat "pending" dilewati tanpa parse JSON
+        for lkpd_id in answer_store.hot_ids():
+            if not answer_store.hot_contains(lkpd_id, b'"pending"'):
+                continue
+            for r in answer_store.iter_answers(lkpd_id):
+                if r.get("feedback_status") == "pending":
+                    yield lkpd_id, r
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lkpd (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS answers (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    lkpd_id TEXT NOT NULL,
+    submission_id TEXT,
+    name TEXT,
+    score REAL,
+    submitted_at TEXT,
+    rev INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_answers_lkpd ON answers(lkpd_id, seq);
+CREATE INDEX IF NOT EXISTS idx_answers_name ON answers(lkpd_id, name);
+CREATE INDEX IF NOT EXISTS idx_answers_submitted ON answers(submitted_at);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_answers_submission ON answers(submission_id);
+"""
+_SQLITE_INDEX_REV = "CREATE INDEX IF NOT EXISTS idx_answers_rev ON answers(lkpd_id, rev)"
+
+# SQL konstan: sqlite3 menyimpan prepared statement per koneksi (cached_statements)
+_SQL_UPSERT_LKPD = """INSERT INTO lkpd (id, data) VALUES (?, ?)
+    ON CONFLICT(id) DO UPDATE SET data = excluded.data, version = lkpd.version + 1"""
+_SQL_LKPD_VERSION = "SELECT version FROM lkpd WHERE id = ?"
+_SQL_LKPD_DATA = "SELECT data FROM lkpd WHERE id = ?"
+_SQL_NEXT_REV = "SELECT COALESCE(MAX(rev), 0) + 1 FROM answers WHERE lkpd_id = ?"
+_SQL_INSERT_ANSWER = """INSERT INTO answers (lkpd_id, submission_id, name, score, submitted_at, data, rev)
+    VALUES (?, ?, ?, ?, ?, ?, ?)"""
+_SQL_ANSWER_BY_SUBMISSION = "SELECT seq, data FROM answers WHERE submission_id = ?"
+_SQL_UPDATE_ANSWER = "UPDATE answers SET name = ?, score = ?, submitted_at = ?, data = ?, rev = ? WHERE seq = ?"
+_SQL_ANSWERS_SINCE = "SELECT data FROM answers WHERE lkpd_id = ? AND rev > ? ORDER BY rev"
+_SQL_ANSWERS_FOR_LKPD = "SELECT seq, data FROM answers WHERE lkpd_id = ? ORDER BY seq"
+_SQL_ANSWERS_PAGE = "SELECT seq, data FROM answers WHERE lkpd_id = ? AND seq > ? ORDER BY seq LIMIT ?"
+_SQL_COUNT_ANSWERS = "SELECT COUNT(*) FROM answers WHERE lkpd_id = ?"
+_SQL_PENDING_FEEDBACK = """SELECT lkpd_id, data FROM answers
+    WHERE data LIKE '%"feedback_status":"pending"%' ORDER BY seq"""
+
+
+def _answer_columns(record: Dict[str, Any]):
+    score = record.get("score")
+    return (record.get("name"), float(score) if score is not None else None, record.get("submitted_at"),
+            serializer.dumps(record))
+
+
+class SQLiteBackend(StorageBackend):
+    name = "sqlite"
+
+    def __init__(self, db_path: str = SQLITE_DB, pool_size: int = SQLITE_POOL_SIZE):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(max(1, pool_size)):
+            self._pool.put(self._connect())
+        with self._conn() as conn:
+            conn.executescript(_SQLITE_SCHEMA)
+            cols = {r[1] for r in conn.execute("PRAGMA table_info(answers)")}
+            if "rev" not in cols:  # database dari versi sebelum cursor delta
+                conn.execute("ALTER TABLE answers ADD COLUMN rev INTEGER NOT NULL DEFAULT 0")
+            conn.execute(_SQLITE_INDEX_REV)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False,
+                               isolation_level=None, cached_statements=64)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    @contextmanager
+    def _conn(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def _tx(self):
+        """Transaksi tulis (BEGIN IMMEDIATE: kunci tulis diambil di awal)."""
+        with self._conn() as conn, metrics.STORAGE_IO.time(op="sqlite_tx"):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # LKPD
+    def save_lkpd(self, lkpd_id, data):
+        with self._tx() as conn:
+            conn.execute(_SQL_UPSERT_LKPD, (lkpd_id, serializer.dumps(data)))
+        lkpd_cache.invalidate(f"sqlite:{lkpd_id}")
+
+    def lkpd_doc(self, lkpd_id):
+        with self._conn() as conn:
+            row = conn.execute(_SQL_LKPD_VERSION, (lkpd_id,)).fetchone()
+        if row is None:
+            return None
+
+        def _load():
+            with self._conn() as conn:
+                data_row = conn.execute(_SQL_LKPD_DATA, (lkpd_id,)).fetchone()
+            return serializer.loads(data_row[0]) if data_row else None
+
+        return lkpd_cache.get_versioned(f"sqlite:{lkpd_id}", row[0], _load)
+
+    def list_lkpd_ids(self):
+        with self._conn() as conn:
+            return [r[0] for r in conn.execute("SELECT id FROM lkpd")]
+
+    # Jawaban
+    def append_answer(self, lkpd_id, record):
+        with self._tx() as conn:
+            rev = conn.execute(_SQL_NEXT_REV, (lkpd_id,)).fetchone()[0]
+            record["seq"] = record["rev"] = rev
+            conn.execute(_SQL_INSERT_ANSWER,
+                         (lkpd_id, record.get("submission_id")) + _answer_columns(record) + (rev,))
+        return rev
+
+    def append_many(self, lkpd_id, records):
+        if not records:
+            return []
+        with self._tx() as conn:
+            first = conn.execute(_SQL_NEXT_REV, (lkpd_id,)).fetchone()[0]
+            for i, record in enumerate(records):
+                record["seq"] = record["rev"] = first + i
+            conn.executemany(_SQL_INSERT_ANSWER, [
+                (lkpd_id, r.get("submission_id")) + _answer_columns(r) + (r["rev"],) for r in records])
+        return [r["seq"] for r in records]
+
+    def update_answer(self, lkpd_id, submission_id, fields):
+        with self._tx() as conn:
+            row = conn.execute(_SQL_ANSWER_BY_SUBMISSION, (submission_id,)).fetchone()
+            if row is None:
+                return 0
+            rev = conn.execute(_SQL_NEXT_REV, (lkpd_id,)).fetchone()[0]
+            record = serializer.loads(row[1])
+            record.update(fields)
+            record["rev"] = rev
+            conn.execute(_SQL_UPDATE_ANSWER, _answer_columns(record) + (rev, row[0]))
+        return rev
+
+    def answers_since(self, lkpd_id, since):
+        with self._conn() as conn:
+            rows = conn.execute(_SQL_ANSWERS_SINCE, (lkpd_id, -1 if since <= 0 else int(since))).fetchall()
+            cursor = conn.execute(_SQL_NEXT_REV, (lkpd_id,)).fetchone()[0] - 1
+        return [serializer.loads(r[0]) for r in rows], max(cursor, since)
+
+    def load_answers(self, lkpd_id):
+        with self._conn() as conn:
+            return [serializer.loads(r[1]) for r in conn.execute(_SQL_ANSWERS_FOR_LKPD, (lkpd_id,))]
+
+    def iter_answers(self, lkpd_id, batch_size: int = 500):
+        # keyset per batch: koneksi dikembalikan ke pool di antara batch
+        last_seq = 0
+        while True:
+            with self._conn() as conn:
+                rows = conn.execute(_SQL_ANSWERS_PAGE, (lkpd_id, last_seq, batch_size)).fetchall()
+            for seq, data in rows:
+                yield serializer.loads(data)
+            if len(rows) < batch_size:
+                return
+            last_seq = rows[-1][0]
+
+    def transform_answers(self, lkpd_id, fn, rewrite=True):
+        with self._tx() as conn:
+            rows = conn.execute(_SQL_ANSWERS_FOR_LKPD, (lkpd_id,)).fetchall()
+            seqs = [r[0] for r in rows]
+            records = fn([serializer.loads(r[1]) for r in rows])
+            if not rewrite:
+                return records
+            if len(records) != len(seqs):
+                raise ValueError("transform_answers tidak boleh mengubah jumlah submission.")
+            first_rev = conn.execute(_SQL_NEXT_REV, (lkpd_id,)).fetchone()[0]
+            params = []
+            for i, (r, seq) in enumerate(zip(records, seqs)):
+                r["rev"] = first_rev + i  # semua record dianggap berubah untuk klien delta
+                params.append(_answer_columns(r) + (r["rev"], seq))
+            conn.executemany(_SQL_UPDATE_ANSWER, params)
+            return records
+
+    def count_answers(self, lkpd_id):
+        with self._conn() as conn:
+            return conn.execute(_SQL_COUNT_ANSWERS, (lkpd_id,)).fetchone()[0]
+
+    def pending_feedback(self):
+        with self._conn() as conn:
+            rows = conn.execute(_SQL_PENDING_FEEDBACK).fetchall()
+        for lkpd_id, data in rows:
+            r = serializer.loads(data)
+            if r.get("feedback_status") == "pending":
+                yield lkpd_id, r
+
+
+# -------------------------
+#  Pemilihan backend
+# -------------------------
+_backend: Optional[StorageBackend] = None
+
+
+def get_backend() -> StorageBackend:
+    global _backend
+    if _backend is None:
+        if STORAGE_BACKEND == "sqlite":
+            _backend = SQLiteBackend()
+        elif STORAGE_BACKEND == "file":
+            _backend = FileBackend()
+        else:
+            raise ValueError(f"STORAGE_BACKEND tidak dikenal: {STORAGE_BACKEND}")
+    return _backend
+
+
+# -------------------------
+#  API lama (pembungkus)
+# -------------------------
 def save_lkpd(data):
     lkpd_id = str(uuid.uuid4())[:8]
-    with open(f"{LKPD_DIR}/{lkpd_id}.json", "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    get_backend().save_lkpd(lkpd_id, data)
+    catalog.upsert(lkpd_id, data)
     return lkpd_id
 
+
 def load_lkpd(lkpd_id):
-    path = f"{LKPD_DIR}/{lkpd_id}.json"
-    if not os.path.exists(path):
-        return None
-    with open(path, encoding="utf-8") as f:
-        return json.load(f)
+    return get_backend().load_lkpd(lkpd_id)
+
 
 def save_answers(req: AnswerRequest):
-    path = f"{ANS_DIR}/{req.lkpd_id}.json"
-    if not os.path.exists(path):
-        with open(path, "w") as f: json.dump([], f)
-    with open(path, encoding="utf-8") as f:
-        data = json.load(f)
-    data.append(req.dict())
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    get_backend().append_answer(req.lkpd_id, req.dict())
+    catalog.add_submissions(req.lkpd_id)
+
 
 def get_rekap(lkpd_id):
-    path = f"{ANS_DIR}/{lkpd_id}.json"
-    if not os.path.exists(path): return []
-    with open(path, encoding="utf-8") as f:
-        return json.load(f)
+    return get_backend().load_answers(lkpd_id)
+
 
-def list_all_lkpd():
-    return [f.split(".")[0] for f in os.listdir(LKPD_DIR) if f.endswith(".json")]
+def list_all_lkpd(**filters):
+    items, _ = catalog.query(**filters)
+    return [it["id"] for it in items]
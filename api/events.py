@@ -0,0 +1,40 @@
+# api/events.py
+"""Notifikasi in-process untuk dashboard guru (SSE).
+
+Publisher (submit, worker feedback) cukup memanggil ``publish(lkpd_id)``;
+subscriber dibangunkan lalu mengambil data terbaru lewat
+``storage.answers_since`` sehingga urutan dan isi selalu konsisten dengan
+penyimpanan. Event dari worker uvicorn lain tertangkap lewat polling ringan
+saat idle (lihat endpoint stream di ai_controller).
+"""
+
+import asyncio
+from typing import Dict, Set
+
+
+class AnswerEvents:
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def subscribe(self, lkpd_id: str) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(lkpd_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, lkpd_id: str, q: asyncio.Queue) -> None:
+        subs = self._subscribers.get(lkpd_id)
+        if subs is not None:
+            subs.discard(q)
+            if not subs:
+                del self._subscribers[lkpd_id]
+
+    def publish(self, lkpd_id: str) -> None:
+        for q in self._subscribers.get(lkpd_id, ()):
+            if q.empty():  # cukup satu sinyal tertunda per subscriber
+                q.put_nowait(True)
+
+    def subscriber_count(self, lkpd_id: str) -> int:
+        return len(self._subscribers.get(lkpd_id, ()))
+
+
+answer_events = AnswerEvents()
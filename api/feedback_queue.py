@@ -0,0 +1,331 @@
+# api/feedback_queue.py
+"""Antrian background untuk feedback AI.
+
+/submit langsung mengembalikan skor yang dihitung lokal dan menyimpan hasil
+dengan ``feedback_status: "pending"``. Worker di sini kemudian meminta
+feedback ke Gemini dan menulisnya ke log jawaban lewat
+``storage.update_answer``. Konkurensi dibatasi jumlah worker, tiap job
+punya beberapa kali retry, dan laju panggilan dibatasi token bucket
+(FEEDBACK_RATE_PER_MIN).
+
+Job untuk LKPD yang sama dikumpulkan selama FEEDBACK_BATCH_WINDOW detik atau
+sampai FEEDBACK_BATCH_SIZE job, lalu dikirim sebagai satu prompt yang meminta
+JSON array feedback per siswa. Siswa yang tidak ada di respon diproses ulang
+lewat jalur satu-per-satu.
+
+Antrian hanya ada di memori; saat ``start()`` submission yang masih
+``feedback_status: "pending"`` (tertinggal karena restart/crash) dipindai
+dari storage dan dimasukkan ulang (FEEDBACK_RECOVER). Antar-worker uvicorn
+hanya satu yang memindai: flock non-blocking pada FEEDBACK_RECOVER_LOCK
+dipegang sampai proses berhenti, sehingga worker yang start belakangan tidak
+menggandakan job yang masih antre. Pemindaian hanya membaca log jawaban panas
+(LKPD arsip dilewati) yang masih memuat record pending, di luar event loop.
+
+Setiap job yang di-enqueue menandai record-nya dengan ``feedback_owner``: id
+proses yang memegang flock ``FEEDBACK_OWNER_DIR/{owner}.lock`` selama hidup.
+Pemindaian hanya mengambil record yang pemiliknya sudah mati (lock bisa
+diambil) atau tanpa pemilik, sehingga proses pemindai yang di-respawn tidak
+menggandakan job yang sedang dikerjakan worker lain.
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:  # flock hanya ada di POSIX; tanpa flock setiap proses memindai sendiri
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from api import gemini_config
+from api.db import get_backend
+from api.events import answer_events
+from api.rate_limiter import lane
+
+logger = logging.getLogger("eduai")
+
+WORKERS = int(os.getenv("FEEDBACK_WORKERS", "4"))
+MAX_RETRIES = int(os.getenv("FEEDBACK_MAX_RETRIES", "3"))
+RETRY_DELAY = float(os.getenv("FEEDBACK_RETRY_DELAY", "2.0"))
+RATE_PER_MIN = float(os.getenv("FEEDBACK_RATE_PER_MIN", "60"))
+BATCH_WINDOW = float(os.getenv("FEEDBACK_BATCH_WINDOW", "2.0"))
+BATCH_SIZE = int(os.getenv("FEEDBACK_BATCH_SIZE", "20"))
+RECOVER = os.getenv("FEEDBACK_RECOVER", "1") != "0"
+RECOVER_LOCK = os.getenv("FEEDBACK_RECOVER_LOCK", "data/feedback_recover.lock")
+OWNER_DIR = os.getenv("FEEDBACK_OWNER_DIR", "data/feedback_owners")
+
+FALLBACK_FEEDBACK = "Analisis AI gagal dijalankan. Nilai dihitung otomatis."
+
+
+class _RateBudget:
+    """Token bucket sederhana: maksimal ``rate_per_min`` panggilan per menit."""
+
+    def __init__(self, rate_per_min: float):
+        self.capacity = max(1.0, rate_per_min / 6)  # burst ~10 detik
+        self.rate = rate_per_min / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class FeedbackQueue:
+    def __init__(self, workers: int = WORKERS, max_retries: int = MAX_RETRIES,
+                 rate_per_min: float = RATE_PER_MIN, batch_window: float = BATCH_WINDOW,
+                 batch_size: int = BATCH_SIZE):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.rate_per_min = rate_per_min
+        self.batch_window = batch_window
+        self.batch_size = max(1, batch_size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._batches: Set[asyncio.Task] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._budget: Optional[_RateBudget] = None
+        self._recovery: Optional[asyncio.Task] = None
+        self._recover_lock = None  # file flock, dipegang selama proses hidup
+        self.owner: Optional[str] = None  # id proses ini untuk feedback_owner
+        self._owner_lock = None  # flock OWNER_DIR/{owner}.lock, dipegang selama proses hidup
+        # lkpd_id -> (waktu job pertama masuk, daftar job)
+        self._pending: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+
+    def start(self) -> None:
+        if self._dispatcher is not None:
+            return
+        self._queue = asyncio.Queue()
+        self.owner = f"{os.getpid()}-{os.urandom(4).hex()}"
+        self._owner_lock = _hold_owner(self.owner)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._budget = _RateBudget(self.rate_per_min)
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        if RECOVER:
+            self._recovery = asyncio.create_task(self._recover(datetime.utcnow().isoformat(), self.owner))
+
+    async def stop(self) -> None:
+        tasks = list(self._batches) + [t for t in (self._dispatcher, self._recovery) if t]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._dispatcher = None
+        self._recovery = None
+        if self._recover_lock is not None:
+            self._recover_lock.close()
+            self._recover_lock = None
+        if self._owner_lock is not None:
+            _drop_owner(self._owner_lock)
+            self._owner_lock = None
+        self._batches.clear()
+        self._pending.clear()
+
+    def own(self, record: Dict[str, Any]) -> None:
+        """Tandai record sebagai milik proses ini; panggil sebelum disimpan lalu di-enqueue."""
+        self.start()
+        record["feedback_owner"] = self.owner
+
+    def enqueue(self, job: Dict[str, Any]) -> None:
+        """job: {lkpd_id, submission_id, name, theme, score}"""
+        self.start()
+        self._queue.put_nowait(job)
+
+    def enqueue_many(self, jobs: List[Dict[str, Any]]) -> None:
+        """Banyak job sekaligus (import massal); dispatcher membaginya per batch LKPD."""
+        self.start()
+        for job in jobs:
+            self._queue.put_nowait(job)
+
+    # ---------- pemulihan setelah restart ----------
+    async def _recover(self, started_at: str, owner: str) -> None:
+        try:
+            self._recover_lock = await asyncio.to_thread(_claim_recovery)
+            if self._recover_lock is None:
+                return  # worker lain yang memulihkan
+            jobs = await asyncio.to_thread(_pending_jobs, started_at, owner)
+        except Exception as e:
+            logger.warning(f"Pemindaian feedback pending gagal: {e}")
+            return
+        if jobs:
+            logger.info(f"Memulihkan {len(jobs)} feedback pending dari storage.")
+            self.enqueue_many(jobs)
+
+    def qsize(self) -> int:
+        waiting = sum(len(jobs) for _, jobs in self._pending.values())
+        return (self._queue.qsize() if self._queue else 0) + waiting
+
+    # ---------- batching ----------
+    async def _dispatch(self) -> None:
+        while True:
+            timeout = None
+            if self._pending:
+                oldest = min(first for first, _ in self._pending.values())
+                timeout = max(0.0, oldest + self.batch_window - time.monotonic())
+            try:
+                job = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                job = None
+            if job is not None:
+                first, jobs = self._pending.setdefault(job["lkpd_id"], (time.monotonic(), []))
+                jobs.append(job)
+                if len(jobs) >= self.batch_size:
+                    self._flush(job["lkpd_id"])
+            now = time.monotonic()
+            for lkpd_id in [k for k, (first, _) in self._pending.items() if now - first >= self.batch_window]:
+                self._flush(lkpd_id)
+
+    def _flush(self, lkpd_id: str) -> None:
+        _, jobs = self._pending.pop(lkpd_id)
+        task = asyncio.create_task(self._run_batch(jobs))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, jobs: List[Dict[str, Any]]) -> None:
+        # lane background: /generate interaktif didahulukan di rate limiter
+        with lane("background"):
+            await self._run_batch_inner(jobs)
+
+    async def _run_batch_inner(self, jobs: List[Dict[str, Any]]) -> None:
+        async with self._slots:
+            try:
+                missing = jobs
+                if len(jobs) > 1:
+                    missing = await self._process_batch(jobs)
+                for job in missing:
+                    await self._process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Feedback job gagal total: {e}")
+
+    async def _process_batch(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Satu panggilan untuk seluruh batch; return job yang belum dapat feedback."""
+        students = [{"name": j["name"], "score": j["score"]} for j in jobs]
+        for attempt in range(self.max_retries):
+            await self._budget.acquire()
+            try:
+                results = await gemini_config.agenerate_feedback_batch(jobs[0].get("theme"), students)
+                break
+            except Exception as e:
+                logger.warning(f"Feedback batch gagal (percobaan {attempt+1}/{self.max_retries}): {e}")
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(RETRY_DELAY * (2 ** attempt) + random.uniform(0, 1))
+        else:
+            return jobs
+        for i, job in enumerate(jobs):
+            if i in results:
+                await asyncio.to_thread(get_backend().update_answer, job["lkpd_id"], job["submission_id"],
+                                        {"feedback": results[i], "feedback_status": "done"})
+                answer_events.publish(job["lkpd_id"])
+        return [job for i, job in enumerate(jobs) if i not in results]
+
+    async def _process(self, job: Dict[str, Any]) -> None:
+        for attempt in range(self.max_retries):
+            await self._budget.acquire()
+            try:
+                feedback = await gemini_config.agenerate_feedback(job["name"], job.get("theme"), job["score"])
+                fields = {"feedback": feedback, "feedback_status": "done"}
+                break
+            except Exception as e:
+                logger.warning(f"Feedback AI gagal (percobaan {attempt+1}/{self.max_retries}): {e}")
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(RETRY_DELAY * (2 ** attempt) + random.uniform(0, 1))
+        else:
+            fields = {"feedback": FALLBACK_FEEDBACK, "feedback_status": "failed"}
+        await asyncio.to_thread(get_backend().update_answer, job["lkpd_id"], job["submission_id"], fields)
+        answer_events.publish(job["lkpd_id"])
+
+
+def _claim_recovery():
+    """File lock pemulihan (flock non-blocking); None bila dipegang proses lain."""
+    os.makedirs(os.path.dirname(RECOVER_LOCK) or ".", exist_ok=True)
+    lock = open(RECOVER_LOCK, "a")
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return None
+    return lock
+
+
+def _owner_path(owner: str) -> str:
+    return os.path.join(OWNER_DIR, f"{owner}.lock")
+
+
+def _hold_owner(owner: str):
+    """Buka dan kunci file pemilik; dipegang sampai ``_drop_owner``."""
+    os.makedirs(OWNER_DIR, exist_ok=True)
+    lock = open(_owner_path(owner), "a")
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    return lock
+
+
+def _drop_owner(lock) -> None:
+    try:
+        os.remove(lock.name)
+    except OSError:
+        pass
+    lock.close()
+
+
+def _owner_alive(owner: str) -> bool:
+    """True bila proses ``owner`` masih memegang lock-nya; lock pemilik mati dibersihkan."""
+    path = _owner_path(owner)
+    if fcntl is None or not os.path.exists(path):
+        return False
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return False
+
+
+def _pending_jobs(started_at: str, owner: str) -> List[Dict[str, Any]]:
+    """Job untuk submission ``pending`` yang tidak sedang dikerjakan proses hidup.
+
+    Record milik proses lain yang masih hidup dilewati. Record tanpa pemilik
+    (ditulis tanpa enqueue, mis. import dengan ``feedback=0``) hanya diambil
+    bila masuk sebelum ``started_at``.
+    """
+    storage = get_backend()
+    alive: Dict[str, bool] = {owner: True}
+    themes: Dict[str, str] = {}
+    jobs = []
+    for lkpd_id, r in storage.pending_feedback():
+        rec_owner = r.get("feedback_owner")
+        if rec_owner:
+            if rec_owner not in alive:
+                alive[rec_owner] = _owner_alive(rec_owner)
+            if alive[rec_owner]:
+                continue
+        elif (r.get("submitted_at") or "") >= started_at:
+            continue
+        if lkpd_id not in themes:
+            themes[lkpd_id] = (storage.load_lkpd(lkpd_id) or {}).get("theme") or ""
+        jobs.append({"lkpd_id": lkpd_id, "submission_id": r.get("submission_id"),
+                     "name": r.get("name"), "theme": themes[lkpd_id], "score": r.get("score")})
+    return jobs
+
+
+feedback_queue = FeedbackQueue()
@@ -8,53 +8,124 @@ Aman, stabil, dan siap dipakai untuk LKPD generator & evaluator.
 import os
 import time
 import random
-import google.generativeai as genai
-from dotenv import load_dotenv
+import asyncio
+import json
+import hashlib
+import logging
+from typing import Optional
+
+from api import metrics
+from api import lkpd_extract
+from api.llm_provider import get_provider
+from api.rate_limiter import rate_limiter
+
+logger = logging.getLogger("eduai")
 
 # ======================================================
-# 🔐 LOAD API KEY
+# 🔐 PROVIDER LLM
 # ======================================================
-load_dotenv()
-API_KEY = os.getenv("GEMINI_API_KEY")
+# Inisialisasi SDK dan pengecekan GEMINI_API_KEY ditunda sampai panggilan
+# pertama (lihat api/llm_provider.py), jadi modul ini aman di-import tanpa key.
+# Pilih provider lewat LLM_PROVIDER (gemini | fake) dan model lewat GEMINI_MODEL.
 
-if not API_KEY:
-    raise ValueError("❌ GEMINI_API_KEY tidak ditemukan di file .env!")
+# Kuota RPM/TPM bersama antar worker, konkurensi adaptif, dan lane prioritas
+# ada di api/rate_limiter.py (GEMINI_RPM, GEMINI_TPM, GEMINI_MAX_CONCURRENCY, ...).
 
-try:
-    genai.configure(api_key=API_KEY)
-    model = genai.GenerativeModel("gemini-1.5-pro")
-except Exception as e:
-    raise RuntimeError(f"❌ Gagal inisialisasi koneksi ke Gemini API: {e}")
+
+def _backoff(delay: float, attempt: int) -> float:
+    """Backoff eksponensial + jitter; jeda setelah 429 diatur cooldown rate limiter."""
+    return delay * (2 ** attempt) + random.uniform(0, 1)
 
 # ======================================================
 # ⚙️ UTILITY: retry untuk koneksi API yang kadang timeout
 # ======================================================
+def _record_success(mode: str, prompt: str, text: str, elapsed: float) -> None:
+    metrics.LLM_DURATION.observe(elapsed, mode=mode, outcome="ok")
+    metrics.LLM_PROMPT_BYTES.observe(len(prompt.encode("utf-8")), mode=mode)
+    metrics.LLM_RESPONSE_BYTES.observe(len((text or "").encode("utf-8")), mode=mode)
+
+
+def _record_failure(mode: str, exc: Exception, elapsed: float, attempt: int, max_retries: int,
+                    retry: bool = True) -> None:
+    metrics.LLM_DURATION.observe(elapsed, mode=mode, outcome="error")
+    metrics.LLM_FAILURES.inc(mode=mode, cause=type(exc).__name__)
+    if retry and attempt < max_retries - 1:
+        metrics.LLM_RETRIES.inc(mode=mode)
+    logger.warning(f"Gagal koneksi Gemini (percobaan {attempt+1}/{max_retries}): {type(exc).__name__}: {str(exc)[:300]}")
+
+
 def safe_generate(prompt: str, max_retries: int = 3, delay: float = 2.0):
     """Pemanggilan API Gemini dengan retry otomatis"""
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(prompt)
-            if response and response.text:
-                return response.text
-            else:
-                raise ValueError("Respon kosong dari Gemini API.")
-        except Exception as e:
-            print(f"[WARN] Gagal koneksi Gemini (percobaan {attempt+1}/{max_retries}): {e}")
+    with metrics.span("llm"):
+        for attempt in range(max_retries):
+            rate_limiter.wait_sync(prompt)
+            t0 = time.perf_counter()
+            try:
+                text = get_provider().generate(prompt)
+                _record_success("sync", prompt, text, time.perf_counter() - t0)
+                return text
+            except Exception as e:
+                elapsed = time.perf_counter() - t0
+                _record_failure("sync", e, elapsed, attempt, max_retries)
+                rate_limiter.record(elapsed, e)
+                if attempt < max_retries - 1:
+                    time.sleep(_backoff(delay, attempt))
+                else:
+                    raise RuntimeError(f"❌ Gagal menghubungi Gemini API setelah {max_retries} percobaan.")
+
+
+async def asafe_generate(prompt: str, max_retries: int = 3, delay: float = 2.0):
+    """Versi async dari safe_generate: tidak memblokir event loop.
+
+    Memakai API async SDK dan asyncio.sleep untuk backoff. Setiap percobaan
+    menunggu giliran di rate limiter (lane, konkurensi adaptif, kuota bersama).
+    """
+    with metrics.span("llm"):
+        for attempt in range(max_retries):
+            t0 = time.perf_counter()
+            try:
+                async with rate_limiter.slot(prompt):
+                    t0 = time.perf_counter()
+                    text = await get_provider().agenerate(prompt)
+                _record_success("async", prompt, text, time.perf_counter() - t0)
+                return text
+            except Exception as e:
+                _record_failure("async", e, time.perf_counter() - t0, attempt, max_retries)
             if attempt < max_retries - 1:
-                time.sleep(delay + random.uniform(0, 1))
+                await asyncio.sleep(_backoff(delay, attempt))
             else:
                 raise RuntimeError(f"❌ Gagal menghubungi Gemini API setelah {max_retries} percobaan.")
 
+async def astream_generate(prompt: str, max_retries: int = 3, delay: float = 2.0):
+    """Versi streaming dari asafe_generate: yield potongan teks begitu tiba.
+
+    Retry hanya dilakukan bila gagal sebelum potongan pertama terkirim;
+    setelah itu error diteruskan ke pemanggil.
+    """
+    for attempt in range(max_retries):
+        parts = []
+        t0 = time.perf_counter()
+        try:
+            async with rate_limiter.slot(prompt):
+                t0 = time.perf_counter()
+                async for chunk in get_provider().astream(prompt):
+                    parts.append(chunk)
+                    yield chunk
+            _record_success("stream", prompt, "".join(parts), time.perf_counter() - t0)
+            return
+        except Exception as e:
+            _record_failure("stream", e, time.perf_counter() - t0, attempt, max_retries, retry=not parts)
+            if parts:
+                raise RuntimeError(f"❌ Stream Gemini terputus: {e}")
+        if attempt < max_retries - 1:
+            await asyncio.sleep(_backoff(delay, attempt))
+        else:
+            raise RuntimeError(f"❌ Gagal menghubungi Gemini API setelah {max_retries} percobaan.")
+
 # ======================================================
 # 🧠 FUNGSI: GENERATE LKPD
 # ======================================================
-def generate_lkpd(theme: str, level: str):
-    """
-    Menghasilkan LKPD otomatis berdasarkan tema dan tingkat kesulitan.
-    Return:
-      (lkpd_data: dict, raw_text: str)
-    """
-    prompt = f"""
+LKPD_PROMPT_TEMPLATE = """
     Anda adalah asisten guru yang membuat LKPD (Lembar Kerja Peserta Didik).
     Buat LKPD dengan format JSON seperti berikut (JANGAN pakai markdown):
 
@@ -65,7 +136,7 @@ def generate_lkpd(theme: str, level: str):
       "questions": [
         {{
           "id": "1",
-          "type": "PG",  // 'PG' = pilihan ganda, 'IS' = isian singkat
+          "type": "PG",
           "question": "Tuliskan pertanyaan di sini",
           "options": {{
             "A": "Pilihan A",
@@ -79,66 +150,169 @@ def generate_lkpd(theme: str, level: str):
       ]
     }}
 
+    "type" diisi "PG" (pilihan ganda, wajib ada "options" dan "answer" berupa
+    huruf opsi) atau "IS" (isian singkat, "answer" berisi jawaban singkat dan
+    "accepted" berisi daftar variasi jawaban lain yang juga benar, boleh kosong).
     Buat minimal 5 soal bervariasi sesuai tema dan tingkat kesulitan.
-    Format harus **JSON valid**, tanpa teks tambahan.
+    Format harus **JSON valid** tanpa komentar, tanpa teks tambahan.
+    """
+
+# Versi prompt: berubah otomatis bila template diubah (dipakai sebagai kunci cache)
+PROMPT_VERSION = hashlib.sha256(LKPD_PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+
+
+def _build_lkpd_prompt(theme: str, level: str) -> str:
+    return LKPD_PROMPT_TEMPLATE.format(theme=theme, level=level)
+
+
+def _parse_lkpd_output(raw_output: str, theme: str = "", level: str = ""):
+    """Parse toleran + validasi skema. Return (lkpd_data, soal_invalid)."""
+    with metrics.span("parse"):
+        try:
+            return lkpd_extract.parse_lkpd(raw_output, theme, level)
+        except ValueError as e:
+            raise ValueError(f"❌ Gagal parse JSON dari Gemini: {e}\nTeks mentah:\n{raw_output[:500]}")
+
+
+REPAIR_PROMPT_TEMPLATE = """
+    Satu soal LKPD (tema: {theme}, tingkat: {level}) tidak valid: {reason}.
+    Perbaiki soal nomor {pos} berikut. Jawab hanya dengan SATU objek JSON
+    (tanpa markdown, tanpa komentar) dengan field: id, type ("PG" atau "IS"),
+    question, options (A-D, hanya untuk PG), answer (untuk PG: huruf opsi), score.
+
+    Soal:
+    {question}
     """
 
-    raw_output = safe_generate(prompt)
 
-    # Cari blok JSON valid
-    import re, json
-    match = re.search(r"\{[\s\S]*\}", raw_output)
-    if not match:
-        raise ValueError("❌ Output dari Gemini tidak berisi JSON yang valid.")
-    json_str = match.group(0)
+def _build_repair_prompt(theme: str, level: str, pos: int, raw_question, reason: str) -> str:
+    question = raw_question if isinstance(raw_question, str) else json.dumps(raw_question, ensure_ascii=False)
+    return REPAIR_PROMPT_TEMPLATE.format(theme=theme, level=level, pos=pos, reason=reason,
+                                         question=question[:2000])
 
+
+def _accept_repair(pos: int, text) -> Optional[dict]:
+    if not isinstance(text, str):
+        return None  # panggilan perbaikan gagal
     try:
-        lkpd_data = json.loads(json_str)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"❌ Gagal parse JSON dari Gemini: {e}\nTeks mentah:\n{raw_output[:500]}")
+        q = lkpd_extract.extract_json(text)
+    except ValueError:
+        return None
+    if isinstance(q, list) and q:
+        q = q[0]
+    if isinstance(q, dict) and not q.get("id"):
+        q["id"] = str(pos)
+    fixed, _reason = lkpd_extract.check_question(q, pos)
+    return fixed
+
+
+def _finish_repair(lkpd_data: dict, invalid: list, repaired: list) -> dict:
+    fixed = lkpd_extract.merge_repaired(lkpd_data, invalid, repaired)
+    metrics.LKPD_REPAIRS.inc(fixed, outcome="fixed")
+    metrics.LKPD_REPAIRS.inc(len(invalid) - fixed, outcome="dropped")
+    if len(invalid) > fixed:
+        logger.warning(f"{len(invalid) - fixed} soal tidak bisa diperbaiki dan dibuang.")
+    if not lkpd_data["questions"]:
+        raise ValueError("❌ Output Gemini tidak berisi soal yang valid.")
+    return lkpd_data
+
+
+def _repair_questions(theme: str, level: str, lkpd_data: dict, invalid: list) -> dict:
+    """Perbaiki hanya soal yang tidak valid (satu panggilan kecil per soal)."""
+    repaired = []
+    for pos, raw_q, reason in invalid:
+        try:
+            text = safe_generate(_build_repair_prompt(theme, level, pos, raw_q, reason), max_retries=1)
+        except Exception:
+            text = None
+        repaired.append(_accept_repair(pos, text))
+    return _finish_repair(lkpd_data, invalid, repaired)
+
+
+async def _arepair_questions(theme: str, level: str, lkpd_data: dict, invalid: list) -> dict:
+    """Versi async _repair_questions; semua soal diperbaiki paralel."""
+    results = await asyncio.gather(
+        *(asafe_generate(_build_repair_prompt(theme, level, pos, raw_q, reason), max_retries=1)
+          for pos, raw_q, reason in invalid),
+        return_exceptions=True,
+    )
+    repaired = [_accept_repair(pos, text) for (pos, _, _), text in zip(invalid, results)]
+    return _finish_repair(lkpd_data, invalid, repaired)
+
+
+def generate_lkpd(theme: str, level: str):
+    """
+    Menghasilkan LKPD otomatis berdasarkan tema dan tingkat kesulitan.
+    Soal yang tidak valid diperbaiki satu per satu (bukan generate ulang).
+    Return:
+      (lkpd_data: dict, raw_text: str)
+    """
+    raw_output = safe_generate(_build_lkpd_prompt(theme, level))
+    lkpd_data, invalid = _parse_lkpd_output(raw_output, theme, level)
+    if invalid:
+        lkpd_data = _repair_questions(theme, level, lkpd_data, invalid)
+    return lkpd_data, raw_output
 
-    # Pastikan setiap soal punya ID
-    for i, q in enumerate(lkpd_data.get("questions", []), 1):
-        if "id" not in q:
-            q["id"] = str(i)
 
+async def agenerate_lkpd(theme: str, level: str):
+    """Versi async dari generate_lkpd (untuk endpoint FastAPI)."""
+    raw_output = await asafe_generate(_build_lkpd_prompt(theme, level))
+    lkpd_data, invalid = _parse_lkpd_output(raw_output, theme, level)
+    if invalid:
+        lkpd_data = await _arepair_questions(theme, level, lkpd_data, invalid)
     return lkpd_data, raw_output
 
+
+async def agenerate_lkpd_stream(theme: str, level: str):
+    """Generate LKPD secara streaming.
+
+    Yield ("question", soal) untuk setiap soal valid begitu objeknya lengkap,
+    lalu satu ("done", lkpd_data) berisi dokumen lengkap yang sudah divalidasi
+    (soal yang diperbaiki belakangan hanya ada di dokumen ini).
+    """
+    from api.lkpd_stream import QuestionStreamParser
+
+    parser = QuestionStreamParser()
+    async for chunk in astream_generate(_build_lkpd_prompt(theme, level)):
+        for q in parser.feed(chunk):
+            yield "question", q
+    lkpd_data, invalid = _parse_lkpd_output(parser.text, theme, level)
+    if invalid:
+        lkpd_data = await _arepair_questions(theme, level, lkpd_data, invalid)
+    yield "done", lkpd_data
+
 # ======================================================
 # 🧩 FUNGSI: ANALISA JAWABAN SISWA
 # ======================================================
-def analyze_answer_with_ai(lkpd_data: dict, student_answers: list, student_name: str):
-    """
-    Membandingkan jawaban siswa dengan kunci jawaban dari LKPD.
-    Gunakan Gemini hanya untuk analisis penjelasan & penilaian subyektif.
-    Return: dict {"name": ..., "total_score": ..., "feedback": ...}
-    """
-    # Hitung skor otomatis
-    total_score = 0
-    max_score = 0
-    for q in lkpd_data.get("questions", []):
-        kunci = q.get("answer", "").strip().upper()
-        bobot = float(q.get("score", 10))
-        max_score += bobot
+def score_answers(lkpd_data: dict, student_answers: list):
+    """Hitung skor otomatis (tanpa AI). Return: (nilai_akhir_persen, max_score)."""
+    from api.scoring import CompiledKey
+    return CompiledKey(lkpd_data).score(student_answers)
 
-        # cari jawaban siswa
-        jawab = next((a["jawaban"] for a in student_answers if a["id"] == q["id"]), "")
-        if jawab.strip().upper() == kunci:
-            total_score += bobot
 
-    nilai_akhir = round((total_score / max_score) * 100, 2) if max_score > 0 else 0.0
-
-    # Analisis AI (opsional) — untuk feedback kualitatif
-    summary_prompt = f"""
+def _build_feedback_prompt(student_name: str, theme, nilai_akhir: float) -> str:
+    return f"""
     Anda adalah guru yang memberikan umpan balik ringkas terhadap hasil siswa.
     Nama siswa: {student_name}
-    Tema LKPD: {lkpd_data.get('theme')}
+    Tema LKPD: {theme}
     Nilai akhir: {nilai_akhir}
 
     Berikan 2-3 kalimat umpan balik positif dan saran perbaikan.
     Gunakan bahasa Indonesia.
     """
 
+
+def analyze_answer_with_ai(lkpd_data: dict, student_answers: list, student_name: str):
+    """
+    Membandingkan jawaban siswa dengan kunci jawaban dari LKPD.
+    Gunakan Gemini hanya untuk analisis penjelasan & penilaian subyektif.
+    Return: dict {"name": ..., "total_score": ..., "feedback": ...}
+    """
+    nilai_akhir, max_score = score_answers(lkpd_data, student_answers)
+
+    # Analisis AI (opsional) — untuk feedback kualitatif
+    summary_prompt = _build_feedback_prompt(student_name, lkpd_data.get("theme"), nilai_akhir)
+
     try:
         feedback = safe_generate(summary_prompt)
     except Exception:
@@ -152,3 +326,100 @@ def analyze_answer_with_ai(lkpd_data: dict, student_answers: list, student_name:
     }
 
     return result
+
+
+async def aanalyze_answer_with_ai(lkpd_data: dict, student_answers: list, student_name: str):
+    """Versi async dari analyze_answer_with_ai (untuk endpoint FastAPI)."""
+    nilai_akhir, max_score = score_answers(lkpd_data, student_answers)
+    summary_prompt = _build_feedback_prompt(student_name, lkpd_data.get("theme"), nilai_akhir)
+
+    try:
+        feedback = await asafe_generate(summary_prompt)
+    except Exception:
+        feedback = "Analisis AI gagal dijalankan. Nilai dihitung otomatis."
+
+    return {
+        "name": student_name,
+        "score": nilai_akhir,
+        "feedback": feedback.strip(),
+        "max_score": max_score,
+    }
+
+
+async def agenerate_feedback(student_name: str, theme, nilai_akhir: float, max_retries: int = 1) -> str:
+    """Feedback kualitatif saja (skor sudah dihitung lokal). Raise bila gagal."""
+    feedback = await asafe_generate(_build_feedback_prompt(student_name, theme, nilai_akhir),
+                                    max_retries=max_retries)
+    return feedback.strip()
+
+
+def _build_feedback_batch_prompt(theme, students: list) -> str:
+    rows = "\n".join(
+        f"    {i}. Nama: {s['name']} | Nilai akhir: {s['score']}" for i, s in enumerate(students, 1)
+    )
+    return f"""
+    Anda adalah guru yang memberikan umpan balik ringkas terhadap hasil siswa.
+    Tema LKPD: {theme}
+    Daftar siswa:
+{rows}
+
+    Untuk SETIAP siswa, berikan 2-3 kalimat umpan balik positif dan saran perbaikan
+    dalam bahasa Indonesia. Jawab hanya dengan JSON array (tanpa markdown):
+    [{{"no": 1, "feedback": "..."}}, {{"no": 2, "feedback": "..."}}]
+    """
+
+
+async def agenerate_feedback_batch(theme, students: list, max_retries: int = 1) -> dict:
+    """Feedback untuk banyak siswa dalam satu panggilan.
+
+    students: [{"name": ..., "score": ...}, ...]
+    Return: {index_0_based: feedback}; siswa yang tidak ada di respon tidak dimasukkan.
+    """
+    raw = await asafe_generate(_build_feedback_batch_prompt(theme, students), max_retries=max_retries)
+    items = lkpd_extract.extract_json(raw)
+    if not isinstance(items, list):
+        raise ValueError("❌ Output feedback batch tidak berisi JSON array.")
+    out = {}
+    for item in items:
+        try:
+            idx = int(item.get("no")) - 1
+            fb = str(item.get("feedback") or "").strip()
+        except (AttributeError, TypeError, ValueError):
+            continue
+        if 0 <= idx < len(students) and fb:
+            out[idx] = fb
+    return out
+
+
+# ======================================================
+# ✍️ FUNGSI: NILAI JAWABAN ISIAN SINGKAT (kasus ambigu)
+# ======================================================
+JUDGE_PROMPT_TEMPLATE = """
+    Nilai jawaban isian singkat siswa. Anggap benar bila maknanya sama dengan
+    kunci (sinonim, ejaan sedikit berbeda, atau urutan kata berbeda masih boleh).
+
+    Soal: {question}
+    Kunci jawaban: {answer}
+    Variasi jawaban yang juga benar: {accepted}
+    Jawaban siswa: {student_answer}
+
+    Jawab hanya dengan JSON: {{"benar": true}} atau {{"benar": false}}
+    """
+
+
+async def ajudge_short_answer(question: str, answer: str, accepted: list, student_answer: str,
+                              max_retries: int = 2) -> bool:
+    """Putusan LLM untuk satu jawaban IS yang ambigu. Raise bila output tidak bisa dibaca."""
+    prompt = JUDGE_PROMPT_TEMPLATE.format(
+        question=question, answer=answer, accepted=", ".join(map(str, accepted)) or "-",
+        student_answer=str(student_answer)[:500])
+    raw = await asafe_generate(prompt, max_retries=max_retries)
+    data = lkpd_extract.extract_json(raw)
+    if not isinstance(data, dict) or not isinstance(data.get("benar"), bool):
+        raise ValueError(f"❌ Output penilaian isian tidak valid: {raw[:200]}")
+    return data["benar"]
+
+
+def list_available_models() -> dict:
+    """Info provider & model yang aktif (tanpa memanggil API)."""
+    return get_provider().describe()
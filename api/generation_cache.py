@@ -0,0 +1,312 @@
+# api/generation_cache.py
+"""Cache hasil generate LKPD, dikunci oleh (tema ternormalisasi, level, versi prompt).
+
+- Kunci: sha256 dari tema (lowercase, spasi dirapikan), level, dan
+  ``gemini_config.PROMPT_VERSION``; mengubah template prompt otomatis
+  membuat kunci baru.
+- TTL (GEN_CACHE_TTL detik) dan eviction LRU (GEN_CACHE_MAX_ENTRIES).
+- Tersimpan di disk (GEN_CACHE_DIR) sehingga tetap ada setelah restart.
+  Indeks LRU ada di memori; dari jalur async hanya entry yang sudah dimuat
+  yang dibaca langsung, sedangkan scan direktori, baca entry dingin, tulis,
+  dan eviction berjalan di ``asyncio.to_thread``.
+- Mode varian (GEN_CACHE_VARIANTS=N, opt-in): simpan hingga N varian per
+  kunci; setelah N varian terkumpul, kembalikan salah satu secara acak
+  tanpa memanggil model.
+- Coalescing (single-flight): request identik yang datang saat generate
+  untuk kunci yang sama masih berjalan ikut menunggu generate itu, bukan
+  memanggil model lagi. Generate dibatalkan bila semua penunggunya pergi
+  (mis. klien memutus koneksi).
+"""
+
+import os
+import copy
+import asyncio
+import json
+import time
+import random
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from api import gemini_config
+from api import metrics
+
+CACHE_DIR = os.getenv("GEN_CACHE_DIR", "data/cache/lkpd")
+ENABLED = os.getenv("GEN_CACHE_ENABLED", "1") not in ("0", "false", "False")
+TTL = float(os.getenv("GEN_CACHE_TTL", str(7 * 24 * 3600)))
+MAX_ENTRIES = int(os.getenv("GEN_CACHE_MAX_ENTRIES", "1000"))
+VARIANTS = int(os.getenv("GEN_CACHE_VARIANTS", "0"))
+
+
+def normalize_theme(theme: str) -> str:
+    return " ".join(str(theme).lower().split())
+
+
+def make_key(theme: str, level: str) -> str:
+    raw = f"{normalize_theme(theme)}|{str(level).strip().lower()}|{gemini_config.PROMPT_VERSION}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """Satu generate yang sedang berjalan, dibagi oleh semua request identik.
+
+    ``questions`` menampung soal yang sudah jadi (bila generate di-stream)
+    supaya penunggu yang datang belakangan tetap menerima semuanya.
+    """
+
+    def __init__(self, key: str = ""):
+        self.key = key
+        self.questions: List[Dict[str, Any]] = []
+        self.finished = False
+        self.waiters = 0
+        self.task: Optional["asyncio.Task"] = None
+        self._cond = asyncio.Condition()
+
+    async def publish(self, question: Dict[str, Any]) -> None:
+        async with self._cond:
+            self.questions.append(question)
+            self._cond.notify_all()
+
+    async def _finish(self) -> None:
+        async with self._cond:
+            self.finished = True
+            self._cond.notify_all()
+
+    async def follow(self) -> AsyncIterator[Dict[str, Any]]:
+        """Salinan setiap soal yang di-publish, dari awal sampai generate selesai."""
+        sent = 0
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: sent < len(self.questions) or self.finished)
+                batch = self.questions[sent:]
+                done = self.finished
+            sent += len(batch)
+            for q in batch:
+                yield copy.deepcopy(q)
+            if done and sent == len(self.questions):
+                return
+
+    async def result(self) -> dict:
+        """Salinan hasil generate (setiap penunggu mendapat dict sendiri)."""
+        return copy.deepcopy(await asyncio.shield(self.task))
+
+
+# generate(publish) -> lkpd_data; publish(soal) opsional dipanggil per soal yang jadi
+Generator = Callable[[Callable[[Dict[str, Any]], Awaitable[None]]], Awaitable[dict]]
+
+
+class GenerationCache:
+    def __init__(self, cache_dir: str = CACHE_DIR, ttl: float = TTL, max_entries: int = MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> entry ({"variants": [...]}) atau None bila baru ada di disk
+        self._lru: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+        self._scanned = False
+        self._guard = threading.Lock()  # melindungi _lru (dipakai dari loop dan thread)
+        self._scan_lock = threading.Lock()
+        self._write_lock = threading.Lock()  # remember berurutan agar isi disk = isi memori
+        # key -> generate yang sedang berjalan
+        self._flights: Dict[str, Flight] = {}
+
+    # ---------- disk ----------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _scan(self) -> None:
+        """Sekali per proses: daftarkan entry di disk, urut dari yang paling lama dipakai."""
+        if self._scanned:
+            return
+        with self._scan_lock:
+            if self._scanned:
+                return
+            os.makedirs(self.cache_dir, exist_ok=True)
+            files = []
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".json") and not name.startswith("tmp"):
+                    try:
+                        files.append((os.path.getmtime(os.path.join(self.cache_dir, name)), name[:-5]))
+                    except OSError:
+                        continue
+            with self._guard:
+                for _, key in sorted(files):
+                    self._lru.setdefault(key, None)
+                evicted = self._take_evicted()
+                self._scanned = True
+            self._remove(evicted)
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def _write(self, key: str, entry: Dict[str, Any]) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix="tmp", dir=self.cache_dir, suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, self._path(key))
+        except Exception:
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+            raise
+
+    def _take_evicted(self) -> List[str]:
+        """Keluarkan kunci lewat batas LRU dari indeks (panggil dengan _guard dipegang)."""
+        evicted = []
+        while len(self._lru) > self.max_entries:
+            key, _ = self._lru.popitem(last=False)
+            evicted.append(key)
+        return evicted
+
+    def _remove(self, keys: List[str]) -> None:
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    # ---------- API ----------
+    def _fresh_variants(self, key: str) -> List[Dict[str, Any]]:
+        self._scan()
+        with self._guard:
+            if key not in self._lru:
+                return []
+            entry = self._lru[key]
+            self._lru.move_to_end(key)
+        if entry is None:
+            entry = self._read(key) or {"variants": []}
+            with self._guard:
+                if key in self._lru:
+                    entry = self._lru[key] or entry
+                    self._lru[key] = entry
+        now = time.time()
+        return [v for v in entry.get("variants", []) if now - v.get("created_at", 0) < self.ttl]
+
+    def _store(self, key: str, variants: List[Dict[str, Any]]) -> None:
+        entry = {"variants": variants}
+        with self._guard:
+            self._lru[key] = entry
+            self._lru.move_to_end(key)
+            evicted = self._take_evicted()
+        self._write(key, entry)
+        self._remove(evicted)
+
+    def _is_warm(self, key: str) -> bool:
+        """True bila lookup ``key`` tidak perlu menyentuh disk."""
+        with self._guard:
+            return self._scanned and (key not in self._lru or self._lru[key] is not None)
+
+    def lookup(self, theme: str, level: str, variants: Optional[int] = None, fresh: bool = False) -> Optional[dict]:
+        """Salinan LKPD dari cache, atau None bila perlu generate baru (blocking bila entry belum dimuat)."""
+        if not ENABLED or fresh:
+            return None
+        n_variants = VARIANTS if variants is None else int(variants)
+        cached = self._fresh_variants(make_key(theme, level))
+        if not cached or (n_variants > 0 and len(cached) < n_variants):
+            return None
+        chosen = random.choice(cached) if n_variants > 0 else cached[-1]
+        return copy.deepcopy(chosen["data"])
+
+    def remember(self, theme: str, level: str, lkpd_data: dict, variants: Optional[int] = None) -> None:
+        """Simpan hasil generate baru sebagai varian (yang paling lama dibuang). Blocking (tulis disk)."""
+        if not ENABLED:
+            return
+        n_variants = VARIANTS if variants is None else int(variants)
+        key = make_key(theme, level)
+        with self._write_lock:
+            cached = self._fresh_variants(key)
+            keep = max(n_variants, 1)
+            cached = (cached + [{"data": copy.deepcopy(lkpd_data), "created_at": time.time()}])[-keep:]
+            self._store(key, cached)
+
+    async def alookup(self, theme: str, level: str, variants: Optional[int] = None,
+                      fresh: bool = False) -> Optional[dict]:
+        """``lookup`` untuk kode async: entry di memori dijawab langsung, disk dibaca di thread."""
+        if not ENABLED or fresh:
+            return None
+        if self._is_warm(make_key(theme, level)):
+            return self.lookup(theme, level, variants, fresh)
+        return await asyncio.to_thread(self.lookup, theme, level, variants, fresh)
+
+    # ---------- coalescing ----------
+    async def _run(self, key: str, flight: Flight, theme: str, level: str,
+                   generate: Generator, variants: Optional[int]) -> dict:
+        try:
+            lkpd_data = await generate(flight.publish)
+            if not isinstance(lkpd_data, dict):
+                raise ValueError("AI tidak menghasilkan data LKPD yang valid.")
+            await asyncio.to_thread(self.remember, theme, level, lkpd_data, variants)
+            return lkpd_data
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            await flight._finish()
+
+    async def join(self, theme: str, level: str, generate: Generator,
+             variants: Optional[int] = None, fresh: bool = False) -> Tuple[Optional[dict], Optional[Flight], str]:
+        """Return (lkpd_data, None, "hit") dari cache, atau (None, flight, "miss"|"shared").
+
+        "miss" berarti request ini memulai generate baru; "shared" berarti
+        ikut generate identik yang sudah berjalan. Request ``fresh`` juga
+        ikut bergabung: hasil yang sedang dibuat memang belum pernah dipakai.
+        Pakai ``attach(flight)`` selama menunggu hasil.
+        """
+        cached = await self.alookup(theme, level, variants, fresh)
+        if cached is not None:
+            metrics.GEN_REQUESTS.inc(source="hit")
+            return cached, None, "hit"
+        key = make_key(theme, level)
+        flight = self._flights.get(key)
+        source = "shared"
+        if flight is None or flight.task.done():  # flight yang sudah dibatalkan/selesai tidak diikuti
+            flight = Flight(key)
+            flight.task = asyncio.ensure_future(self._run(key, flight, theme, level, generate, variants))
+            self._flights[key] = flight
+            source = "miss"
+        metrics.GEN_REQUESTS.inc(source=source)
+        return None, flight, source
+
+    @asynccontextmanager
+    async def attach(self, flight: Flight) -> AsyncIterator[Flight]:
+        """Daftarkan penunggu; generate dibatalkan bila penunggu terakhir pergi sebelum selesai."""
+        flight.waiters += 1
+        try:
+            yield flight
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # lepas dari _flights dulu: join berikutnya memulai generate baru, bukan ikut yang dibatalkan
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+                flight.task.cancel()
+
+    async def get_or_generate(
+        self,
+        theme: str,
+        level: str,
+        generate: Callable[[], Awaitable[Tuple[dict, str]]],
+        variants: Optional[int] = None,
+        fresh: bool = False,
+    ) -> Tuple[dict, str]:
+        """Return (lkpd_data salinan, sumber: "hit" | "miss" | "shared")."""
+        async def _generate(publish):
+            lkpd_data, _raw = await generate()
+            return lkpd_data
+
+        cached, flight, source = await self.join(theme, level, _generate, variants, fresh)
+        if cached is not None:
+            return cached, source
+        async with self.attach(flight):
+            return await flight.result(), source
+
+
+generation_cache = GenerationCache()
@@ -0,0 +1,320 @@
+# api/jobs.py
+"""Job generate LKPD massal (satu semester sekaligus).
+
+Job berisi daftar pasangan (tema, level), ditulis ke ``JOBS_DIR/{job_id}.json``
+dan diperbarui setiap kali satu item selesai. Item dikerjakan oleh pool
+worker terbatas (GEN_JOB_WORKERS) dengan token bucket (GEN_JOB_RATE_PER_MIN)
+supaya tidak menghabiskan kuota Gemini. Setiap hasil langsung disimpan
+lewat jalur yang sama dengan /generate (storage LKPD + katalog), jadi item
+yang sudah selesai tidak hilang walau job terputus.
+
+Resume: saat startup, job yang belum selesai dilanjutkan. Item berstatus
+``done`` (sudah punya ``lkpd_id``) dilewati. Id LKPD tiap item diturunkan dari
+(job_id, index), jadi item yang terputus setelah LKPD-nya tersimpan cukup
+menimpa LKPD yang sama saat dikerjakan ulang (tidak ada duplikat di katalog). Antar-proses uvicorn, job
+dipegang satu proses lewat ``flock`` non-blocking pada ``{job_id}.lock``;
+proses lain hanya membaca file job untuk progres.
+"""
+
+import os
+import copy
+import uuid
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, IO, List, Optional
+
+try:  # flock hanya ada di POSIX; tanpa flock job dianggap milik proses ini
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from api import gemini_config
+from api.db import _atomic_write_json, _safe_load_json
+from api.events import AnswerEvents
+from api.feedback_queue import _RateBudget
+from api.generation_cache import generation_cache
+from api.lkpd_persist import persist_generated
+from api.rate_limiter import lane
+
+logger = logging.getLogger("eduai")
+
+JOBS_DIR = os.getenv("JOBS_DIR", "data/jobs")
+WORKERS = int(os.getenv("GEN_JOB_WORKERS", "2"))
+RATE_PER_MIN = float(os.getenv("GEN_JOB_RATE_PER_MIN", "20"))
+MAX_ITEMS = int(os.getenv("GEN_JOB_MAX_ITEMS", "500"))
+
+ACTIVE = ("queued", "running")
+
+# sinyal progres per job_id (pola sama dengan answer_events)
+job_events = AnswerEvents()
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def item_lkpd_id(job_id: str, index: int) -> str:
+    """Id LKPD tetap per (job, item): item yang dikerjakan ulang menimpa LKPD yang sama."""
+    return hashlib.sha256(f"{job_id}:{index}".encode("utf-8")).hexdigest()[:8]
+
+
+def build_items(payload: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Daftar (tema, level) dari ``items`` dan/atau matriks ``themes`` x ``levels``.
+
+    Raise ValueError bila kosong, ada yang tidak lengkap, atau melebihi MAX_ITEMS.
+    """
+    pairs = []
+    for it in payload.get("items") or []:
+        if isinstance(it, (list, tuple)) and len(it) == 2:
+            theme, level = it
+        elif isinstance(it, dict):
+            theme = it.get("theme") or it.get("tema")
+            level = it.get("level") or it.get("tingkat") or it.get("difficulty")
+        else:
+            raise ValueError("Setiap item harus {theme, level} atau [theme, level].")
+        pairs.append((theme, level))
+    themes = payload.get("themes") or payload.get("tema") or []
+    levels = payload.get("levels") or payload.get("tingkat") or []
+    pairs.extend((t, l) for t in themes for l in levels)
+
+    items = []
+    for theme, level in pairs:
+        theme, level = str(theme or "").strip(), str(level or "").strip()
+        if not theme or not level:
+            raise ValueError("Setiap item wajib punya 'theme' dan 'level'.")
+        items.append({"index": len(items), "theme": theme, "level": level,
+                      "status": "pending", "lkpd_id": None, "error": None})
+    if not items:
+        raise ValueError("Isi 'items' atau 'themes' + 'levels'.")
+    if len(items) > MAX_ITEMS:
+        raise ValueError(f"Maksimal {MAX_ITEMS} item per job.")
+    return items
+
+
+def summarize(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Ringkasan progres tanpa daftar item."""
+    counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+    for it in job.get("items", []):
+        counts[it["status"]] = counts.get(it["status"], 0) + 1
+    out = {k: job.get(k) for k in ("id", "name", "status", "created_at", "updated_at", "fresh")}
+    out.update(total=len(job.get("items", [])), **counts)
+    return out
+
+
+class GenerationJobs:
+    def __init__(self, jobs_dir: str = JOBS_DIR, workers: int = WORKERS, rate_per_min: float = RATE_PER_MIN):
+        self.jobs_dir = jobs_dir
+        self.workers = max(1, workers)
+        self.rate_per_min = rate_per_min
+        self._jobs: Dict[str, Dict[str, Any]] = {}   # job yang dipegang proses ini
+        self._owned: Dict[str, Optional[IO]] = {}     # job_id -> file lock
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._budget: Optional[_RateBudget] = None
+        self._save_locks: Dict[str, asyncio.Lock] = {}
+
+    # ---------- file job ----------
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _save(self, job: Dict[str, Any]) -> None:
+        job["updated_at"] = _now()
+        _atomic_write_json(self._path(job["id"]), job)
+        job_events.publish(job["id"])
+
+    async def _asave(self, job: Dict[str, Any]) -> None:
+        """Seperti ``_save`` tetapi tulis file di thread (dipakai worker di setiap transisi item).
+
+        Snapshot diambil di bawah lock per job supaya tulisan yang lebih baru selalu mendarat terakhir.
+        """
+        lock = self._save_locks.setdefault(job["id"], asyncio.Lock())
+        async with lock:
+            job["updated_at"] = _now()
+            await asyncio.to_thread(_atomic_write_json, self._path(job["id"]), copy.deepcopy(job))
+        job_events.publish(job["id"])
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """State job terbaru (dari memori bila dipegang proses ini, selain itu dari disk)."""
+        return self._jobs.get(job_id) or _safe_load_json(self._path(job_id))
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.jobs_dir):
+            return []
+        out = []
+        for name in sorted(os.listdir(self.jobs_dir)):
+            if name.endswith(".json") and not name.startswith("tmp"):
+                job = self.load(name[:-5])
+                if job:
+                    out.append(summarize(job))
+        return sorted(out, key=lambda j: j.get("created_at") or "", reverse=True)
+
+    def _claim(self, job_id: str) -> bool:
+        """Ambil kepemilikan job (flock non-blocking). False bila dipegang proses lain."""
+        if job_id in self._owned:
+            return True
+        if fcntl is None:
+            self._owned[job_id] = None
+            return True
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        lf = open(os.path.join(self.jobs_dir, f"{job_id}.lock"), "a")
+        try:
+            fcntl.flock(lf, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lf.close()
+            return False
+        self._owned[job_id] = lf
+        return True
+
+    def _release(self, job_id: str) -> None:
+        self._jobs.pop(job_id, None)
+        self._save_locks.pop(job_id, None)
+        lf = self._owned.pop(job_id, None)
+        if lf is not None:
+            lf.close()  # flock ikut terlepas
+
+    # ---------- lifecycle ----------
+    def start(self) -> None:
+        """Jalankan worker dan lanjutkan job yang belum selesai (resume)."""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._budget = _RateBudget(self.rate_per_min)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if os.path.isdir(self.jobs_dir):
+            for name in sorted(os.listdir(self.jobs_dir)):
+                if name.endswith(".json") and not name.startswith("tmp"):
+                    job = _safe_load_json(os.path.join(self.jobs_dir, name))
+                    if job and job.get("status") in ACTIVE and self._claim(job["id"]):
+                        logger.info(f"Melanjutkan job generate {job['id']}.")
+                        self._reset_interrupted(job)
+                        self._schedule(job)
+
+    async def stop(self) -> None:
+        for t in self._workers:
+            t.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        for job_id in list(self._owned):
+            self._release(job_id)
+
+    def submit(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Buat job baru dari payload (lihat ``build_items``). Return job.
+
+        RuntimeError bila lock job baru tidak bisa diambil.
+        """
+        job = {
+            "name": str(payload.get("name") or ""),
+            "status": "queued",
+            "fresh": bool(payload.get("fresh")),
+            "created_at": _now(),
+            "items": build_items(payload),
+        }
+        self.start()
+        # id 12 hex jarang bentrok; bila lock-nya dipegang proses lain, jangan ikut menjadwalkan
+        for _ in range(3):
+            job_id = uuid.uuid4().hex[:12]
+            if self._claim(job_id):
+                job = {"id": job_id, **job}
+                self._schedule(job)
+                return job
+        raise RuntimeError("Gagal mengambil lock job baru.")
+
+    def resume(self, job_id: str, retry_failed: bool = True) -> Optional[Dict[str, Any]]:
+        """Lanjutkan job, default termasuk item yang gagal.
+
+        None bila job tidak ada atau sedang dipegang proses lain.
+        """
+        self.start()
+        job = self._jobs.get(job_id)
+        if job is None:
+            if not os.path.exists(self._path(job_id)) or not self._claim(job_id):
+                return None
+            job = _safe_load_json(self._path(job_id))  # baca ulang setelah lock didapat
+            if job is None:
+                self._release(job_id)
+                return None
+            self._reset_interrupted(job)
+        if retry_failed:
+            for it in job["items"]:
+                if it["status"] == "failed":
+                    it.update(status="pending", error=None)
+        self._schedule(job)
+        return job
+
+    @staticmethod
+    def _reset_interrupted(job: Dict[str, Any]) -> None:
+        """Item ``running`` di file milik proses yang sudah mati: kerjakan ulang."""
+        for it in job["items"]:
+            if it["status"] == "running":
+                it["status"] = "pending"
+
+    def _schedule(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["id"]] = job
+        for it in job["items"]:
+            if it["status"] == "pending":
+                self._queue.put_nowait((job["id"], it["index"]))  # duplikat dilewati worker
+        running = any(it["status"] == "running" for it in job["items"])
+        job["status"] = "running" if running else "queued"
+        self._save(job)
+        self._finish_if_done(job)
+
+    @staticmethod
+    def _mark_done(job: Dict[str, Any]) -> bool:
+        """Tandai job selesai bila tidak ada item tersisa. Return True bila baru saja selesai."""
+        if job.get("status") == "done" or any(it["status"] in ("pending", "running") for it in job["items"]):
+            return False
+        job["status"] = "done"
+        job["finished_at"] = _now()
+        return True
+
+    def _finish_if_done(self, job: Dict[str, Any]) -> None:
+        if self._mark_done(job):
+            self._save(job)
+            self._release(job["id"])
+
+    # ---------- worker ----------
+    async def _worker(self) -> None:
+        # lane bulk: di bawah /generate interaktif, di atas feedback background
+        with lane("bulk"):
+            await self._work()
+
+    async def _work(self) -> None:
+        while True:
+            job_id, index = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            item = job["items"][index]
+            if item["status"] != "pending":
+                continue
+            item["status"] = "running"
+            job["status"] = "running"
+            await self._asave(job)
+            try:
+                await self._budget.acquire()
+                item["lkpd_id"] = await self._generate(item["theme"], item["level"], job.get("fresh", False),
+                                                       item_lkpd_id(job_id, index))
+                item["status"] = "done"
+            except asyncio.CancelledError:
+                item["status"] = "pending"
+                raise
+            except Exception as e:
+                logger.warning(f"Job {job_id} item {index} gagal: {e}")
+                item["status"] = "failed"
+                item["error"] = str(e)
+            finished = self._mark_done(job)
+            await self._asave(job)
+            if finished:
+                self._release(job_id)
+
+    @staticmethod
+    async def _generate(theme: str, level: str, fresh: bool, lkpd_id: str) -> str:
+        lkpd_data, _source = await generation_cache.get_or_generate(
+            theme, level, lambda: gemini_config.agenerate_lkpd(theme, level), fresh=fresh)
+        return await asyncio.to_thread(persist_generated, theme, level, lkpd_data, lkpd_id)
+
+
+generation_jobs = GenerationJobs()
@@ -0,0 +1,93 @@
+# api/lkpd_cache.py
+"""Cache LRU in-process untuk dokumen LKPD yang sudah di-parse.
+
+Entry divalidasi dengan (mtime_ns, size) file sumber (atau versi baris untuk
+backend SQLite), sehingga perubahan dari worker lain tetap terbaca; jalur
+tulis di proses ini memanggil ``invalidate``.
+Selain dict hasil parse, cache menyimpan bytes respon yang sudah di-serialize
+beserta ETag-nya agar ``/lkpd/{id}`` bisa menjawab 304 tanpa encode ulang,
+dan versi gzip-nya (dibuat sekali saat pertama diminta, bukan per request).
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from api import compression
+from api import metrics
+from api import serializer
+
+MAX_ENTRIES = int(os.getenv("LKPD_CACHE_SIZE", "256"))
+
+
+class CachedDoc:
+    __slots__ = ("data", "body", "etag", "stamp", "_gzip")
+
+    def __init__(self, data: Dict[str, Any], body: bytes, stamp: Any):
+        self.data = data
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.stamp = stamp
+        self._gzip: Optional[bytes] = None
+
+    @property
+    def gzip_body(self) -> bytes:
+        if self._gzip is None:
+            self._gzip = compression.gzip_bytes(self.body)
+        return self._gzip
+
+
+class LKPDDocCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedDoc]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> Optional[CachedDoc]:
+        """Dokumen untuk file ``path``; None bila file tidak ada atau JSON rusak.
+
+        Dict ``data`` dipakai bersama: pemanggil tidak boleh mengubahnya.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.invalidate(path)
+            return None
+
+        @metrics.STORAGE_IO.time(op="lkpd_read")
+        def _load():
+            with open(path, "rb") as f:
+                return serializer.loads(f.read())
+
+        return self.get_versioned(path, (st.st_mtime_ns, st.st_size), _load)
+
+    def get_versioned(self, key: str, stamp: Any, loader: Callable[[], Any]) -> Optional[CachedDoc]:
+        """Seperti ``get`` tetapi validator (``stamp``) dan pemuat diberikan pemanggil."""
+        with self._lock:
+            doc = self._entries.get(key)
+            if doc is not None and doc.stamp == stamp:
+                self._entries.move_to_end(key)
+                return doc
+        try:
+            data = loader()
+        except Exception:
+            return None
+        if not data:
+            return None
+        body = serializer.dumps(data).encode("utf-8")
+        doc = CachedDoc(data, body, stamp)
+        with self._lock:
+            self._entries[key] = doc
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return doc
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            self._entries.pop(path, None)
+
+
+lkpd_cache = LKPDDocCache()
@@ -0,0 +1,256 @@
+# api/lkpd_extract.py
+"""Ekstraksi JSON LKPD yang toleran terhadap output model yang "hampir valid".
+
+Urutan penanganan:
+  1. ambil isi blok ```json ... ``` bila ada, lalu coba tiap kurung buka
+     berurutan (teks pengantar seperti "Berikut [LKPD]: {...}" dilewati)
+  2. buang komentar ``//`` dan ``/* */`` di luar string serta koma sebelum
+     kurung tutup
+  3. tutup string/kurung yang terpotong (output terputus di tengah); bila
+     masih gagal, potong ke elemen lengkap terakhir
+  4. validasi per soal terhadap ``schemas.QuestionItem`` (+ cek isi: PG harus
+     punya opsi dan kunci yang ada di opsi) dan dokumen terhadap
+     ``schemas.LKPDModel``
+
+Soal yang tidak lolos dikembalikan terpisah supaya pemanggil bisa
+memperbaiki soal itu saja, bukan generate ulang satu LKPD.
+"""
+
+import re
+import json
+import itertools
+from typing import Any, Dict, List, Optional, Tuple
+
+from api.schemas import LKPDModel, QuestionItem
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*([\s\S]*?)```")
+_OPEN_RE = re.compile(r"[\[{]")
+MAX_STARTS = 20  # batas kurung buka yang dicoba (teks sampah tidak jadi O(n^2))
+OPTION_KEYS = ("A", "B", "C", "D")
+
+
+def _validate(model, data: Dict[str, Any]):
+    """Validasi pydantic v2 (model_validate) atau v1 (parse_obj)."""
+    if hasattr(model, "model_validate"):
+        return model.model_validate(data)
+    return model.parse_obj(data)
+
+
+def strip_fences(text: str) -> str:
+    for block in _FENCE_RE.findall(text or ""):
+        if "{" in block or "[" in block:
+            return block
+    return text or ""
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    j = len(out) - 1
+    while j >= 0 and out[j] in " \t\r\n":
+        j -= 1
+    if j >= 0 and out[j] == ",":
+        del out[j]
+
+
+def _close(out: List[str], stack: List[str]) -> str:
+    out = list(out)
+    for opener in reversed(stack):
+        _drop_trailing_comma(out)
+        j = len(out) - 1
+        while j >= 0 and out[j] in " \t\r\n":
+            j -= 1
+        if j >= 0 and out[j] == ":":
+            out.append("null")
+        out.append("}" if opener == "{" else "]")
+    return "".join(out)
+
+
+def sanitize(text: str, start: Optional[int] = None) -> Tuple[str, Optional[str]]:
+    """Bersihkan satu nilai JSON mulai dari ``start`` (default: kurung buka pertama).
+
+    Return (teks_utama, teks_cadangan). Cadangan (bisa None) adalah versi
+    yang dipotong ke elemen lengkap terakhir, dipakai bila teks utama masih
+    gagal di-parse karena output terpotong.
+    """
+    if start is None:
+        m = _OPEN_RE.search(text)
+        if m is None:
+            return "", None
+        start = m.start()
+    i, n = start, len(text)
+    out: List[str] = []
+    stack: List[str] = []
+    in_str = esc = False
+    safe: Optional[Tuple[int, List[str]]] = None
+    while i < n:
+        ch = text[i]
+        if in_str:
+            out.append(ch)
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+            i += 1
+            continue
+        if ch == '"':
+            in_str = True
+            out.append(ch)
+        elif text.startswith("//", i):
+            nl = text.find("\n", i)
+            i = n if nl < 0 else nl
+            continue
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                return "".join(out), None
+            safe = (len(out), list(stack))
+        else:
+            out.append(ch)
+        i += 1
+    # teks terpotong: tutup string & kurung yang masih terbuka
+    if in_str:
+        if esc:
+            out.pop()
+        out.append('"')
+    fallback = _close(out[:safe[0]], safe[1]) if safe else None
+    return _close(out, stack), fallback
+
+
+def extract_json(text: str) -> Any:
+    """Parse nilai JSON pertama dari output model. Raise ValueError bila tidak bisa.
+
+    Tiap kurung buka dicoba berurutan; hasil pertama yang berupa objek (atau
+    array objek) dipakai, sehingga teks seperti ``[LKPD]`` di kalimat pengantar
+    tidak mengalahkan JSON sebenarnya. Bila tidak ada, dipakai nilai pertama
+    yang berhasil di-parse.
+    """
+    body = strip_fences(text)
+    first: Any = None
+    found = False
+    last_error = None
+    for m in itertools.islice(_OPEN_RE.finditer(body), MAX_STARTS):
+        for candidate in sanitize(body, m.start()):
+            if not candidate:
+                continue
+            try:
+                data = json.loads(candidate, strict=False)
+            except json.JSONDecodeError as e:
+                last_error = e
+                continue
+            if isinstance(data, dict) or (isinstance(data, list) and data and isinstance(data[0], dict)):
+                return data
+            if not found:
+                first, found = data, True
+            break
+    if found:
+        return first
+    if last_error is None:
+        raise ValueError("Output model tidak berisi JSON.")
+    raise ValueError(f"JSON tidak valid: {last_error}")
+
+
+# -------------------------
+#  Validasi skema
+# -------------------------
+def _coerce_question(q: Dict[str, Any], index: int) -> Dict[str, Any]:
+    q = dict(q)
+    q["id"] = str(q.get("id") or index)
+    q["type"] = str(q.get("type") or ("PG" if q.get("options") else "IS")).strip().upper()
+    if isinstance(q.get("options"), list):
+        q["options"] = {k: str(v) for k, v in zip(OPTION_KEYS, q["options"])}
+    elif isinstance(q.get("options"), dict):
+        q["options"] = {str(k).strip().upper(): (None if v is None else str(v)) for k, v in q["options"].items()}
+    if q.get("answer") is not None:
+        q["answer"] = str(q["answer"]).strip()
+    if isinstance(q.get("accepted"), (str, int, float)):
+        q["accepted"] = [q["accepted"]]
+    if isinstance(q.get("accepted"), list):
+        q["accepted"] = [str(a).strip() for a in q["accepted"] if a is not None and str(a).strip()]
+    elif "accepted" in q:
+        q.pop("accepted")
+    if isinstance(q.get("score"), str):
+        try:
+            q["score"] = float(q["score"])
+        except ValueError:
+            q.pop("score")
+    return q
+
+
+def check_question(q: Any, index: int) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Return (soal_ternormalisasi, None) atau (None, alasan_tidak_valid)."""
+    if not isinstance(q, dict):
+        return None, "bukan objek JSON"
+    q = _coerce_question(q, index)
+    try:
+        _validate(QuestionItem, q)
+    except Exception as e:
+        return None, str(e).splitlines()[0]
+    if not str(q.get("question") or "").strip():
+        return None, "teks soal kosong"
+    if q["type"] == "PG":
+        options = {k: v for k, v in (q.get("options") or {}).items() if k in OPTION_KEYS and str(v or "").strip()}
+        if len(options) < 2:
+            return None, "soal PG butuh minimal 2 opsi"
+        if str(q.get("answer") or "").upper() not in options:
+            return None, "kunci jawaban tidak ada di opsi"
+        q["answer"] = q["answer"].upper()
+    elif not str(q.get("answer") or "").strip():
+        return None, "kunci jawaban kosong"
+    return q, None
+
+
+def parse_lkpd(raw: str, theme: str = "", level: str = "") -> Tuple[Dict[str, Any], List[Tuple[int, Any, str]]]:
+    """Parse & validasi output LKPD.
+
+    Return (lkpd_data, invalid) dengan ``invalid`` = [(posisi, soal_mentah, alasan)].
+    ``lkpd_data["questions"]`` hanya berisi soal yang valid, urutan asli.
+    """
+    data = extract_json(raw)
+    if isinstance(data, list):
+        data = {"questions": data}
+    if not isinstance(data, dict):
+        raise ValueError("JSON LKPD harus berupa objek.")
+
+    valid: List[Dict[str, Any]] = []
+    invalid: List[Tuple[int, Any, str]] = []
+    raw_questions = data.get("questions")
+    for pos, q in enumerate(raw_questions if isinstance(raw_questions, list) else [], start=1):
+        ok, reason = check_question(q, pos)
+        if ok is not None:
+            valid.append(ok)
+        else:
+            invalid.append((pos, q, reason))
+
+    data["questions"] = valid
+    data["title"] = str(data.get("title") or f"LKPD {theme}".strip())
+    data["theme"] = str(data.get("theme") or theme)
+    data["difficulty"] = str(data.get("difficulty") or level)
+    _validate(LKPDModel, data)
+    return data, invalid
+
+
+def merge_repaired(data: Dict[str, Any], invalid: List[Tuple[int, Any, str]],
+                   repaired: List[Optional[Dict[str, Any]]]) -> int:
+    """Sisipkan soal hasil perbaikan ke posisi aslinya. Return jumlah yang berhasil."""
+    slots: List[Tuple[int, Dict[str, Any]]] = []
+    valid_positions = [p for p in range(1, len(data["questions"]) + len(invalid) + 1)
+                       if p not in {pos for pos, _, _ in invalid}]
+    slots.extend(zip(valid_positions, data["questions"]))
+    fixed = 0
+    for (pos, _, _), q in zip(invalid, repaired):
+        if q is not None:
+            slots.append((pos, q))
+            fixed += 1
+    data["questions"] = [q for _, q in sorted(slots, key=lambda s: s[0])]
+    return fixed
@@ -0,0 +1,54 @@
+# api/lkpd_persist.py
+"""Penyimpanan LKPD hasil generate (dipakai /generate, /generate/stream, dan job massal).
+
+Semua fungsi di sini blocking (tulis storage, katalog, dan analitik); dari
+kode async panggil lewat ``run_in_threadpool`` / ``asyncio.to_thread``.
+"""
+
+import os
+from datetime import datetime
+from typing import Optional
+
+from api import metrics
+from api.analytics import analytics
+from api.catalog import catalog
+from api.db import get_backend
+
+
+def normalize_question(q: dict, index: int) -> dict:
+    """Seragamkan field soal (id, score, answer)."""
+    if "id" not in q:
+        q["id"] = str(index)
+    if "score" not in q:
+        q["score"] = q.get("bobot", 10)
+    if "answer" not in q:
+        q["answer"] = q.get("kunci", "") or ""
+    return q
+
+
+def persist_generated(theme: str, level: str, lkpd_data: dict, lkpd_id: Optional[str] = None) -> str:
+    """Lengkapi metadata, simpan LKPD hasil generate, daftarkan di katalog. Return id.
+
+    ``lkpd_id`` tetap (mis. diturunkan dari job + item) membuat simpan ulang
+    menimpa LKPD yang sama, bukan membuat duplikat.
+    """
+    # buat id singkat
+    lkpd_id = lkpd_id or os.urandom(4).hex()
+
+    # enrich metadata jika perlu
+    lkpd_data.setdefault("title", lkpd_data.get("title", f"LKPD: {theme}"))
+    lkpd_data["theme"] = theme
+    lkpd_data["difficulty"] = level
+    lkpd_data["generated_at"] = datetime.utcnow().isoformat()
+
+    # pastikan questions diseragamkan (id, score, answer)
+    qlist = lkpd_data.get("questions", [])
+    for i, q in enumerate(qlist, start=1):
+        normalize_question(q, i)
+
+    # simpan LKPD (atomic) + daftarkan di katalog
+    with metrics.span("persistence"):
+        get_backend().save_lkpd(lkpd_id, lkpd_data)
+        catalog.upsert(lkpd_id, lkpd_data)
+        analytics.init(lkpd_id, [str(q.get("id")) for q in qlist])
+    return lkpd_id
@@ -0,0 +1,90 @@
+# api/lkpd_stream.py
+"""Parser JSON inkremental untuk output LKPD yang di-stream dari model.
+
+``QuestionStreamParser`` diberi potongan teks satu per satu dan
+mengembalikan setiap objek di array ``"questions"`` begitu kurung tutupnya
+diterima, tanpa menunggu dokumen lengkap. Pemindaian berjalan sekali per
+karakter (string dan escape diperhitungkan), jadi total biayanya linear
+terhadap panjang output. Setiap soal dibersihkan dan divalidasi dengan
+aturan yang sama seperti dokumen lengkap (api/lkpd_extract.py); soal yang
+tidak valid tidak dikirim dan ditangani saat parse akhir.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from api import lkpd_extract
+
+
+class QuestionStreamParser:
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self._array_depth: Optional[int] = None  # kedalaman di dalam array "questions"
+        self._obj_start: Optional[int] = None
+        self._count = 0
+
+    @property
+    def text(self) -> str:
+        """Seluruh teks yang sudah diterima."""
+        return self._buf
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Tambah potongan teks; return soal yang baru lengkap (urut)."""
+        self._buf += chunk
+        out: List[Dict[str, Any]] = []
+        buf = self._buf
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_key = buf[self._string_start + 1:i]
+                continue
+            if ch == '"':
+                if self._stack:
+                    self._in_string = True
+                    self._string_start = i
+            elif ch in "{[":
+                if not self._stack and ch == "[":
+                    continue  # teks sebelum objek utama
+                if ch == "[" and len(self._stack) == 1 and self._last_key == "questions":
+                    self._array_depth = 2
+                elif ch == "{" and self._array_depth is not None and len(self._stack) == self._array_depth:
+                    self._obj_start = i
+                self._stack.append(ch)
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                depth = len(self._stack)
+                if ch == "}" and self._obj_start is not None and depth == self._array_depth:
+                    self._count += 1
+                    item = self._load(buf[self._obj_start:i + 1], self._count)
+                    self._obj_start = None
+                    if item is not None:
+                        out.append(item)
+                elif ch == "]" and self._array_depth is not None and depth == self._array_depth - 1:
+                    self._array_depth = None
+            elif ch == "," and len(self._stack) == 1:
+                self._last_key = None
+        self._pos = len(buf)
+        return out
+
+    @staticmethod
+    def _load(fragment: str, index: int) -> Optional[Dict[str, Any]]:
+        try:
+            item = lkpd_extract.extract_json(fragment)
+        except ValueError:
+            return None  # soal rusak: dibiarkan ke parse dokumen lengkap di akhir
+        item, _reason = lkpd_extract.check_question(item, index)
+        return item
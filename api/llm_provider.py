@@ -0,0 +1,217 @@
+"""
+api/llm_provider.py
+--------------------------------------
+Abstraksi penyedia LLM dengan inisialisasi malas (lazy).
+
+Provider dipilih lewat env LLM_PROVIDER:
+  - "gemini" (default): Google Gemini, model dari GEMINI_MODEL.
+    SDK baru di-import dan dikonfigurasi pada panggilan pertama, jadi
+    api.main bisa di-import/start tanpa API key.
+  - "fake": respon lokal deterministik (tanpa jaringan) untuk
+    pengembangan offline, test, dan benchmark. Latensi dan tingkat error
+    bisa disimulasikan lewat FAKE_LLM_LATENCY (detik), FAKE_LLM_JITTER
+    (detik) dan FAKE_LLM_ERROR_RATE (0..1).
+"""
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from typing import AsyncIterator, List, Optional
+
+
+class LLMProvider:
+    """Kontrak minimal: generate (sync), agenerate (async), astream (async), batch (async)."""
+
+    name = "base"
+    model_name = ""
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def agenerate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Potongan teks respon secara bertahap; default: satu potongan utuh."""
+        yield await self.agenerate(prompt)
+
+    async def batch(self, prompts: List[str]) -> List[str]:
+        return list(await asyncio.gather(*(self.agenerate(p) for p in prompts)))
+
+    def describe(self) -> dict:
+        return {"ok": True, "provider": self.name, "model": self.model_name}
+
+
+# ======================================================
+# 🌐 Google Gemini
+# ======================================================
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, model_name: Optional[str] = None):
+        self.model_name = model_name or os.getenv("GEMINI_MODEL", "gemini-1.5-pro")
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                from dotenv import load_dotenv
+                import google.generativeai as genai
+
+                load_dotenv()
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise ValueError("❌ GEMINI_API_KEY tidak ditemukan di file .env!")
+                try:
+                    genai.configure(api_key=api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+                except Exception as e:
+                    raise RuntimeError(f"❌ Gagal inisialisasi koneksi ke Gemini API: {e}")
+        return self._model
+
+    @staticmethod
+    def _text(response) -> str:
+        if response and response.text:
+            return response.text
+        raise ValueError("Respon kosong dari Gemini API.")
+
+    def generate(self, prompt: str) -> str:
+        return self._text(self._get_model().generate_content(prompt))
+
+    async def agenerate(self, prompt: str) -> str:
+        return self._text(await self._get_model().generate_content_async(prompt))
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self._get_model().generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
+
+
+# ======================================================
+# 🧪 Fake provider (offline, deterministik)
+# ======================================================
+class FakeProvider(LLMProvider):
+    """Menjawab sesuai jenis prompt; isi respon selalu sama untuk prompt yang sama."""
+
+    name = "fake"
+    model_name = "fake-lkpd"
+
+    def __init__(self, latency: Optional[float] = None, jitter: Optional[float] = None,
+                 error_rate: Optional[float] = None):
+        self.latency = float(os.getenv("FAKE_LLM_LATENCY", "0") if latency is None else latency)
+        self.jitter = float(os.getenv("FAKE_LLM_JITTER", "0") if jitter is None else jitter)
+        self.error_rate = float(os.getenv("FAKE_LLM_ERROR_RATE", "0") if error_rate is None else error_rate)
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def _maybe_fail(self) -> None:
+        if self.error_rate > 0 and random.random() < self.error_rate:
+            raise RuntimeError("Simulasi error dari fake provider.")
+
+    def _seed(self, prompt: str) -> int:
+        return int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+
+    def _lkpd(self, prompt: str) -> str:
+        theme = re.search(r'"theme":\s*"([^"]*)"', prompt)
+        level = re.search(r'"difficulty":\s*"([^"]*)"', prompt)
+        theme = theme.group(1) if theme else "Umum"
+        level = level.group(1) if level else "sedang"
+        seed = self._seed(prompt)
+        letters = "ABCD"
+        questions = []
+        for i in range(1, 6):
+            questions.append({
+                "id": str(i),
+                "type": "PG",
+                "question": f"Pertanyaan {i} tentang {theme} ({level})?",
+                "options": {k: f"Pilihan {k} untuk soal {i}" for k in letters},
+                "answer": letters[(seed >> i) % 4],
+                "score": 10,
+            })
+        return json.dumps({"title": f"LKPD {theme}", "theme": theme, "difficulty": level,
+                           "questions": questions}, ensure_ascii=False)
+
+    def _feedback_batch(self, prompt: str) -> str:
+        rows = re.findall(r"(\d+)\. Nama: (.*?) \| Nilai akhir: ([\d.]+)", prompt)
+        return json.dumps([{"no": int(no), "feedback": f"{name}, nilai {score}: pertahankan semangat belajarmu."}
+                           for no, name, score in rows], ensure_ascii=False)
+
+    def _repair(self, prompt: str) -> str:
+        pos = re.search(r"Perbaiki soal nomor (\d+)", prompt)
+        no = pos.group(1) if pos else "1"
+        return json.dumps({"id": no, "type": "PG", "question": f"Pertanyaan perbaikan {no}?",
+                           "options": {k: f"Pilihan {k}" for k in "ABCD"}, "answer": "A", "score": 10})
+
+    def _judge(self, prompt: str) -> str:
+        key = re.search(r"Kunci jawaban: (.*)", prompt)
+        answer = re.search(r"Jawaban siswa: (.*)", prompt)
+        key_words = set((key.group(1) if key else "").lower().split())
+        answer_words = set((answer.group(1) if answer else "").lower().split())
+        return json.dumps({"benar": bool(key_words & answer_words)})
+
+    def _respond(self, prompt: str) -> str:
+        if "Jawaban siswa:" in prompt:
+            return self._judge(prompt)
+        if "Daftar siswa" in prompt:
+            return self._feedback_batch(prompt)
+        if "Perbaiki soal nomor" in prompt:
+            return self._repair(prompt)
+        if '"questions"' in prompt:
+            return self._lkpd(prompt)
+        name = re.search(r"Nama siswa: (.*)", prompt)
+        who = name.group(1).strip() if name else "Siswa"
+        return f"{who}, kerja bagus! Ulangi materi yang masih keliru agar hasilmu makin baik."
+
+    def generate(self, prompt: str) -> str:
+        time.sleep(self._delay())
+        self._maybe_fail()
+        return self._respond(prompt)
+
+    async def agenerate(self, prompt: str) -> str:
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+        return self._respond(prompt)
+
+    async def astream(self, prompt: str, chunks: int = 16) -> AsyncIterator[str]:
+        """Respon dipecah jadi ``chunks`` potongan; latensi dibagi rata antar potongan."""
+        text = self._respond(prompt)
+        delay = self._delay() / chunks
+        size = max(1, -(-len(text) // chunks))
+        self._maybe_fail()
+        for i in range(0, len(text), size):
+            await asyncio.sleep(delay)
+            yield text[i:i + size]
+
+
+# ======================================================
+# 🔌 Pemilihan provider
+# ======================================================
+PROVIDERS = {"gemini": GeminiProvider, "fake": FakeProvider}
+_provider: Optional[LLMProvider] = None
+
+
+def get_provider() -> LLMProvider:
+    global _provider
+    if _provider is None:
+        name = os.getenv("LLM_PROVIDER", "gemini").lower()
+        if name not in PROVIDERS:
+            raise ValueError(f"LLM_PROVIDER tidak dikenal: {name}")
+        _provider = PROVIDERS[name]()
+    return _provider
+
+
+def set_provider(provider: LLMProvider) -> None:
+    """Ganti provider aktif (mis. untuk benchmark)."""
+    global _provider
+    _provider = provider
@@ -5,9 +5,15 @@ Mount static web/ (frontend), register router ai_controller.
 
 import os
 import logging
+from dotenv import load_dotenv
+
+# muat .env sebelum modul lain membaca konfigurasi dari environment
+load_dotenv()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 
 # setup logging sederhana
 LOGDIR = os.getenv("LOG_DIR", "logs")
@@ -21,6 +27,14 @@ logger = logging.getLogger("eduai")
 
 # import router
 from api.ai_controller import router as ai_router
+from api.feedback_queue import feedback_queue
+from api.jobs import generation_jobs
+from api.archive import archiver
+from api.catalog import catalog
+from api.db import get_backend
+from api import metrics
+from api import compression
+from api.static_assets import PrecompressedStaticFiles, prepare as prepare_web
 
 app = FastAPI(title="EduAI API", version="1.0")
 
@@ -33,6 +47,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# kompresi gzip respon API >= GZIP_MIN_SIZE byte; SSE, respon yang sudah
+# ber-Content-Encoding (aset .br/.gz, LKPD ter-cache) dan file zip/xlsx dilewati
+# (exclude_content_types butuh starlette>=1.5.0, lihat requirements.txt)
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=compression.GZIP_MIN_SIZE,
+    compresslevel=compression.GZIP_LEVEL,
+    exclude_content_types=compression.GZIP_EXCLUDED_TYPES,
+)
+
+# latensi per route + trace per request (TRACE_REQUESTS=1), lihat api/metrics.py
+app.add_middleware(metrics.MetricsMiddleware)
+
 # buat direktori data (selaras dengan ai_controller)
 LKPD_DIR = os.getenv("LKPD_DIR", "data/lkpd_outputs")
 ANSWERS_DIR = os.getenv("ANSWERS_DIR", "data/answers")
@@ -42,21 +69,48 @@ os.makedirs(ANSWERS_DIR, exist_ok=True)
 # include API router
 app.include_router(ai_router, prefix="/api", tags=["AI"])
 
-# Mount frontend static files (web/)
+# root health check (didaftarkan sebelum mount "/" agar tidak tertutup static files)
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok", "service": "EduAI API"}
+
+
+# metrik format Prometheus (per proses worker)
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# Mount frontend static files (web/): di-build ke WEB_BUILD_DIR (fingerprint +
+# varian .gz/.br, lihat api/static_assets.py); STATIC_BUILD=0 menyajikan web/ apa adanya
 WEB_DIR = os.getenv("WEB_DIR", "web")
 if os.path.isdir(WEB_DIR):
-    app.mount("/", StaticFiles(directory=WEB_DIR, html=True), name="web")
+    web_root = prepare_web(WEB_DIR) if os.getenv("STATIC_BUILD", "1") != "0" else WEB_DIR
+    app.mount("/", PrecompressedStaticFiles(directory=web_root, html=True), name="web")
 else:
     logger.warning(f"Direktori web not found: {WEB_DIR}. Static files tidak dimount.")
 
-# root health check
-@app.get("/healthz")
-def healthz():
-    return {"status": "ok", "service": "EduAI API"}
-
 # startup event logging
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     logger.info("EduAI API starting up...")
     # optional: log environment info (jangan log API keys)
     logger.info(f"LKPD_DIR={LKPD_DIR} | ANSWERS_DIR={ANSWERS_DIR} | WEB_DIR={WEB_DIR}")
+    storage = get_backend()
+    logger.info(f"Storage backend: {storage.name}")
+    added = catalog.ensure_built(storage)
+    if added:
+        logger.info(f"Katalog LKPD dibangun dari {added} file lama.")
+    feedback_queue.start()
+    # job generate massal yang terputus dilanjutkan di sini
+    generation_jobs.start()
+    # LKPD lama dipindah ke pack arsip secara berkala (backend file saja)
+    if storage.name == "file":
+        archiver.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await archiver.stop()
+    await generation_jobs.stop()
+    await feedback_queue.stop()
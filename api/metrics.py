@@ -0,0 +1,260 @@
+# api/metrics.py
+"""Metrik internal (format teks Prometheus) dan trace per request.
+
+Counter/Gauge/Histogram sederhana, thread-safe, tanpa dependency tambahan. Nilai
+disimpan per proses: dengan beberapa worker uvicorn, setiap worker punya
+angka sendiri (scrape per worker atau pakai 1 worker untuk profiling).
+
+Trace per request (TRACE_REQUESTS=1): middleware membuka trace, kode di
+jalur request menambah durasi ke fase (parse, llm, scoring, persistence)
+lewat ``span("fase")``, lalu middleware menulis ringkasan ke log.
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("eduai")
+
+TRACE_REQUESTS = os.getenv("TRACE_REQUESTS", "0").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {_fmt_num(v)}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {_fmt_num(v)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [count per bucket..., count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+                    break
+            row[-2] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for key, row in items:
+            cumulative = 0.0
+            for b, c in zip(self.buckets, row):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, ('le', _fmt_num(b)))} {_fmt_num(cumulative)}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, ('le', '+Inf'))} {_fmt_num(row[-2])}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {_fmt_num(row[-2])}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_num(row[-1])}")
+        return lines
+
+
+# -------------------------
+#  Metrik yang dipakai aplikasi
+# -------------------------
+HTTP_LATENCY = Histogram("eduai_http_request_duration_seconds",
+                         "Latensi request HTTP per route dan status.", ("method", "route", "status"))
+LLM_DURATION = Histogram("eduai_llm_call_duration_seconds",
+                         "Durasi satu percobaan panggilan LLM.", ("mode", "outcome"))
+LLM_RETRIES = Counter("eduai_llm_retries_total", "Jumlah percobaan ulang panggilan LLM.", ("mode",))
+LLM_FAILURES = Counter("eduai_llm_failures_total", "Percobaan LLM yang gagal per penyebab.", ("mode", "cause"))
+LLM_PROMPT_BYTES = Histogram("eduai_llm_prompt_bytes", "Ukuran prompt LLM (byte).", ("mode",), SIZE_BUCKETS)
+LLM_RESPONSE_BYTES = Histogram("eduai_llm_response_bytes", "Ukuran respon LLM (byte).", ("mode",), SIZE_BUCKETS)
+LKPD_REPAIRS = Counter("eduai_lkpd_repairs_total",
+                       "Soal LKPD tidak valid yang diperbaiki (fixed) atau dibuang (dropped).", ("outcome",))
+STORAGE_IO = Histogram("eduai_storage_io_duration_seconds",
+                       "Durasi operasi baca/tulis storage.", ("op",))
+GEN_REQUESTS = Counter("eduai_generate_requests_total",
+                       "Request generate LKPD per sumber hasil (hit, miss, shared).", ("source",))
+SHORT_ANSWER_VERDICTS = Counter("eduai_short_answer_verdicts_total",
+                                "Putusan jawaban isian singkat per sumber (local, llm).", ("source", "verdict"))
+LLM_QUEUE_DEPTH = Gauge("eduai_llm_queue_depth", "Panggilan LLM yang menunggu giliran per lane.", ("lane",))
+LLM_QUEUE_WAIT = Histogram("eduai_llm_queue_wait_seconds",
+                           "Waktu tunggu slot + kuota sebelum panggilan LLM.", ("lane",))
+LLM_INFLIGHT = Gauge("eduai_llm_inflight", "Panggilan LLM yang sedang berjalan (per proses).")
+LLM_CONCURRENCY_LIMIT = Gauge("eduai_llm_concurrency_limit", "Batas konkurensi LLM adaptif (AIMD) saat ini.")
+LLM_THROTTLED = Counter("eduai_llm_throttled_total",
+                        "Sinyal penurunan konkurensi (429 dari API atau latensi tinggi).", ("cause",))
+
+REGISTRY = [HTTP_LATENCY, LLM_DURATION, LLM_RETRIES, LLM_FAILURES,
+            LLM_PROMPT_BYTES, LLM_RESPONSE_BYTES, LKPD_REPAIRS, STORAGE_IO, GEN_REQUESTS,
+            SHORT_ANSWER_VERDICTS, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT, LLM_INFLIGHT, LLM_CONCURRENCY_LIMIT, LLM_THROTTLED]
+
+
+def render() -> str:
+    lines: List[str] = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------
+#  Trace per request
+# -------------------------
+_trace: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("eduai_trace", default=None)
+
+
+def start_trace() -> Optional[contextvars.Token]:
+    return _trace.set({}) if TRACE_REQUESTS else None
+
+
+def end_trace(token: Optional[contextvars.Token]) -> Optional[Dict[str, float]]:
+    if token is None:
+        return None
+    phases = _trace.get()
+    _trace.reset(token)
+    return phases
+
+
+@contextmanager
+def span(phase: str):
+    """Tambah durasi blok ke fase trace request aktif (no-op bila trace mati)."""
+    phases = _trace.get()
+    if phases is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[phase] = phases.get(phase, 0.0) + time.perf_counter() - t0
+
+
+# -------------------------
+#  Middleware ASGI
+# -------------------------
+def _route_label(scope) -> str:
+    """Template route (mis. /api/lkpd/{lkpd_id}) supaya label tidak meledak per id.
+
+    Request yang tidak cocok dengan route API (static web/, 404) dilabeli "other".
+    """
+    route = scope.get("route")
+    template = getattr(route, "path_format", None)
+    regex = getattr(route, "path_regex", None)
+    if not template or regex is None:
+        return "other"
+    # route dari include_router bisa menyimpan path tanpa prefix: cari prefixnya
+    path = scope.get("path", "")
+    for k, ch in enumerate(path):
+        if ch == "/" and regex.match(path[k:]):
+            return path[:k] + template
+    return template
+
+
+class MetricsMiddleware:
+    """Catat latensi setiap request HTTP (sampai body terakhir terkirim).
+
+    Middleware ASGI murni (bukan BaseHTTPMiddleware) agar respon streaming
+    seperti ekspor dan SSE tidak di-buffer.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        status = {"code": 500}
+        token = start_trace()
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            elapsed = time.perf_counter() - t0
+            route = _route_label(scope)
+            HTTP_LATENCY.observe(elapsed, method=scope.get("method", ""), route=route, status=status["code"])
+            phases = end_trace(token)
+            if phases is not None:
+                detail = " ".join(f"{k}={v * 1000:.1f}ms" for k, v in sorted(phases.items()))
+                logger.info(f"trace {scope.get('method')} {route} {status['code']} "
+                            f"total={elapsed * 1000:.1f}ms {detail}".rstrip())
@@ -0,0 +1,112 @@
+# api/migrate_answers.py
+"""Migrasi submission lama ke format ringkas.
+
+Format lama menyimpan list ``[{"id", "type", "question", "jawaban", "kunci",
+"bobot"}, ...]`` di setiap submission (salinan soal & kunci per siswa).
+Format ringkas hanya menyimpan ``{id_soal: jawaban}`` plus ``lkpd_hash``
+(versi kunci jawaban, lihat ``scoring.key_hash``).
+
+Pemakaian:
+    python -m api.migrate_answers              # semua LKPD
+    python -m api.migrate_answers abc123 ...   # LKPD tertentu
+    python -m api.migrate_answers --dry-run    # hitung saja, tanpa menulis
+
+Untuk backend file, log ditulis ulang (compaction) sehingga file lama
+``{lkpd_id}.json`` ikut dilebur dan dihapus. Aman dijalankan berulang kali:
+LKPD yang sudah ringkas dilewati.
+"""
+
+import os
+import sys
+import argparse
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+# muat .env sebelum modul lain membaca konfigurasi dari environment
+load_dotenv()
+
+from api import answer_store, scoring
+from api.db import get_backend
+
+
+def compact_record(record: Dict[str, Any], lkpd_hash: Optional[str]) -> bool:
+    """Ubah satu record ke format ringkas (in-place). Return True bila berubah."""
+    changed = False
+    answers = record.get("answers")
+    if not isinstance(answers, dict):
+        record["answers"] = scoring.answer_map(answers or [])
+        changed = True
+    if lkpd_hash and not record.get("lkpd_hash"):
+        record["lkpd_hash"] = lkpd_hash
+        changed = True
+    return changed
+
+
+def _file_size(lkpd_id: str) -> int:
+    total = 0
+    for path in (answer_store._log_path(lkpd_id), answer_store._legacy_path(lkpd_id)):
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+def _answer_ids_on_disk() -> List[str]:
+    if not os.path.isdir(answer_store.ANSWERS_DIR):
+        return []
+    ids = set()
+    for name in os.listdir(answer_store.ANSWERS_DIR):
+        base, ext = os.path.splitext(name)
+        if ext in (".json", ".jsonl") and not name.startswith("tmp"):
+            ids.add(base)
+    return sorted(ids)
+
+
+def migrate(lkpd_ids: Optional[List[str]] = None, dry_run: bool = False, out=sys.stdout) -> Dict[str, int]:
+    storage = get_backend()
+    if not lkpd_ids:
+        lkpd_ids = sorted(set(storage.list_lkpd_ids()) |
+                          set(_answer_ids_on_disk() if storage.name == "file" else []))
+
+    totals = {"lkpd": 0, "records": 0, "bytes_before": 0, "bytes_after": 0}
+    for lkpd_id in lkpd_ids:
+        lkpd_data = storage.load_lkpd(lkpd_id)
+        lkpd_hash = scoring.key_hash(lkpd_data) if lkpd_data else None
+        pending = sum(1 for r in storage.iter_answers(lkpd_id)
+                      if not isinstance(r.get("answers"), dict) or (lkpd_hash and not r.get("lkpd_hash")))
+        if not pending:
+            continue
+        before = _file_size(lkpd_id) if storage.name == "file" else 0
+        if not dry_run:
+            def _apply(records):
+                for r in records:
+                    compact_record(r, lkpd_hash)
+                return records
+
+            storage.transform_answers(lkpd_id, _apply)
+        after = _file_size(lkpd_id) if storage.name == "file" and not dry_run else before
+        totals["lkpd"] += 1
+        totals["records"] += pending
+        totals["bytes_before"] += before
+        totals["bytes_after"] += after
+        size_info = f" | {before} -> {after} byte" if storage.name == "file" and not dry_run else ""
+        print(f"{lkpd_id}: {pending} submission{size_info}", file=out)
+
+    verb = "perlu dimigrasi" if dry_run else "dimigrasi"
+    print(f"Selesai: {totals['records']} submission di {totals['lkpd']} LKPD {verb}.", file=out)
+    return totals
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Migrasi submission ke format ringkas {id_soal: jawaban}.")
+    p.add_argument("lkpd_ids", nargs="*", help="ID LKPD (default: semua)")
+    p.add_argument("--dry-run", action="store_true", help="hanya hitung, tidak menulis")
+    args = p.parse_args(argv)
+    migrate(args.lkpd_ids, dry_run=args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
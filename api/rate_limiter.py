@@ -0,0 +1,298 @@
+# api/rate_limiter.py
+"""Pembatas laju panggilan Gemini yang dipakai bersama semua worker uvicorn.
+
+Tiga lapis:
+  1. Kuota bersama (SQLite, RATE_LIMIT_DB): token bucket permintaan per menit
+     (GEMINI_RPM) dan token per menit (GEMINI_TPM, estimasi dari panjang
+     prompt + GEMINI_EST_OUTPUT_TOKENS). Setelah respon 429, semua worker
+     berhenti sejenak (GEMINI_COOLDOWN detik) lewat kolom ``cooldown_until``.
+  2. Konkurensi adaptif per proses (AIMD): batas naik +1/batas setiap sukses
+     sampai GEMINI_MAX_CONCURRENCY, dan turun setengah (minimal
+     GEMINI_MIN_CONCURRENCY) saat 429 atau latensi melewati
+     GEMINI_LATENCY_TARGET.
+  3. Lane prioritas: ``interactive`` (default, mis. /generate) selalu
+     dilayani sebelum ``bulk`` (job massal) lalu ``background`` (feedback).
+     Lane dipilih pemanggil lewat ``with lane("background"):`` (contextvar,
+     ikut terbawa ke task yang dibuat di dalamnya).
+
+Kedalaman antrian dan waktu tunggu per lane diekspos di /metrics. Bila
+SQLite gagal diakses, kuota bersama dilewati (fail-open) dan hanya batas
+konkurensi lokal yang berlaku.
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+import sqlite3
+import itertools
+import threading
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Optional, Tuple
+
+from api import metrics
+
+logger = logging.getLogger("eduai")
+
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "data/ratelimit.sqlite3")
+RPM = float(os.getenv("GEMINI_RPM", "60"))
+TPM = float(os.getenv("GEMINI_TPM", "120000"))
+EST_OUTPUT_TOKENS = int(os.getenv("GEMINI_EST_OUTPUT_TOKENS", "1500"))
+COOLDOWN = float(os.getenv("GEMINI_COOLDOWN", "5"))
+MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+MIN_CONCURRENCY = int(os.getenv("GEMINI_MIN_CONCURRENCY", "1"))
+LATENCY_TARGET = float(os.getenv("GEMINI_LATENCY_TARGET", "30"))
+
+# urutan = prioritas (kecil dilayani lebih dulu)
+LANES = {"interactive": 0, "bulk": 1, "background": 2}
+_MAX_SLEEP = 1.0  # cek ulang kuota paling lama tiap detik
+
+_lane: contextvars.ContextVar[str] = contextvars.ContextVar("eduai_llm_lane", default="interactive")
+
+
+@contextmanager
+def lane(name: str):
+    """Tandai panggilan LLM di dalam blok ini (dan task turunannya) dengan lane ``name``."""
+    if name not in LANES:
+        raise ValueError(f"Lane tidak dikenal: {name}")
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def estimate_tokens(prompt: str) -> int:
+    """Estimasi kasar token satu panggilan: ~4 karakter per token + jatah output."""
+    return len(prompt or "") // 4 + EST_OUTPUT_TOKENS
+
+
+def is_throttle(exc: BaseException) -> bool:
+    """True bila error berasal dari kuota/rate limit API (HTTP 429)."""
+    if type(exc).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    if getattr(exc, "code", None) == 429 or getattr(exc, "status_code", None) == 429:
+        return True
+    text = str(exc)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text or "quota" in text.lower()
+
+
+# -------------------------
+#  Kuota bersama (SQLite)
+# -------------------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rate_state (key TEXT PRIMARY KEY, value REAL NOT NULL);
+"""
+
+
+class SharedQuota:
+    """Token bucket RPM + TPM yang state-nya ada di SQLite (dibagi antar proses)."""
+
+    def __init__(self, db_path: str = RATE_LIMIT_DB, rpm: float = RPM, tpm: float = TPM):
+        self.db_path = db_path
+        self.limits = {"rpm": rpm, "tpm": tpm}
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def try_acquire(self, cost: int) -> float:
+        """Ambil 1 request + ``cost`` token. Return 0 bila berhasil, atau detik yang perlu ditunggu."""
+        active = {k: v for k, v in self.limits.items() if v > 0}
+        if not active:
+            return 0.0
+        need = {"rpm": 1.0, "tpm": float(min(cost, self.limits["tpm"]))}  # prompt raksasa tetap bisa lewat
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT value FROM rate_state WHERE key = 'cooldown_until'").fetchone()
+                if row and row[0] > now:
+                    conn.execute("COMMIT")
+                    return row[0] - now
+                levels, wait = {}, 0.0
+                for name, per_min in active.items():
+                    r = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE name = ?", (name,)).fetchone()
+                    tokens, updated = r if r else (per_min, now)
+                    level = min(per_min, tokens + max(0.0, now - updated) * per_min / 60.0)
+                    levels[name] = level
+                    if level < need[name]:
+                        wait = max(wait, (need[name] - level) * 60.0 / per_min)
+                if wait <= 0:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO rate_buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                        [(name, level - need[name], now) for name, level in levels.items()])
+                conn.execute("COMMIT")
+                return wait
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Rate limiter SQLite gagal, kuota bersama dilewati: {e}")
+            return 0.0
+
+    def cooldown(self, seconds: float) -> None:
+        """Semua worker menahan panggilan baru selama ``seconds`` (setelah 429)."""
+        until = time.time() + seconds
+        try:
+            self._conn().execute(
+                """INSERT INTO rate_state (key, value) VALUES ('cooldown_until', ?)
+                   ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)""", (until,))
+        except sqlite3.Error as e:
+            logger.warning(f"Rate limiter SQLite gagal menyimpan cooldown: {e}")
+
+
+# -------------------------
+#  Konkurensi adaptif + lane prioritas (per proses)
+# -------------------------
+class RateLimiter:
+    def __init__(self, quota: Optional[SharedQuota] = None, max_concurrency: int = MAX_CONCURRENCY,
+                 min_concurrency: int = MIN_CONCURRENCY, latency_target: float = LATENCY_TARGET,
+                 cooldown: float = COOLDOWN):
+        self.quota = quota or SharedQuota()
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.latency_target = latency_target
+        self.cooldown_seconds = cooldown
+        self._limit = float(self.max_concurrency)
+        self._inflight = 0
+        self._last_decrease = 0.0
+        self._seq = itertools.count()
+        # (prioritas lane, urutan datang) -> antrian FIFO di dalam lane
+        self._waiters: List[Tuple[int, int]] = []
+        self._cond: Optional[asyncio.Condition] = None
+        metrics.LLM_CONCURRENCY_LIMIT.set(self._limit)
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_concurrency, int(self._limit))
+
+    def _get_cond(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    # ---------- AIMD ----------
+    def _increase(self) -> None:
+        self._limit = min(float(self.max_concurrency), self._limit + 1.0 / max(self._limit, 1.0))
+        metrics.LLM_CONCURRENCY_LIMIT.set(self.limit)
+
+    def _decrease(self, cause: str) -> None:
+        metrics.LLM_THROTTLED.inc(cause=cause)
+        now = time.monotonic()
+        if now - self._last_decrease < 1.0:
+            return  # satu lonjakan error cukup menurunkan sekali
+        self._last_decrease = now
+        self._limit = max(float(self.min_concurrency), self._limit / 2)
+        metrics.LLM_CONCURRENCY_LIMIT.set(self.limit)
+
+    def record(self, elapsed: float, exc: Optional[BaseException] = None) -> None:
+        """Sinyal hasil satu panggilan untuk AIMD (dan cooldown bersama bila 429)."""
+        if exc is not None:
+            if is_throttle(exc):
+                self.quota.cooldown(self.cooldown_seconds)
+                self._decrease("rate_limited")
+        elif self.latency_target > 0 and elapsed > self.latency_target:
+            self._decrease("latency")
+        else:
+            self._increase()
+
+    # ---------- slot ----------
+    async def _enter(self, lane_name: str, cost: int) -> None:
+        cond = self._get_cond()
+        entry = (LANES[lane_name], next(self._seq))
+        t0 = time.perf_counter()
+        metrics.LLM_QUEUE_DEPTH.inc(lane=lane_name)
+        try:
+            async with cond:
+                heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    async with cond:
+                        await cond.wait_for(lambda: self._waiters[0] == entry and self._inflight < self.limit)
+                        self._inflight += 1  # slot dipesan selama cek kuota
+                    # BEGIN IMMEDIATE bisa menunggu worker lain: jalankan di thread tanpa memegang cond.
+                    # Entry tetap di kepala antrian, jadi tidak ada yang menyalip selama menunggu.
+                    wait = 1.0
+                    try:
+                        wait = await asyncio.to_thread(self.quota.try_acquire, cost)
+                    finally:
+                        if wait > 0:
+                            self._inflight -= 1
+                    if wait <= 0:
+                        break
+                    async with cond:
+                        try:  # tunggu kuota; bangun lebih cepat bila ada perubahan (lane lebih tinggi masuk)
+                            await asyncio.wait_for(cond.wait(), min(wait, _MAX_SLEEP))
+                        except asyncio.TimeoutError:
+                            pass
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                await asyncio.shield(self._notify())
+        finally:
+            metrics.LLM_QUEUE_DEPTH.dec(lane=lane_name)
+            metrics.LLM_QUEUE_WAIT.observe(time.perf_counter() - t0, lane=lane_name)
+        metrics.LLM_INFLIGHT.set(self._inflight)
+
+    async def _notify(self) -> None:
+        cond = self._get_cond()
+        async with cond:
+            cond.notify_all()
+
+    async def _leave(self) -> None:
+        cond = self._get_cond()
+        async with cond:
+            self._inflight -= 1
+            cond.notify_all()
+        metrics.LLM_INFLIGHT.set(self._inflight)
+
+    @asynccontextmanager
+    async def slot(self, prompt: str):
+        """Tunggu giliran (lane, konkurensi, kuota) lalu jalankan satu panggilan LLM."""
+        await self._enter(_lane.get(), estimate_tokens(prompt))
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(time.perf_counter() - t0, e)
+            raise
+        else:
+            self.record(time.perf_counter() - t0)
+        finally:
+            await self._leave()
+
+    def wait_sync(self, prompt: str) -> None:
+        """Jalur sinkron (safe_generate): hanya kuota bersama, tanpa lane/konkurensi."""
+        cost = estimate_tokens(prompt)
+        while True:
+            wait = self.quota.try_acquire(cost)
+            if wait <= 0:
+                return
+            time.sleep(min(wait, _MAX_SLEEP))
+
+    def snapshot(self) -> dict:
+        depth = {name: 0 for name in LANES}
+        names = {v: k for k, v in LANES.items()}
+        for prio, _ in self._waiters:
+            depth[names[prio]] += 1
+        return {"limit": self.limit, "inflight": self._inflight, "queued": depth}
+
+
+rate_limiter = RateLimiter()
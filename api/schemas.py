@@ -25,6 +25,7 @@ class QuestionItem(BaseModel):
     question: str
     options: Optional[QuestionOption] = None
     answer: Optional[str] = None
+    accepted: Optional[List[str]] = None   # IS: variasi jawaban lain yang juga benar
     score: Optional[float] = 10.0
 
 
@@ -0,0 +1,196 @@
+# api/scoring.py
+"""Mesin penilaian berbasis kunci jawaban yang sudah dikompilasi.
+
+``CompiledKey`` dibangun sekali per LKPD (lalu di-cache): peta id soal ->
+indeks, kunci yang sudah dinormalisasi, dan array bobot NumPy. Menilai satu
+submission cukup satu lintasan atas jawaban siswa, dan ``score_many`` menilai
+ulang satu kelas sekaligus dengan operasi array (dipakai setelah guru
+memperbaiki kunci jawaban).
+
+Jawaban siswa diterima dalam dua bentuk: format ringkas ``{id_soal: jawaban}``
+(disimpan sejak format submission ringkas) atau format lama berupa list
+``[{"id": ..., "jawaban": ...}, ...]``.
+
+Soal isian singkat (IS) dinilai dengan matcher lokal (api/short_answer.py);
+hasil per jawaban berbeda di-memo per kunci, jadi satu kelas dengan jawaban
+yang sama hanya dicocokkan sekali. Jawaban ambigu dianggap salah sampai ada
+putusan LLM di cache putusan (lihat ``pending_judgments``).
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from api import metrics
+from api import short_answer
+
+CACHE_SIZE = int(os.getenv("SCORING_CACHE_SIZE", "256"))
+
+
+Answers = Union[Dict[str, Any], Iterable[dict]]
+
+
+def normalize(value: Any) -> str:
+    return str(value or "").strip().upper()
+
+
+def answer_map(answers: Answers) -> Dict[str, str]:
+    """Jawaban siswa dalam format ringkas {id_soal: jawaban} (dari format apa pun)."""
+    if isinstance(answers, dict):
+        return {str(k): "" if v is None else str(v) for k, v in answers.items()}
+    out: Dict[str, str] = {}
+    for a in answers or []:
+        if isinstance(a, dict) and a.get("id") is not None:
+            v = a.get("jawaban")
+            out[str(a.get("id"))] = "" if v is None else str(v)
+    return out
+
+
+def key_hash(lkpd_data: dict) -> str:
+    """Sidik jari kunci jawaban (id, kunci, bobot) untuk mereferensikan versi LKPD."""
+    h = hashlib.sha256()
+    for q in lkpd_data.get("questions", []) or []:
+        h.update(f"{q.get('id')}\x1f{normalize(q.get('answer'))}\x1f{q.get('score', 10)}".encode("utf-8"))
+        if q.get("accepted"):
+            h.update(("\x1f" + "\x1f".join(normalize(a) for a in q["accepted"])).encode("utf-8"))
+        h.update(b"\x1e")
+    return h.hexdigest()[:12]
+
+
+def compute_status(score: float) -> str:
+    """Kategori capaian dari nilai persen (dipakai rekap & analitik)."""
+    if score >= 85:
+        return "Tinggi"
+    if score >= 60:
+        return "Cukup"
+    return "Perlu Bimbingan"
+
+
+class CompiledKey:
+    def __init__(self, lkpd_data: dict, lkpd_id: Optional[str] = None):
+        questions = lkpd_data.get("questions", []) or []
+        self.lkpd_id = lkpd_id
+        self.question_ids: List[str] = [str(q.get("id")) for q in questions]
+        self.index: Dict[str, int] = {qid: i for i, qid in enumerate(self.question_ids)}
+        self.keys = np.array([normalize(q.get("answer")) for q in questions], dtype=object)
+        self.weights = np.array([float(q.get("score", 10)) for q in questions], dtype=float)
+        self.max_score = float(self.weights.sum())
+        self.key_hash = key_hash(lkpd_data)
+        # kolom soal IS -> matcher lokal; memo (kolom, jawaban) -> (putusan, jawaban ternormalisasi)
+        self.short_keys: Dict[int, short_answer.ShortAnswerKey] = {
+            i: short_answer.ShortAnswerKey(q.get("answer"), q.get("accepted"))
+            for i, q in enumerate(questions) if str(q.get("type") or "").upper() == "IS"
+        }
+        self._matches: Dict[Tuple[int, str], Tuple[str, str]] = {}
+
+    def _match(self, col: int, value: str) -> Tuple[str, str]:
+        hit = self._matches.get((col, value))
+        if hit is None:
+            hit = self._matches[(col, value)] = self.short_keys[col].match(value)
+            if hit[0] != short_answer.AMBIGUOUS:
+                metrics.SHORT_ANSWER_VERDICTS.inc(source="local", verdict=hit[0])
+        return hit
+
+    def _short_correct(self, col: int, value: str, judged: Dict[Tuple[int, str], bool]) -> bool:
+        verdict, norm = self._match(col, value)
+        if verdict != short_answer.AMBIGUOUS:
+            return verdict == short_answer.CORRECT
+        if self.lkpd_id is None:
+            return False
+        if (col, norm) not in judged:
+            judged[(col, norm)] = bool(short_answer.judgments.get(self.lkpd_id, self.question_ids[col], norm))
+        return judged[(col, norm)]
+
+    def pending_judgments(self, answers: Answers) -> List[Tuple[str, str, str]]:
+        """Jawaban IS ambigu yang belum punya putusan: [(id_soal, jawaban_ternormalisasi, jawaban_asli)]."""
+        out = []
+        if not self.short_keys or self.lkpd_id is None:
+            return out
+        for qid, value in answer_map(answers).items():
+            col = self.index.get(qid)
+            if col is None or col not in self.short_keys:
+                continue
+            verdict, norm = self._match(col, normalize(value))
+            if verdict == short_answer.AMBIGUOUS and short_answer.judgments.get(self.lkpd_id, qid, norm) is None:
+                out.append((qid, norm, value))
+        return out
+
+    def answer_row(self, answers: Answers) -> List[str]:
+        """Jawaban siswa yang sudah dinormalisasi, urut sesuai soal."""
+        row = [""] * len(self.question_ids)
+        for qid, value in answer_map(answers).items():
+            i = self.index.get(qid)
+            if i is not None:
+                row[i] = normalize(value)
+        return row
+
+    def correct_matrix(self, rows: List[List[str]]) -> np.ndarray:
+        """Matriks bool (siswa x soal): PG sama dengan kunci; IS lewat matcher lokal/putusan LLM."""
+        if not rows or not self.question_ids:
+            return np.zeros((len(rows), len(self.question_ids)), dtype=bool)
+        matrix = np.array(rows, dtype=object)
+        correct = (matrix == self.keys) & (matrix != "")
+        judged: Dict[Tuple[int, str], bool] = {}
+        for col in self.short_keys:
+            for r, row in enumerate(rows):
+                correct[r, col] = self._short_correct(col, row[col], judged)
+        return correct
+
+    def _to_percent(self, totals: np.ndarray) -> np.ndarray:
+        if self.max_score <= 0:
+            return np.zeros_like(totals)
+        return np.round(totals / self.max_score * 100, 2)
+
+    def evaluate(self, answers: Answers) -> Tuple[float, List[bool]]:
+        """Return (nilai_akhir_persen, benar/salah per soal) untuk satu submission."""
+        correct = self.correct_matrix([self.answer_row(answers)])[0]
+        total = float(correct.astype(float) @ self.weights) if len(correct) else 0.0
+        return float(self._to_percent(np.array([total]))[0]), correct.tolist()
+
+    def score(self, answers: Answers) -> Tuple[float, float]:
+        """Return (nilai_akhir_persen, max_score) untuk satu submission."""
+        return float(self.score_many([answers])[0]), self.max_score
+
+    def evaluate_many(self, answer_lists: List[Answers]) -> Tuple[np.ndarray, np.ndarray]:
+        """(nilai persen per submission, matriks benar siswa x soal) dalam satu lintasan array."""
+        rows = [self.answer_row(a) for a in answer_lists]
+        correct = self.correct_matrix(rows)
+        totals = correct.astype(float) @ self.weights if rows else np.zeros(0)
+        return self._to_percent(totals), correct
+
+    def score_many(self, answer_lists: List[Answers]) -> np.ndarray:
+        """Nilai (persen) untuk banyak submission dalam satu lintasan array."""
+        return self.evaluate_many(answer_lists)[0]
+
+
+# -------------------------
+#  Cache per LKPD
+# -------------------------
+_cache: "OrderedDict[Tuple[str, int], CompiledKey]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def compile_key(lkpd_id: str, lkpd_data: dict) -> CompiledKey:
+    """CompiledKey ter-cache; ``key_version`` pada LKPD naik setiap kunci diedit."""
+    cache_key = (lkpd_id, int(lkpd_data.get("key_version", 0)))
+    with _cache_lock:
+        ck = _cache.get(cache_key)
+        if ck is not None:
+            _cache.move_to_end(cache_key)
+            return ck
+    ck = CompiledKey(lkpd_data, lkpd_id)
+    with _cache_lock:
+        _cache[cache_key] = ck
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return ck
+
+
+def invalidate(lkpd_id: str) -> None:
+    with _cache_lock:
+        for k in [k for k in _cache if k[0] == lkpd_id]:
+            del _cache[k]
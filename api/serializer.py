@@ -0,0 +1,33 @@
+# api/serializer.py
+"""Serializer JSON ringkas untuk data yang sering ditulis/dibaca (jawaban siswa).
+
+Memakai ``orjson`` bila terpasang (beberapa kali lebih cepat dari modul
+json bawaan); bila tidak, jatuh ke ``json`` dengan separator tanpa spasi.
+Output keduanya sama-sama JSON satu baris UTF-8, jadi file yang ditulis
+dengan salah satunya bisa dibaca oleh yang lain. Error parse dari orjson
+adalah subclass ``json.JSONDecodeError``, jadi penanganan error tidak berubah.
+"""
+
+import json
+from typing import Any
+
+try:  # opsional: pip install orjson
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def dumps(obj: Any) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except TypeError:
+            pass  # mis. key dict bukan string -> pakai json bawaan
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
@@ -0,0 +1,316 @@
+# api/short_answer.py
+"""Penilaian lokal soal isian singkat (IS).
+
+Jawaban dan kunci dinormalisasi (huruf kecil, diakritik & tanda baca dibuang,
+spasi dirapikan) lalu dibandingkan dengan kunci plus variasi di
+``QuestionItem.accepted``:
+  - sama persis setelah normalisasi (atau angka yang nilainya sama) -> benar
+  - skor kemiripan >= IS_ACCEPT_THRESHOLD -> benar, <= IS_REJECT_THRESHOLD -> salah
+  - di antaranya -> ambigu, diputuskan LLM di background
+
+Skor kemiripan = maksimum dari F1 token (token dianggap sama bila rasio
+edit-nya >= 0.8, kata umum diabaikan) dan rasio edit distance (Levenshtein
+berpita) teks utuh, yang menangkap beda spasi seperti "foto sintesis".
+Jawaban yang memuat semua token kunci plus kata lain selalu dianggap ambigu.
+
+Putusan LLM disimpan di SQLite (JUDGMENT_DB) dengan kunci
+(lkpd_id, id soal, jawaban ternormalisasi), jadi jawaban yang sama dari satu
+kelas hanya memicu satu panggilan model, juga lintas worker uvicorn. Setelah
+putusan "benar" masuk, pemanggil menilai ulang submission LKPD tersebut.
+"""
+
+import os
+import re
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from api import gemini_config
+from api import metrics
+from api.rate_limiter import lane
+
+logger = logging.getLogger("eduai")
+
+ACCEPT_THRESHOLD = float(os.getenv("IS_ACCEPT_THRESHOLD", "0.85"))
+REJECT_THRESHOLD = float(os.getenv("IS_REJECT_THRESHOLD", "0.5"))
+JUDGMENT_DB = os.getenv("JUDGMENT_DB", os.getenv("CATALOG_DB", "data/catalog.sqlite3"))
+# klaim putusan yang tidak selesai (mis. worker mati) boleh diambil alih setelah ini (detik)
+CLAIM_TIMEOUT = float(os.getenv("IS_JUDGE_CLAIM_TIMEOUT", "300"))
+
+CORRECT, WRONG, AMBIGUOUS = "correct", "wrong", "ambiguous"
+
+STOPWORDS = frozenset("yang dan di ke dari adalah ialah merupakan itu ini para si sang "
+                      "the a an of".split())
+_PUNCT_RE = re.compile(r"[^\w\s.,-]+|(?<!\d)[.,]|[.,](?!\d)|-")
+_MAX_EDIT_LEN = 200  # teks lebih panjang hanya dibandingkan per token
+
+
+def normalize_text(value: Any) -> str:
+    text = unicodedata.normalize("NFKD", str(value or ""))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return " ".join(_PUNCT_RE.sub(" ", text).split())
+
+
+def _number(text: str) -> Optional[float]:
+    try:
+        return float(text.replace(",", "."))
+    except ValueError:
+        return None
+
+
+def edit_ratio(a: str, b: str, cutoff: float = 0.0) -> float:
+    """1 - jarak Levenshtein / panjang terpanjang (1.0 = sama).
+
+    Hasil di bawah ``cutoff`` dikembalikan sebagai 0.0 tanpa menghitung
+    penuh (batas selisih panjang + berhenti saat seluruh baris melewati batas).
+    """
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    if len(a) < len(b):
+        a, b = b, a
+    max_dist = int((1.0 - cutoff) * len(a) + 1e-9)
+    if len(a) - len(b) > max_dist:
+        return 0.0
+    # DP Levenshtein hanya di pita |i - j| <= max_dist
+    far = max_dist + 1
+    prev = [j if j <= max_dist else far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        lo, hi = max(1, i - max_dist), min(len(b), i + max_dist)
+        cur = [far] * (len(b) + 1)
+        cur[0] = i if i <= max_dist else far
+        ca = a[i - 1]
+        for j in range(lo, hi + 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != b[j - 1]))
+        if min(cur[lo - 1:hi + 1]) > max_dist:
+            return 0.0
+        prev = cur
+    ratio = 1.0 - min(prev[-1], far) / len(a)
+    return ratio if ratio >= cutoff else 0.0
+
+
+def _content_tokens(text: str) -> List[str]:
+    tokens = text.split()
+    return [t for t in tokens if t not in STOPWORDS] or tokens
+
+
+def _token_hits(answer: List[str], key: List[str]) -> int:
+    """Jumlah token kunci yang ada di jawaban (toleran salah ketik)."""
+    unmatched = list(key)
+    hits = 0
+    for t in answer:
+        for k in unmatched:
+            if t == k or (t[0] == k[0] and edit_ratio(t, k, 0.8)):
+                unmatched.remove(k)
+                hits += 1
+                break
+    return hits
+
+
+def similarity(answer: str, key: str) -> Tuple[float, bool]:
+    """Kemiripan dua teks ternormalisasi (0..1) dan apakah semua token kunci ada di jawaban."""
+    if answer == key:
+        return 1.0, True
+    a_tokens, k_tokens = _content_tokens(answer), _content_tokens(key)
+    hits = _token_hits(a_tokens, k_tokens) if a_tokens and k_tokens else 0
+    score = 2 * hits / (len(a_tokens) + len(k_tokens)) if hits else 0.0  # F1 token
+    a_text, k_text = " ".join(a_tokens), " ".join(k_tokens)
+    if len(a_text) <= _MAX_EDIT_LEN and len(k_text) <= _MAX_EDIT_LEN:
+        # teks utuh hanya perlu dicek bila cukup dekat untuk langsung benar (mis. beda spasi)
+        score = max(score, edit_ratio(a_text, k_text, ACCEPT_THRESHOLD))
+    return score, bool(k_tokens) and hits == len(k_tokens)
+
+
+class ShortAnswerKey:
+    """Kunci satu soal IS: kunci utama + variasi yang diterima, sudah dinormalisasi."""
+
+    def __init__(self, answer: Any, accepted: Optional[Iterable[Any]] = None):
+        variants = [answer] + list(accepted or [])
+        self.variants: List[str] = []
+        for v in variants:
+            n = normalize_text(v)
+            if n and n not in self.variants:
+                self.variants.append(n)
+        self._exact: Set[str] = set(self.variants)
+        self._numbers = {x for x in (_number(v) for v in self.variants) if x is not None}
+
+    def match(self, value: Any) -> Tuple[str, str]:
+        """Return (CORRECT | WRONG | AMBIGUOUS, jawaban_ternormalisasi)."""
+        norm = normalize_text(value)
+        if not norm or not self.variants:
+            return WRONG, norm
+        if norm in self._exact:
+            return CORRECT, norm
+        num = _number(norm)
+        if num is not None and self._numbers:
+            return (CORRECT if num in self._numbers else WRONG), norm
+        best, covers = 0.0, False
+        for v in self.variants:
+            score, all_tokens = similarity(norm, v)
+            best, covers = max(best, score), covers or all_tokens
+        if best >= ACCEPT_THRESHOLD:
+            return CORRECT, norm
+        if best <= REJECT_THRESHOLD and not covers:
+            return WRONG, norm
+        # kunci ada di jawaban tapi ditambah kata lain (bisa benar, bisa mengubah makna) -> LLM
+        return AMBIGUOUS, norm
+
+
+# -------------------------
+#  Cache putusan LLM (SQLite)
+# -------------------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS short_answer_judgments (
+    lkpd_id TEXT NOT NULL,
+    question_id TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    verdict INTEGER,              -- NULL = sedang dinilai
+    claimed_at REAL NOT NULL,
+    judged_at REAL,
+    PRIMARY KEY (lkpd_id, question_id, answer)
+);
+"""
+
+
+class JudgmentStore:
+    def __init__(self, db_path: str = JUDGMENT_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, lkpd_id: str, question_id: str, answer: str) -> Optional[bool]:
+        """Putusan tersimpan, atau None bila belum ada / masih dinilai."""
+        row = self._conn().execute(
+            "SELECT verdict FROM short_answer_judgments WHERE lkpd_id = ? AND question_id = ? AND answer = ?",
+            (lkpd_id, question_id, answer)).fetchone()
+        return None if row is None or row[0] is None else bool(row[0])
+
+    def claim(self, lkpd_id: str, question_id: str, answer: str) -> bool:
+        """Tandai jawaban sedang dinilai. False bila sudah diputus atau sedang dinilai pihak lain."""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO short_answer_judgments (lkpd_id, question_id, answer, claimed_at) "
+                "VALUES (?, ?, ?, ?)", (lkpd_id, question_id, answer, now))
+            if cur.rowcount:
+                return True
+            cur = conn.execute(
+                "UPDATE short_answer_judgments SET claimed_at = ? WHERE lkpd_id = ? AND question_id = ? "
+                "AND answer = ? AND verdict IS NULL AND claimed_at < ?",
+                (now, lkpd_id, question_id, answer, now - CLAIM_TIMEOUT))
+            return cur.rowcount > 0
+
+    def put(self, lkpd_id: str, question_id: str, answer: str, verdict: bool) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO short_answer_judgments (lkpd_id, question_id, answer, verdict, claimed_at, judged_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(lkpd_id, question_id, answer) "
+                "DO UPDATE SET verdict = excluded.verdict, judged_at = excluded.judged_at",
+                (lkpd_id, question_id, answer, int(verdict), time.time(), time.time()))
+
+    def release(self, lkpd_id: str, question_id: str, answer: str) -> None:
+        """Lepas klaim yang gagal dinilai supaya submission berikutnya mencoba lagi."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM short_answer_judgments WHERE lkpd_id = ? AND question_id = ? "
+                         "AND answer = ? AND verdict IS NULL", (lkpd_id, question_id, answer))
+
+    def clear(self, lkpd_id: str) -> None:
+        """Hapus semua putusan LKPD (kunci jawaban diedit)."""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM short_answer_judgments WHERE lkpd_id = ?", (lkpd_id,))
+
+
+judgments = JudgmentStore()
+
+
+# -------------------------
+#  Eskalasi ke LLM
+# -------------------------
+_tasks: Set[asyncio.Task] = set()
+# lkpd_id -> [putusan yang masih berjalan, ada putusan "benar" baru]
+_running: Dict[str, List[Any]] = {}
+
+
+def escalate(lkpd_id: str, lkpd_data: dict, items: List[Tuple[str, str, str]],
+             on_correct: Callable[[str], None]) -> None:
+    """Kirim jawaban ambigu ``[(id_soal, jawaban_ternormalisasi, jawaban_asli)]`` ke LLM.
+
+    Hanya jawaban yang berhasil diklaim (belum pernah dinilai) yang dikirim;
+    klaim (tulis SQLite) dilakukan di thread oleh task background, jadi
+    pemanggil di event loop tidak menunggu apa pun.
+    ``on_correct(lkpd_id)`` dipanggil sekali setelah putusan yang sedang
+    berjalan untuk LKPD itu selesai dan minimal satu jawaban dinyatakan benar;
+    callback dijalankan di thread (boleh blocking, mis. menilai ulang kelas).
+    """
+    questions = {str(q.get("id")): q for q in lkpd_data.get("questions", []) or []}
+    items = [(questions[qid], norm, raw) for qid, norm, raw in items if qid in questions]
+    if items:
+        _spawn(_escalate(lkpd_id, items, on_correct))
+
+
+def _spawn(coro) -> None:
+    task = asyncio.ensure_future(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def _claim_all(lkpd_id: str, items: List[Tuple[dict, str, str]]) -> List[Tuple[dict, str, str]]:
+    return [it for it in items if judgments.claim(lkpd_id, str(it[0].get("id")), it[1])]
+
+
+async def _escalate(lkpd_id: str, items: List[Tuple[dict, str, str]], on_correct: Callable[[str], None]) -> None:
+    try:
+        claimed = await asyncio.to_thread(_claim_all, lkpd_id, items)
+    except Exception as e:
+        logger.warning(f"Klaim penilaian IS gagal ({lkpd_id}): {e}")
+        return
+    for q, norm, raw in claimed:
+        state = _running.setdefault(lkpd_id, [0, False])
+        state[0] += 1
+        _spawn(_judge(lkpd_id, q, norm, raw, on_correct))
+
+
+async def _judge(lkpd_id: str, q: dict, norm: str, raw: str, on_correct: Callable[[str], None]) -> None:
+    qid = str(q.get("id"))
+    state = _running[lkpd_id]
+    try:
+        with lane("background"):
+            verdict = await gemini_config.ajudge_short_answer(
+                q.get("question", ""), q.get("answer", ""), q.get("accepted") or [], raw)
+        await asyncio.to_thread(judgments.put, lkpd_id, qid, norm, verdict)
+        metrics.SHORT_ANSWER_VERDICTS.inc(source="llm", verdict=CORRECT if verdict else WRONG)
+        state[1] = state[1] or verdict
+    except Exception as e:
+        logger.warning(f"Penilaian IS via LLM gagal ({lkpd_id}/{qid}): {e}")
+        try:
+            await asyncio.to_thread(judgments.release, lkpd_id, qid, norm)
+        except Exception as e:
+            logger.warning(f"Klaim IS tidak bisa dilepas ({lkpd_id}/{qid}): {e}")
+    finally:
+        state[0] -= 1
+        if state[0] == 0:
+            _running.pop(lkpd_id, None)
+            if state[1]:
+                try:
+                    await asyncio.to_thread(on_correct, lkpd_id)
+                except Exception as e:
+                    logger.warning(f"Nilai ulang setelah putusan IS gagal ({lkpd_id}): {e}")
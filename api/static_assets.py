@@ -0,0 +1,236 @@
+# api/static_assets.py
+"""Build & serving aset frontend (web/) yang ramah koneksi lambat.
+
+Build (``prepare`` saat startup, atau ``python -m api.static_assets``):
+  - salin WEB_DIR ke WEB_BUILD_DIR;
+  - file di ``assets/`` diberi fingerprint isi (``style.3f2a9c1d.css``) dan
+    referensinya di file HTML ditulis ulang ke nama baru;
+  - file teks >= STATIC_COMPRESS_MIN byte dikompres sekali ke ``.gz`` (dan
+    ``.br`` bila paket brotli ada), hanya bila hasilnya lebih kecil.
+Build dilewati bila sumber tidak berubah (tanda tangan path+size+mtime di
+``manifest.json``). Antar-worker uvicorn build diserialisasi dengan flock.
+
+Serving (``PrecompressedStaticFiles``): varian terkompres dipilih sesuai
+Accept-Encoding, aset ber-fingerprint diberi ``Cache-Control: immutable``
+(1 tahun), HTML dan aset tanpa fingerprint ``no-cache`` (revalidasi ETag).
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import hashlib
+import logging
+import mimetypes
+import tempfile
+from typing import Dict, Optional
+
+try:  # flock hanya ada di POSIX
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+
+from api import compression
+
+logger = logging.getLogger("eduai")
+
+WEB_DIR = os.getenv("WEB_DIR", "web")
+WEB_BUILD_DIR = os.getenv("WEB_BUILD_DIR", "data/web_build")
+COMPRESS_MIN = int(os.getenv("STATIC_COMPRESS_MIN", "256"))
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+MANIFEST = "manifest.json"
+FINGERPRINT_DIR = "assets"
+COMPRESSIBLE = {".html", ".htm", ".css", ".js", ".mjs", ".json", ".svg", ".txt", ".xml", ".map", ".ico"}
+_REF = re.compile(r"(?P<slash>/?)(?P<path>assets/[\w./-]+)")
+
+
+def _fingerprinted(rel: str, data: bytes) -> str:
+    base, ext = os.path.splitext(rel)
+    return f"{base}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _source_files(src: str) -> Dict[str, str]:
+    """rel_path (pemisah '/') -> path absolut, urut."""
+    out = {}
+    for root, dirs, files in os.walk(src):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            out[os.path.relpath(full, src).replace(os.sep, "/")] = full
+    return out
+
+
+def _signature(files: Dict[str, str]) -> str:
+    h = hashlib.sha256(b"%d" % compression.STATIC_LEVEL)
+    h.update(",".join(sorted(compression.ENCODINGS)).encode())
+    for rel, full in files.items():
+        st = os.stat(full)
+        h.update(f"{rel}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def _load_manifest(out: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(out, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _precompress(path: str, data: bytes) -> int:
+    """Tulis varian terkompres di samping ``path``. Return jumlah varian."""
+    if len(data) < COMPRESS_MIN or os.path.splitext(path)[1].lower() not in COMPRESSIBLE:
+        return 0
+    written = 0
+    for encoding, suffix in compression.ENCODINGS.items():
+        packed = compression.compress(data, encoding)
+        if len(packed) < len(data):
+            _write(path + suffix, packed)
+            written += 1
+    return written
+
+
+def build(src: str = WEB_DIR, out: str = WEB_BUILD_DIR, force: bool = False) -> dict:
+    """Build aset ke ``out`` (lihat docstring modul). Return manifest."""
+    files = _source_files(src)
+    signature = _signature(files)
+    current = _load_manifest(out)
+    if not force and current and current.get("source") == signature:
+        return current
+
+    parent = os.path.dirname(os.path.abspath(out))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".web_build-", dir=parent)
+    try:
+        mapping: Dict[str, str] = {}
+        contents: Dict[str, bytes] = {}
+        for rel, full in files.items():
+            with open(full, "rb") as f:
+                contents[rel] = f.read()
+            if rel.startswith(FINGERPRINT_DIR + "/"):
+                mapping[rel] = _fingerprinted(rel, contents[rel])
+
+        def _rewrite(m: "re.Match") -> str:
+            target = mapping.get(m.group("path"))
+            return m.group("slash") + target if target else m.group(0)
+
+        variants = 0
+        for rel, data in contents.items():
+            if os.path.splitext(rel)[1].lower() in (".html", ".htm"):
+                data = _REF.sub(_rewrite, data.decode("utf-8")).encode("utf-8")
+            # nama asli tetap ada (HTML lama di cache browser), versi fingerprint di sampingnya
+            names = [rel] + ([mapping[rel]] if rel in mapping else [])
+            for name in names:
+                path = os.path.join(tmp, *name.split("/"))
+                _write(path, data)
+                variants += _precompress(path, data)
+
+        manifest = {"source": signature, "files": mapping}
+        with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        old = None
+        if os.path.isdir(out):
+            old = f"{tmp}-old"
+            os.rename(out, old)
+        os.rename(tmp, out)
+        if old:
+            shutil.rmtree(old, ignore_errors=True)
+        logger.info(f"Aset web dibangun ke {out}: {len(files)} file, {len(mapping)} fingerprint, "
+                    f"{variants} varian terkompres.")
+        return manifest
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def prepare(src: str = WEB_DIR, out: str = WEB_BUILD_DIR) -> str:
+    """Pastikan build terbaru ada (satu worker membangun, lainnya menunggu).
+
+    Return direktori yang dimount; bila build gagal, kembali ke ``src`` apa adanya.
+    """
+    lock = None
+    try:
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+            lock = open(os.path.abspath(out) + ".lock", "a")
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        build(src, out)
+        return out
+    except Exception as e:
+        logger.warning(f"Build aset web gagal, web/ disajikan tanpa kompresi: {e}")
+        return src
+    finally:
+        if lock is not None:
+            lock.close()
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles yang memilih varian ``.br``/``.gz`` dan memberi header cache."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        manifest = _load_manifest(str(self.directory)) if self.directory else None
+        self.immutable = set((manifest or {}).get("files", {}).values())
+
+    def _cache_control(self, full_path: str) -> str:
+        rel = os.path.relpath(full_path, os.path.realpath(self.directory)).replace(os.sep, "/")
+        if rel in self.immutable:
+            return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        return "no-cache"
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        full_path = str(full_path)
+        request_headers = Headers(scope=scope)
+        headers = {"Cache-Control": self._cache_control(full_path), "Vary": "Accept-Encoding"}
+        media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+
+        response = None
+        for encoding, suffix in compression.ENCODINGS.items():
+            if not compression.accepts(request_headers.get("accept-encoding"), encoding):
+                continue
+            try:
+                variant_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            response = FileResponse(full_path + suffix, status_code=status_code, stat_result=variant_stat,
+                                    media_type=media_type,
+                                    headers={**headers, "Content-Encoding": encoding})
+            break
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result,
+                                    media_type=media_type, headers=headers)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    p = argparse.ArgumentParser(description="Fingerprint & kompres aset web/ ke direktori build.")
+    p.add_argument("--src", default=WEB_DIR)
+    p.add_argument("--out", default=WEB_BUILD_DIR)
+    p.add_argument("--force", action="store_true", help="build ulang walau sumber tidak berubah")
+    args = p.parse_args(argv)
+    manifest = build(args.src, args.out, force=args.force)
+    for src_name, name in sorted(manifest["files"].items()):
+        print(f"{src_name} -> {name}")
+    print(f"Selesai: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+# api/submission_import.py
+"""Parser streaming untuk import massal jawaban (sesi kertas/offline).
+
+Upload dibaca per potongan (``request.stream()``), dipecah per baris tanpa
+menampung seluruh file, lalu dikelompokkan per siswa:
+
+  CSV   : header wajib, kolom ``name`` (atau ``nama``), ``question_id``
+          (``id``/``soal``), ``answer`` (``jawaban``); satu baris per jawaban.
+  JSONL : satu objek per baris, ``{"name", "question_id", "answer"}`` atau
+          satu submission utuh ``{"name", "answers": {id_soal: jawaban}}``.
+
+Kolom/field opsional ``student_id`` membedakan siswa dengan nama sama.
+Baris yang tidak valid dilewati dan dilaporkan (nomor baris + alasan).
+"""
+
+import csv
+import codecs
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from api import serializer
+
+NAME_KEYS = ("name", "nama")
+QUESTION_KEYS = ("question_id", "id", "soal", "id_soal")
+ANSWER_KEYS = ("answer", "jawaban")
+MAX_ERRORS = 50  # detail error yang dilaporkan
+
+
+def _pick(row: Dict[str, Any], keys) -> Optional[Any]:
+    for k in keys:
+        if row.get(k) not in (None, ""):
+            return row[k]
+    return None
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Baris teks (UTF-8, BOM dibuang) dari aliran byte."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def _csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """(nomor_baris, dict kolom) per record CSV; field ber-quote boleh memuat baris baru."""
+    header: Optional[List[str]] = None
+    record, start, line_no = "", 0, 0
+    async for line in _lines(chunks):
+        line_no += 1
+        record = f"{record}\n{line}" if record else line
+        start = start or line_no
+        if record.count('"') % 2:  # quote belum tertutup: record berlanjut ke baris berikut
+            continue
+        text, record, first = record, "", start
+        start = 0
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [h.strip().lower() for h in values]
+            continue
+        yield first, dict(zip(header, values))
+    if record:
+        yield start, ValueError("quote tidak ditutup")
+
+
+async def _jsonl_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    line_no = 0
+    async for line in _lines(chunks):
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            row = serializer.loads(line)
+        except ValueError as e:
+            yield line_no, ValueError(f"JSON tidak valid: {e}")
+            continue
+        yield line_no, row if isinstance(row, dict) else ValueError("baris harus berupa objek JSON")
+
+
+async def collect(chunks: AsyncIterator[bytes], fmt: str, question_ids: List[str],
+                  max_rows: int) -> Tuple[List[Dict[str, Any]], int, List[Dict[str, Any]], int]:
+    """Kelompokkan jawaban per siswa.
+
+    Return (students, rows, errors, skipped) dengan students =
+    [{"name", "student_id", "answers": {id_soal: jawaban}}] urut kemunculan.
+    Raise ValueError bila format tidak dikenal atau baris melebihi ``max_rows``.
+    """
+    if fmt == "csv":
+        source = _csv_rows(chunks)
+    elif fmt in ("jsonl", "ndjson"):
+        source = _jsonl_rows(chunks)
+    else:
+        raise ValueError("Format harus 'csv' atau 'jsonl'.")
+
+    known = set(question_ids)
+    students: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+    errors: List[Dict[str, Any]] = []
+    rows = skipped = 0
+
+    def _skip(line: int, reason: str) -> None:
+        nonlocal skipped
+        skipped += 1
+        if len(errors) < MAX_ERRORS:
+            errors.append({"line": line, "error": reason})
+
+    async for line, row in source:
+        rows += 1
+        if rows > max_rows:
+            raise ValueError(f"Maksimal {max_rows} baris per import.")
+        if isinstance(row, Exception):
+            _skip(line, str(row))
+            continue
+        row = {str(k).strip().lower(): v for k, v in row.items()}
+        name = str(_pick(row, NAME_KEYS) or "").strip()
+        if not name:
+            _skip(line, "nama siswa kosong")
+            continue
+        student_id = str(row.get("student_id") or "").strip()
+        if isinstance(row.get("answers"), dict):
+            pairs = list(row["answers"].items())
+        else:
+            pairs = [(_pick(row, QUESTION_KEYS), _pick(row, ANSWER_KEYS))]
+        entry = students.get((name, student_id))
+        if entry is None:
+            entry = students[(name, student_id)] = {"name": name, "student_id": student_id, "answers": {}}
+        for qid, answer in pairs:
+            qid = str(qid or "").strip()
+            if qid not in known:
+                _skip(line, f"id soal tidak dikenal: {qid or '-'}")
+                continue
+            entry["answers"][qid] = "" if answer is None else str(answer).strip()
+    return [s for s in students.values() if s["answers"]], rows, errors, skipped
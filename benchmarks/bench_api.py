@@ -0,0 +1,312 @@
+# benchmarks/bench_api.py
+"""Benchmark end-to-end EduAI API dengan provider LLM palsu.
+
+Menjalankan ``api.main:app`` in-process (httpx ASGITransport) atau di bawah
+uvicorn (subprocess), lalu memutar skenario yang mirip pemakaian kelas:
+
+  - generate    : beberapa /generate bersamaan (tema berbeda, cache miss)
+  - lkpd_open   : N siswa membuka /lkpd/{id} bersamaan, beberapa putaran
+  - submit_burst: ledakan /submit bersamaan
+  - export_csv / export_xlsx: ekspor kelas besar
+
+Hasil (throughput, p50/p95/p99 dalam ms, jumlah error, peak RSS) ditulis
+sebagai JSON supaya bisa dibandingkan antar commit.
+
+Contoh:
+    python -m benchmarks.bench_api --out bench.json
+    python -m benchmarks.bench_api --mode uvicorn --llm-latency 0.8 --llm-error-rate 0.05
+
+Butuh httpx (dan uvicorn untuk --mode uvicorn); data ditulis ke direktori
+sementara, bukan ke data/ milik aplikasi.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# -------------------------
+#  Statistik
+# -------------------------
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _summarize(latencies: List[float], errors: int, wall: float) -> Dict[str, Any]:
+    ms = sorted(x * 1000 for x in latencies)
+    total = len(latencies) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "duration_s": round(wall, 4),
+        "throughput_rps": round(total / wall, 2) if wall > 0 else 0.0,
+        "p50_ms": round(_percentile(ms, 50), 2),
+        "p95_ms": round(_percentile(ms, 95), 2),
+        "p99_ms": round(_percentile(ms, 99), 2),
+        "max_ms": round(ms[-1], 2) if ms else 0.0,
+    }
+
+
+async def _run(calls: List[Callable[[], Awaitable[httpx.Response]]], concurrency: int,
+               ok_status=(200, 304)) -> Dict[str, Any]:
+    """Jalankan semua panggilan dengan batas konkurensi, ukur latensi per request."""
+    sem = asyncio.Semaphore(max(1, concurrency))
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(call):
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                r = await call()
+                if r.status_code in ok_status:
+                    latencies.append(time.perf_counter() - t0)
+                    return r
+            except httpx.HTTPError:
+                pass
+            errors += 1
+            return None
+
+    t0 = time.perf_counter()
+    responses = await asyncio.gather(*(one(c) for c in calls))
+    stats = _summarize(latencies, errors, time.perf_counter() - t0)
+    stats["_responses"] = responses
+    return stats
+
+
+# -------------------------
+#  Skenario
+# -------------------------
+async def _generate(client: httpx.AsyncClient, n: int) -> Dict[str, Any]:
+    stamp = os.urandom(3).hex()
+    calls = [
+        (lambda i=i: client.post("/api/generate", json={"theme": f"Tema {stamp} {i}", "level": "sedang"}))
+        for i in range(n)
+    ]
+    return await _run(calls, n)
+
+
+async def _lkpd_open(client: httpx.AsyncClient, lkpd_id: str, students: int, rounds: int) -> Dict[str, Any]:
+    calls = [(lambda: client.get(f"/api/lkpd/{lkpd_id}")) for _ in range(students * rounds)]
+    return await _run(calls, students)
+
+
+def _answers(lkpd: dict, i: int) -> List[dict]:
+    letters = "ABCD"
+    return [{"id": str(q.get("id")), "jawaban": letters[(i + j) % 4]}
+            for j, q in enumerate(lkpd.get("questions", []))]
+
+
+async def _submit_burst(client: httpx.AsyncClient, lkpd: dict, n: int, concurrency: int,
+                        prefix: str = "Siswa") -> Dict[str, Any]:
+    calls = [
+        (lambda i=i: client.post("/api/submit", json={
+            "lkpd_id": lkpd["id"], "name": f"{prefix} {i}", "answers": _answers(lkpd, i)}))
+        for i in range(n)
+    ]
+    return await _run(calls, concurrency)
+
+
+async def _export(client: httpx.AsyncClient, path: str, repeat: int) -> Dict[str, Any]:
+    async def call():
+        # baca body sampai habis supaya waktu streaming ikut terukur
+        async with client.stream("GET", path) as r:
+            async for _ in r.aiter_bytes():
+                pass
+            return r
+    return await _run([call for _ in range(repeat)], 1)
+
+
+async def run_scenarios(client: httpx.AsyncClient, args) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+
+    res = await _generate(client, args.generate)
+    lkpds = [r.json() for r in res.pop("_responses") if r is not None]
+    results["generate"] = res
+    if not lkpds:
+        raise RuntimeError("Semua /generate gagal; skenario lain tidak bisa dijalankan.")
+    lkpd = lkpds[0]
+
+    res = await _lkpd_open(client, lkpd["id"], args.students, args.rounds)
+    res.pop("_responses")
+    results["lkpd_open"] = res
+
+    res = await _submit_burst(client, lkpd, args.submits, args.submit_concurrency)
+    res.pop("_responses")
+    results["submit_burst"] = res
+
+    # kelas besar untuk ekspor: LKPD terpisah supaya ukuran ekspor tepat export_rows
+    big = lkpds[1] if len(lkpds) > 1 else lkpd
+    seed = await _submit_burst(client, big, args.export_rows, args.submit_concurrency, prefix="Ekspor")
+    results["export_seed_errors"] = seed["errors"]
+
+    res = await _export(client, f"/api/export/{big['id']}", args.export_repeat)
+    res.pop("_responses")
+    results["export_csv"] = res
+
+    res = await _export(client, f"/api/export-xlsx/{big['id']}", args.export_repeat)
+    res.pop("_responses")
+    results["export_xlsx"] = res
+    return results
+
+
+# -------------------------
+#  Mode eksekusi
+# -------------------------
+def _bench_env(args, workdir: str) -> Dict[str, str]:
+    return {
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "FAKE_LLM_JITTER": str(args.llm_jitter),
+        "FAKE_LLM_ERROR_RATE": str(args.llm_error_rate),
+        "STORAGE_BACKEND": args.backend,
+        "LKPD_DIR": os.path.join(workdir, "lkpd_outputs"),
+        "ANSWERS_DIR": os.path.join(workdir, "answers"),
+        "CATALOG_DB": os.path.join(workdir, "catalog.sqlite3"),
+        "ANALYTICS_DB": os.path.join(workdir, "catalog.sqlite3"),
+        "SQLITE_DB": os.path.join(workdir, "eduai.sqlite3"),
+        "GEN_CACHE_DIR": os.path.join(workdir, "cache"),
+        "LOG_DIR": os.path.join(workdir, "logs"),
+    }
+
+
+def _rss_self_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux: KB, macOS: byte
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _rss_pid_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+async def run_inprocess(args, workdir: str) -> Dict[str, Any]:
+    os.environ.update(_bench_env(args, workdir))
+    sys.path.insert(0, ROOT)
+    from api.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            results = await run_scenarios(client, args)
+    return {"scenarios": results, "peak_rss_mb": _rss_self_mb()}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_uvicorn(args, workdir: str) -> Dict[str, Any]:
+    port = args.port or _free_port()
+    env = {**os.environ, **_bench_env(args, workdir)}
+    cmd = [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1",
+           "--port", str(port), "--log-level", "warning", "--workers", str(args.workers)]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=base, timeout=args.timeout, trust_env=False,
+                                     limits=httpx.Limits(max_connections=1000)) as client:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    if (await client.get("/api/models")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if proc.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn gagal start.")
+                await asyncio.sleep(0.2)
+            results = await run_scenarios(client, args)
+        rss = _rss_pid_mb(proc.pid)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    if rss is None:
+        rss = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    return {"scenarios": results, "peak_rss_mb": rss}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark end-to-end EduAI API (LLM palsu).")
+    p.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    p.add_argument("--backend", choices=["file", "sqlite"], default="file")
+    p.add_argument("--workers", type=int, default=1, help="jumlah worker uvicorn")
+    p.add_argument("--port", type=int, default=0)
+    p.add_argument("--llm-latency", type=float, default=0.2, help="latensi LLM palsu (detik)")
+    p.add_argument("--llm-jitter", type=float, default=0.05)
+    p.add_argument("--llm-error-rate", type=float, default=0.0)
+    p.add_argument("--generate", type=int, default=8, help="jumlah /generate bersamaan")
+    p.add_argument("--students", type=int, default=40, help="siswa membuka LKPD bersamaan")
+    p.add_argument("--rounds", type=int, default=5)
+    p.add_argument("--submits", type=int, default=200)
+    p.add_argument("--submit-concurrency", type=int, default=40)
+    p.add_argument("--export-rows", type=int, default=2000)
+    p.add_argument("--export-repeat", type=int, default=3)
+    p.add_argument("--timeout", type=float, default=60.0)
+    p.add_argument("--out", help="tulis hasil JSON ke file (default: stdout)")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="eduai-bench-") as workdir:
+        runner = run_inprocess if args.mode == "inprocess" else run_uvicorn
+        result = asyncio.run(runner(args, workdir))
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        **result,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -67,15 +67,39 @@ const TeacherApp = {
         window.open(`/student.html?id=${id}`, '_blank');
     },
 
+    // rekap: muat sekali (?since=0), lalu hanya terima perubahan lewat SSE
+    rekapRows: new Map(),
+    rekapStream: null,
+
     async loadRekap() {
         const id = document.getElementById('rekap-id').value.trim();
         if (!id) return alert("Masukkan ID LKPD!");
 
         const rekapEl = document.getElementById('rekap-table');
         rekapEl.innerHTML = `<p>⏳ Memuat data...</p>`;
+        if (TeacherApp.rekapStream) TeacherApp.rekapStream.close();
+
+        const data = await fetchJSON(`/api/answers/${id}?since=0`);
+        TeacherApp.rekapRows = new Map();
+        data.items.forEach(TeacherApp.putRekapRow);
+        TeacherApp.renderRekap();
+        window.currentId = id;
+
+        TeacherApp.rekapStream = new EventSource(`/api/answers/${id}/stream?since=${data.cursor}`);
+        TeacherApp.rekapStream.addEventListener('submission', e => {
+            TeacherApp.putRekapRow(JSON.parse(e.data));
+            TeacherApp.renderRekap();
+        });
+    },
 
-        const data = await fetchJSON(`/api/answers/${id}`);
-        if (!Array.isArray(data) || data.length === 0) {
+    putRekapRow(r) {
+        TeacherApp.rekapRows.set(r.submission_id || `seq-${r.seq}-${r.name}`, r);
+    },
+
+    renderRekap() {
+        const rekapEl = document.getElementById('rekap-table');
+        const data = [...TeacherApp.rekapRows.values()];
+        if (data.length === 0) {
             rekapEl.innerHTML = `<p>Belum ada jawaban siswa.</p>`;
             document.getElementById('export-buttons').style.display = 'none';
             return;
@@ -106,7 +130,6 @@ const TeacherApp = {
         html += `</table>`;
         rekapEl.innerHTML = html;
         document.getElementById('export-buttons').style.display = 'block';
-        window.currentId = id;
     },
 
     downloadCSV() {
@@ -195,18 +218,11 @@ const StudentApp = {
 
         const form = document.getElementById('jawaban-form');
         const formData = new FormData(form);
-        const answers = [];
+        // cukup id soal -> jawaban; soal & kunci sudah ada di server
+        const answers = {};
 
         StudentApp.currentLKPD.questions.forEach(q => {
-            const input = formData.get(`q${q.id}`);
-            answers.push({
-                id: q.id,
-                type: q.type,
-                question: q.question,
-                jawaban: input || "",
-                kunci: q.answer,
-                bobot: q.score
-            });
+            answers[q.id] = formData.get(`q${q.id}`) || "";
         });
 
         await fetchJSON('/api/submit', {